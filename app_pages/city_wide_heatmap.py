@@ -2,15 +2,19 @@ import streamlit as st
 import pandas as pd
 import pydeck as pdk
 import numpy as np
-from src.ingestor import fetch_nyc_data
-from src.normalizer import normalize_building_data
-from src.engine.penalty import calculate_penalty
+from src.ingestor import iter_nyc_data
+from src.normalizer import USE_GFA_COLUMNS, USE_TYPE_COLUMNS, normalize_building_frame
+from src.engine.batch import calculate_penalties_batch, encode_property_types, encode_use_mix
+from src.tiles import POINT_ZOOM, aggregate_tiles, penalty_colors, tile_bounds
 
 
 # --- Sidebar Parameters ---
 st.sidebar.header("Map Parameters")
 selected_year = st.sidebar.radio("Select Year", [2024, 2030], horizontal=True)
 sample_size = st.sidebar.slider("Sample Size", min_value=100, max_value=10000, value=500, step=100)
+full_scan = st.sidebar.checkbox("Scan full dataset", value=False, help="Pages through every LL84 record")
+map_zoom = st.sidebar.slider("Map Detail (zoom)", min_value=10, max_value=POINT_ZOOM, value=12,
+                             help=f"Below zoom {POINT_ZOOM} buildings are aggregated into grid tiles")
 fetch_btn = st.sidebar.button("Fetch & Map Data", type="primary")
 
 # --- Main Content ---
@@ -21,68 +25,78 @@ if 'map_data' not in st.session_state:
     st.session_state.map_data = None
 
 if fetch_btn:
-    with st.spinner(f"Fetching {sample_size} records from NYC Open Data..."):
-        raw_data = fetch_nyc_data(limit=sample_size)
-        buildings = normalize_building_data(raw_data)
-
-        results = []
-        for b in buildings:
-            if b.latitude and b.longitude:
-                penalty_val = calculate_penalty(b, selected_year)
-                if penalty_val > 0:
-                    results.append({
-                        "building_id": b.building_id,
-                        "lat": b.latitude,
-                        "lon": b.longitude,
-                        "penalty": penalty_val,
-                        "property_type": b.property_type,
-                    })
-
-        st.session_state.map_data = pd.DataFrame(results)
+    with st.spinner("Fetching records from NYC Open Data..."):
+        raw_data = list(iter_nyc_data(max_records=None if full_scan else sample_size))
+        sample_size = len(raw_data)
+        frame, _ = normalize_building_frame(raw_data)
+        frame = frame[frame["latitude"].notna() & frame["longitude"].notna()]
+
+        codes = encode_property_types(frame["property_type"])
+        mix = encode_use_mix(codes, frame[USE_TYPE_COLUMNS].to_numpy(), frame[USE_GFA_COLUMNS].to_numpy(),
+                             frame["gross_sq_ft"].to_numpy())
+        penalties = calculate_penalties_batch(
+            frame["gross_sq_ft"].to_numpy(), frame["annual_gas_usage_therms"].to_numpy(),
+            frame["annual_elec_usage_kwh"].to_numpy(), codes, selected_year, mix=mix
+        )
+        results = frame.assign(lat=frame["latitude"], lon=frame["longitude"], penalty=penalties)
+        results = results[results["penalty"] > 0]
+        st.session_state.map_data = results[["building_id", "lat", "lon", "penalty", "property_type"]].reset_index(drop=True)
 
 if st.session_state.map_data is not None and not st.session_state.map_data.empty:
     df = st.session_state.map_data.copy()
 
     st.success(f"Found {len(df)} buildings with penalties out of {sample_size} scanned.")
 
-    # --- Discrete color buckets by penalty bracket ---
+    # --- Discrete color buckets by penalty bracket (see src/tiles.py) ---
     # White < $10k | Yellow < $100k | Orange < $1M | Red < $10M | Deep Red >= $10M
-    def penalty_color(p):
-        if p < 10_000:
-            return [255, 255, 255, 200]   # White
-        elif p < 100_000:
-            return [255, 220, 0,   220]   # Yellow
-        elif p < 1_000_000:
-            return [255, 120, 0,   220]   # Orange
-        elif p < 10_000_000:
-            return [220, 0,   0,   230]   # Red
-        else:
-            return [120, 0,   0,   240]   # Deep Red
-
-    colors = df["penalty"].apply(penalty_color)
-    df["r"] = colors.apply(lambda c: c[0])
-    df["g"] = colors.apply(lambda c: c[1])
-    df["b"] = colors.apply(lambda c: c[2])
-    df["a"] = colors.apply(lambda c: c[3])
-
-    # Pre-format penalty as string for tooltip (pydeck doesn't support Python format specs)
-    df["penalty_display"] = df["penalty"].apply(lambda x: f"${x:,.0f}")
-
-    layer = pdk.Layer(
-        "ScatterplotLayer",
-        df,
-        get_position="[lon, lat]",
-        get_color="[r, g, b, a]",
-        get_radius=60,           # Fixed radius in meters (uniform bubbles)
-        radius_min_pixels=4,
-        radius_max_pixels=14,
-        pickable=True,
-    )
+    if map_zoom >= POINT_ZOOM:
+        colors = penalty_colors(df["penalty"].to_numpy())
+        df[["r", "g", "b", "a"]] = colors
+        # Pre-format penalty as string for tooltip (pydeck doesn't support Python format specs)
+        df["penalty_display"] = [f"${x:,.0f}" for x in df["penalty"]]
+
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            df,
+            get_position="[lon, lat]",
+            get_color="[r, g, b, a]",
+            get_radius=60,           # Fixed radius in meters (uniform bubbles)
+            radius_min_pixels=4,
+            radius_max_pixels=14,
+            pickable=True,
+        )
+        tooltip = {"text": "Building ID: {building_id}\nType: {property_type}\nPenalty: {penalty_display}"}
+    else:
+        # One polygon per grid tile, colored by the tile's total penalty
+        tiles = aggregate_tiles(df["lat"].to_numpy(), df["lon"].to_numpy(), df["penalty"].to_numpy(), map_zoom)
+        bounds = tile_bounds(tiles["x"], tiles["y"], map_zoom)
+        south, west, north, east = bounds["south"], bounds["west"], bounds["north"], bounds["east"]
+        polygons = np.stack([
+            np.column_stack([west, south]), np.column_stack([east, south]),
+            np.column_stack([east, north]), np.column_stack([west, north]),
+        ], axis=1)
+        tile_df = pd.DataFrame({
+            "polygon": polygons.tolist(),
+            "count": tiles["count"],
+            "total_display": [f"${x:,.0f}" for x in tiles["total_penalty"]],
+            "max_display": [f"${x:,.0f}" for x in tiles["max_penalty"]],
+        })
+        tile_df[["r", "g", "b", "a"]] = penalty_colors(tiles["total_penalty"])
+
+        layer = pdk.Layer(
+            "PolygonLayer",
+            tile_df,
+            get_polygon="polygon",
+            get_fill_color="[r, g, b, a]",
+            stroked=False,
+            pickable=True,
+        )
+        tooltip = {"text": "Buildings: {count}\nTotal Penalty: {total_display}\nMax Penalty: {max_display}"}
 
     view_state = pdk.ViewState(
         latitude=40.7128,
         longitude=-74.0060,
-        zoom=11,
+        zoom=map_zoom,
         pitch=0,
     )
 
@@ -90,7 +104,7 @@ if st.session_state.map_data is not None and not st.session_state.map_data.empty
         map_style="mapbox://styles/mapbox/dark-v9",
         initial_view_state=view_state,
         layers=[layer],
-        tooltip={"text": "Building ID: {building_id}\nType: {property_type}\nPenalty: {penalty_display}"},
+        tooltip=tooltip,
     ))
 
     st.dataframe(
@@ -18,7 +18,7 @@ if building_id:
         # Fetch Analysis
         with st.spinner(f"Analyzing Building {building_id}..."):
             # Using the direct function call to simulate API response
-            result = get_building_analysis(building_id)
+            result = get_building_analysis(building_id, explain=True)
             
             # Convert to dict if needed
             if hasattr(result, "model_dump"):
@@ -79,7 +79,7 @@ if building_id:
 
         # 3. Explainability Trace
         st.markdown("### 🔎 Engine Explainability Trace")
-        trace_text = "\n".join([f"• {step}" for step in data['explainability']])
+        trace_text = "\n".join([f"• {step}" for step in data['explainability'] or []])
         st.text_area("Live Analysis Log", value=trace_text, height=200)
 
     except HTTPException as e:
@@ -0,0 +1,223 @@
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import generate_raw_records
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+DEFAULT_SIZES = ["1k", "100k", "1M"]
+
+# A stage regresses when throughput drops (or peak memory grows) by more than this fraction.
+DEFAULT_THRESHOLD = 0.3
+
+# Peak-memory differences below this are noise, whatever the ratio.
+MEMORY_SLACK_MB = 2.0
+
+# Per-building stages are measured on at most this many rows; throughput is per row either way.
+SCALAR_MAX_ROWS = 100_000
+API_MAX_ROWS = 1_000
+
+def parse_size(text: str) -> int:
+    """'1k' -> 1000, '1M' -> 1000000, '2500' -> 2500."""
+    text = text.strip()
+    multiplier = {"k": 1_000, "K": 1_000, "m": 1_000_000, "M": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+def _stages() -> Dict[str, Callable]:
+    """
+    Each stage takes the prepared inputs and returns (callable, rows measured).
+    Imports are local so `--help` stays fast.
+    """
+    from fastapi.testclient import TestClient
+    from src.engine.batch import calculate_penalties_batch, calculate_roi_batch
+    from src.engine.penalty import calculate_penalty
+    from src.engine.roi import calculate_roi
+    from src.main import app
+    from src.normalizer import normalize_building_data, normalize_building_frame
+
+    def normalize_scalar(data):
+        records = data["records"][:SCALAR_MAX_ROWS]
+        return lambda: normalize_building_data(records), len(records)
+
+    def normalize_frame(data):
+        return lambda: normalize_building_frame(data["records"]), len(data["records"])
+
+    def penalty_scalar(data):
+        buildings = data["buildings"][:SCALAR_MAX_ROWS]
+        return lambda: [calculate_penalty(b, 2024) for b in buildings], len(buildings)
+
+    def roi_scalar(data):
+        buildings = data["buildings"][:SCALAR_MAX_ROWS]
+        return lambda: [calculate_roi(b) for b in buildings], len(buildings)
+
+    def penalty_batch(data):
+        c = data["columns"]
+        return lambda: calculate_penalties_batch(c["gross_sq_ft"], c["annual_gas_usage_therms"], c["annual_elec_usage_kwh"], c["type_codes"], 2024), len(c["type_codes"])
+
+    def roi_batch(data):
+        c = data["columns"]
+        return lambda: calculate_roi_batch(c["gross_sq_ft"], c["annual_gas_usage_therms"], c["annual_elec_usage_kwh"], c["type_codes"]), len(c["type_codes"])
+
+    def api_analyze(data):
+        client = TestClient(app)
+        payloads = [b.model_dump() for b in data["buildings"][:API_MAX_ROWS]]
+
+        def run():
+            from src.main import RESULT_CACHE
+            # Measure computation, not cache hits from an earlier repeat
+            RESULT_CACHE.invalidate()
+            for payload in payloads:
+                client.post("/analyze", json=payload).raise_for_status()
+        return run, len(payloads)
+
+    return {
+        "normalize_scalar": normalize_scalar,
+        "normalize_frame": normalize_frame,
+        "penalty_scalar": penalty_scalar,
+        "roi_scalar": roi_scalar,
+        "penalty_batch": penalty_batch,
+        "roi_batch": roi_batch,
+        "api_analyze": api_analyze,
+    }
+
+def prepare(size: int, seed: int = 0) -> Dict:
+    """Raw records plus the normalized forms later stages start from (not timed)."""
+    from src.engine.batch import encode_property_types
+    from src.normalizer import frame_to_buildings, normalize_building_frame
+
+    records = generate_raw_records(size, seed)
+    frame, _ = normalize_building_frame(records)
+    columns = {
+        "gross_sq_ft": frame["gross_sq_ft"].to_numpy(),
+        "annual_gas_usage_therms": frame["annual_gas_usage_therms"].to_numpy(),
+        "annual_elec_usage_kwh": frame["annual_elec_usage_kwh"].to_numpy(),
+        "type_codes": encode_property_types(frame["property_type"]),
+    }
+    return {
+        "records": records,
+        "buildings": frame_to_buildings(frame.head(SCALAR_MAX_ROWS)),
+        "columns": columns,
+    }
+
+def measure(fn: Callable, rows: int, repeat: int = 3, memory: bool = True) -> Dict[str, float]:
+    """Best-of-`repeat` wall time, and the tracemalloc peak of one extra run."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    result = {"rows": rows, "seconds": round(best, 6), "rows_per_sec": round(rows / best, 1) if best > 0 else float("inf")}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 3)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run_benchmarks(
+    sizes: List[int], stages: Optional[List[str]] = None, seed: int = 0, memory: bool = True
+) -> Dict[str, Dict[str, float]]:
+    """
+    Runs every stage at every size. Results are keyed "stage@size".
+    """
+    available = _stages()
+    names = stages or list(available)
+    unknown = set(names) - set(available)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}; expected some of {list(available)}")
+
+    results = {}
+    for size in sizes:
+        data = prepare(size, seed)
+        for name in names:
+            fn, rows = available[name](data)
+            repeat = 3 if rows <= 100_000 else 1
+            results[f"{name}@{size}"] = measure(fn, rows, repeat=repeat, memory=memory)
+            print(f"{name:>18} @ {size:>9,}: {results[f'{name}@{size}']}", flush=True)
+    return results
+
+def compare(results: Dict[str, Dict], baselines: Dict[str, Dict], threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Regression messages for results that fall outside `threshold` of their baseline.
+    Results without a baseline are not judged.
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        floor = baseline["rows_per_sec"] * (1 - threshold)
+        if result["rows_per_sec"] < floor:
+            regressions.append(
+                f"{key}: {result['rows_per_sec']:,.0f} rows/s is below {floor:,.0f} "
+                f"(baseline {baseline['rows_per_sec']:,.0f})"
+            )
+        if "peak_mb" in result and "peak_mb" in baseline:
+            ceiling = baseline["peak_mb"] * (1 + threshold) + MEMORY_SLACK_MB
+            if result["peak_mb"] > ceiling:
+                regressions.append(
+                    f"{key}: peak {result['peak_mb']:.1f} MB exceeds {ceiling:.1f} MB "
+                    f"(baseline {baseline['peak_mb']:.1f} MB)"
+                )
+    return regressions
+
+def load_baselines(path: Path = BASELINES_PATH) -> Dict[str, Dict]:
+    if not Path(path).exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f).get("results", {})
+
+def save_baselines(results: Dict[str, Dict], path: Path = BASELINES_PATH):
+    """Merges `results` into the baseline file (other sizes/stages are kept)."""
+    merged = load_baselines(path)
+    merged.update(results)
+    with open(path, "w") as f:
+        json.dump({
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": sys.version.split()[0],
+            "results": dict(sorted(merged.items())),
+        }, f, indent=2)
+        f.write("\n")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Throughput and memory benchmarks for the normalizer, engine and API.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help="Comma-separated dataset sizes, e.g. 1k,100k,1M")
+    parser.add_argument("--stages", default=None, help="Comma-separated stage names (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed fractional regression")
+    parser.add_argument("--baselines", type=Path, default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true", help="Record these results as the new baselines")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", type=Path, default=None, help="Also write results as JSON here")
+    args = parser.parse_args(argv)
+
+    # Normalizer warnings about the deliberately bad records would swamp the output
+    logging.disable(logging.WARNING)
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",")] if args.stages else None
+    results = run_benchmarks(sizes, stages, seed=args.seed, memory=not args.no_memory)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baselines:
+        save_baselines(results, args.baselines)
+        print(f"Baselines updated: {args.baselines}")
+        return 0
+
+    regressions = compare(results, load_baselines(args.baselines), args.threshold)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import numpy as np
+from typing import Any, Dict, List
+
+# Raw LL84 property type labels and their share of the NYC dataset (roughly).
+PROPERTY_TYPE_LABELS = [
+    ("Multifamily Housing", 0.62),
+    ("Office", 0.12),
+    ("Hotel", 0.03),
+    ("Retail Store", 0.04),
+    ("Non-Refrigerated Warehouse", 0.05),
+    ("K-12 School", 0.06),
+    ("Residence Hall/Dormitory", 0.02),
+    ("Supermarket/Grocery Store", 0.01),
+    ("Financial Office", 0.02),
+    ("Manufacturing/Industrial Plant", 0.03),
+]
+
+# Placeholders the LL84 extract uses for missing values.
+MISSING_MARKERS = ["Not Available", "N/A", "", None]
+
+def _fmt(values: np.ndarray, missing: np.ndarray, markers: np.ndarray) -> List[Any]:
+    """Numbers as strings (as Socrata returns them), with missing slots replaced by a marker."""
+    out = [repr(round(float(v), 1)) for v in values]
+    for i in np.flatnonzero(missing):
+        out[i] = MISSING_MARKERS[markers[i]]
+    return out
+
+def generate_raw_records(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Seeded synthetic LL84 records shaped like the Socrata extract.
+    About half report gas/electricity in kBtu and half in therms/kWh; a few percent of
+    fields are "Not Available"-style placeholders, some GFAs are missing, and a handful
+    of records have implausible site EUIs so every normalizer branch gets exercised.
+    """
+    rng = np.random.default_rng(seed)
+    labels = [label for label, _ in PROPERTY_TYPE_LABELS]
+    weights = np.array([w for _, w in PROPERTY_TYPE_LABELS])
+    types = rng.choice(len(labels), size=n, p=weights / weights.sum())
+
+    sqft = np.exp(rng.normal(np.log(60_000), 0.8, n)).clip(5_000, 3_000_000)
+    site_eui = rng.lognormal(np.log(85), 0.35, n)
+    outliers = rng.random(n) < 0.002
+    site_eui[outliers] = rng.uniform(6_000, 20_000, int(outliers.sum()))
+    total_kbtu = sqft * site_eui
+    gas_share = rng.beta(2, 2, n) * (rng.random(n) > 0.1)
+    gas_kbtu = total_kbtu * gas_share
+    elec_kbtu = total_kbtu - gas_kbtu
+    in_kbtu = rng.random(n) < 0.5
+
+    def missing(rate):
+        return rng.random(n) < rate, rng.integers(0, len(MISSING_MARKERS), n)
+
+    gfa_missing, gfa_marker = missing(0.01)
+    gas_missing, gas_marker = missing(0.04)
+    elec_missing, elec_marker = missing(0.02)
+    eui_missing, eui_marker = missing(0.03)
+    geo_missing = rng.random(n) < 0.05
+
+    gfa = _fmt(sqft, gfa_missing, gfa_marker)
+    gas_kbtu_s = _fmt(gas_kbtu, gas_missing, gas_marker)
+    gas_therms_s = _fmt(gas_kbtu / 100.0, gas_missing, gas_marker)
+    elec_kbtu_s = _fmt(elec_kbtu, elec_missing, elec_marker)
+    elec_kwh_s = _fmt(elec_kbtu / 3.41214, elec_missing, elec_marker)
+    eui_s = _fmt(site_eui, eui_missing, eui_marker)
+    lat = rng.uniform(40.50, 40.91, n)
+    lon = rng.uniform(-74.25, -73.70, n)
+
+    records = []
+    for i in range(n):
+        record = {
+            "property_id": str(1_000_000 + i),
+            "property_gfa_self_reported": gfa[i],
+            "primary_property_type_self_selected": labels[types[i]],
+            "site_eui_kbtu_ft": eui_s[i],
+        }
+        if in_kbtu[i]:
+            record["natural_gas_use_kbtu"] = gas_kbtu_s[i]
+            record["electricity_use_grid_purchase_kbtu"] = elec_kbtu_s[i]
+        else:
+            record["natural_gas_use_therms"] = gas_therms_s[i]
+            record["electricity_use_grid_purchase_kwh"] = elec_kwh_s[i]
+        if not geo_missing[i]:
+            record["latitude"] = f"{lat[i]:.6f}"
+            record["longitude"] = f"{lon[i]:.6f}"
+        records.append(record)
+    return records
@@ -7,7 +7,7 @@ def run_demo(building_id: str):
     print(f"--- Running Analysis for Building ID: {building_id} ---")
     try:
         # Call the logic directly
-        result = get_building_analysis(building_id)
+        result = get_building_analysis(building_id, explain=True)
         
         # Parse result to dict if it's a Pydantic model (FastAPI returns models)
         if hasattr(result, "model_dump"):
@@ -19,7 +19,7 @@ def run_demo(building_id: str):
         print(json.dumps(data, indent=2))
         
         print("\n--- Explainability Trace ---")
-        for step in data.get("explainability", []):
+        for step in data.get("explainability") or []:
             print(f"> {step}")
 
     except HTTPException as e:
@@ -1,11 +1,11 @@
-import requests
 import json
+from src.httpcache import http_get
 
 def inspect():
     url = "https://data.cityofnewyork.us/resource/5zyy-y8am.json"
     params = {"$limit": 1}
     try:
-        response = requests.get(url, params=params)
+        response = http_get(url, params=params)
         response.raise_for_status()
         data = response.json()
         if data:
@@ -0,0 +1,281 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.engine.rules import get_rules
+from src.export import EXTENSIONS, FORMATS, analyze_frame, format_available, iter_export_bytes
+from src.ingestor import DEFAULT_PAGE_SIZE, iter_nyc_data
+from src.normalizer import normalize_building_frame
+
+logger = logging.getLogger(__name__)
+
+# Offline citywide run: the LL84 dataset is cut into fixed-size shards (by position in
+# the property_id order), each normalized and analyzed in a worker process and written
+# to its own file. manifest.json records finished shards so a rerun resumes.
+DEFAULT_SHARD_SIZE = 20_000
+MANIFEST_FILE = "manifest.json"
+
+# Shards queued per worker process; bounds how many raw shards sit in memory.
+SHARDS_IN_FLIGHT_PER_PROCESS = 2
+
+@dataclass
+class ShardResult:
+    index: int
+    file: str
+    input_records: int
+    rows: int
+    rejected: int
+    seconds: float
+    worker: int
+
+@dataclass
+class WorkerStats:
+    shards: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+@dataclass
+class RunReport:
+    """
+    What one run_batch() call did. `completed` lists the shards processed by this run and
+    `skipped` those already finished by an earlier one; `workers` is keyed by process ID.
+    """
+    output_dir: str
+    completed: List[int] = field(default_factory=list)
+    skipped: List[int] = field(default_factory=list)
+    rows: int = 0
+    seconds: float = 0.0
+    workers: Dict[int, WorkerStats] = field(default_factory=dict)
+    complete: bool = False
+
+    def lines(self) -> List[str]:
+        rate = self.rows / self.seconds if self.seconds > 0 else 0.0
+        out = [
+            f"{len(self.completed)} shards processed, {len(self.skipped)} already done, "
+            f"{self.rows:,} buildings in {self.seconds:.1f}s ({rate:,.0f} rows/s)"
+            + ("" if self.complete else " - run incomplete"),
+        ]
+        for pid, stats in sorted(self.workers.items()):
+            out.append(f"  worker {pid}: {stats.shards} shards, {stats.rows:,} rows, {stats.rows_per_sec:,.0f} rows/s")
+        return out
+
+def shard_path(output_dir: Path, index: int, fmt: str) -> Path:
+    return Path(output_dir) / f"shard-{index:05d}.{EXTENSIONS[fmt]}"
+
+def process_shard(index: int, records: List[Dict[str, Any]], output_dir: str, fmt: str, rule_version: str) -> ShardResult:
+    """
+    Normalizes and analyzes one shard and writes it atomically (temporary name, then
+    rename), so a shard file either is complete or does not exist. Runs in a worker.
+    """
+    start = time.perf_counter()
+    rules = get_rules()
+    if rules.version != rule_version:
+        raise RuntimeError(f"Worker loaded rule version {rules.version}, but the run uses {rule_version}")
+
+    buildings, rejected = normalize_building_frame(records)
+    frames = [analyze_frame(buildings, rules)] if len(buildings) else []
+    path = shard_path(Path(output_dir), index, fmt)
+    partial = path.with_name(path.name + ".partial")
+    with open(partial, "wb") as f:
+        for chunk in iter_export_bytes(frames, fmt, rule_version):
+            f.write(chunk)
+    os.replace(partial, path)
+    return ShardResult(
+        index=index,
+        file=path.name,
+        input_records=len(records),
+        rows=len(buildings),
+        rejected=len(rejected),
+        seconds=time.perf_counter() - start,
+        worker=os.getpid(),
+    )
+
+def iter_shards(pages: Iterable[List[Dict[str, Any]]], shard_size: int, first_index: int = 0) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """Regroups fetched pages into (shard index, records) of shard_size records (the last may be short)."""
+    index, buffer = first_index, []
+    for page in pages:
+        buffer.extend(page)
+        while len(buffer) >= shard_size:
+            yield index, buffer[:shard_size]
+            buffer = buffer[shard_size:]
+            index += 1
+    if buffer:
+        yield index, buffer
+
+def load_manifest(output_dir: Path) -> Optional[Dict[str, Any]]:
+    path = Path(output_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_manifest(output_dir: Path, manifest: Dict[str, Any]):
+    """Writes the manifest via a temporary file and rename, so a crash never leaves it half-written."""
+    path = Path(output_dir) / MANIFEST_FILE
+    partial = path.with_name(path.name + ".partial")
+    with open(partial, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(partial, path)
+
+def _new_manifest(fmt: str, shard_size: int, max_records: Optional[int], rule_version: str) -> Dict[str, Any]:
+    return {
+        "format": fmt,
+        "shard_size": shard_size,
+        "max_records": max_records,
+        "rule_version": rule_version,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "complete": False,
+        "total_shards": None,
+        "shards": {},
+    }
+
+def _clear_run(output_dir: Path, manifest: Dict[str, Any]):
+    for shard in manifest.get("shards", {}).values():
+        (output_dir / shard["file"]).unlink(missing_ok=True)
+    (output_dir / MANIFEST_FILE).unlink(missing_ok=True)
+
+def run_batch(
+    output_dir: Path,
+    fmt: str = "parquet",
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    processes: Optional[int] = None,
+    max_records: Optional[int] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    fetch_workers: int = 4,
+    restart: bool = False,
+) -> RunReport:
+    """
+    Runs (or resumes) the citywide batch into `output_dir`.
+    Pages are fetched in this process and regrouped into shards; shards are analyzed in
+    a pool of `processes` workers. Each finished shard is checkpointed in manifest.json.
+    A rerun skips finished shards and starts fetching at the first unfinished one; it
+    refuses to mix settings or rule versions with an earlier run unless restart=True.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {list(FORMATS)}")
+    if not format_available(fmt):
+        raise RuntimeError(f"The {fmt} format requires pyarrow")
+    if shard_size <= 0:
+        raise ValueError("shard_size must be positive")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rules = get_rules()
+    settings = {"format": fmt, "shard_size": shard_size, "max_records": max_records, "rule_version": rules.version}
+
+    # 1. Resume from the manifest, if it matches this run
+    manifest = load_manifest(output_dir)
+    if manifest is not None and restart:
+        _clear_run(output_dir, manifest)
+        manifest = None
+    if manifest is not None:
+        mismatched = {k: (manifest.get(k), v) for k, v in settings.items() if manifest.get(k) != v}
+        if mismatched:
+            raise ValueError(f"{output_dir} holds a run with different settings {mismatched}; use restart=True to discard it")
+    else:
+        manifest = _new_manifest(fmt, shard_size, max_records, rules.version)
+        save_manifest(output_dir, manifest)
+
+    report = RunReport(output_dir=str(output_dir))
+    done = {int(i) for i in manifest["shards"]}
+    if manifest["complete"]:
+        report.skipped = sorted(done)
+        report.complete = True
+        return report
+
+    first = 0
+    while first in done:
+        first += 1
+    remaining = None if max_records is None else max_records - first * shard_size
+    logger.info(f"Batch run in {output_dir}: {len(done)} shards already done, starting at shard {first}")
+
+    # 2. Fetch and fan out, keeping a bounded number of shards in flight
+    start = time.perf_counter()
+    processes = processes or os.cpu_count() or 1
+    pages = iter_nyc_data(page_size=page_size, max_records=remaining, workers=fetch_workers, chunked=True,
+                          start_offset=first * shard_size)
+    last_index = first - 1
+
+    def record(result: ShardResult):
+        manifest["shards"][str(result.index)] = asdict(result)
+        save_manifest(output_dir, manifest)
+        report.completed.append(result.index)
+        report.rows += result.rows
+        stats = report.workers.setdefault(result.worker, WorkerStats())
+        stats.shards += 1
+        stats.rows += result.rows
+        stats.seconds += result.seconds
+        logger.info(f"Shard {result.index}: {result.rows:,} buildings in {result.seconds:.2f}s (worker {result.worker})")
+
+    def collect(futures):
+        # Checkpoint every shard that succeeded before re-raising the first failure
+        error = None
+        for future in futures:
+            try:
+                record(future.result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        in_flight = set()
+        try:
+            for index, records in iter_shards(pages, shard_size, first):
+                last_index = index
+                if index in done:
+                    continue
+                if len(in_flight) >= processes * SHARDS_IN_FLIGHT_PER_PROCESS:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight.add(pool.submit(process_shard, index, records, str(output_dir), fmt, rules.version))
+            finished, in_flight = in_flight, set()
+            collect(finished)
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            raise
+
+    # 3. The stream ended, so every shard up to the last one seen exists
+    manifest["complete"] = True
+    manifest["total_shards"] = max([last_index + 1] + [i + 1 for i in done])
+    save_manifest(output_dir, manifest)
+    report.completed.sort()
+    report.skipped = sorted(done)
+    report.seconds = time.perf_counter() - start
+    report.complete = True
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze every LL84 property in sharded, resumable batches.")
+    parser.add_argument("--output-dir", type=Path, required=True, help="Directory for shard files and manifest.json")
+    parser.add_argument("--format", choices=FORMATS, default="parquet" if format_available("parquet") else "csv")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Records per shard")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum records to ingest (default: all)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--fetch-workers", type=int, default=4, help="Concurrent page fetches")
+    parser.add_argument("--restart", action="store_true", help="Discard an earlier run in --output-dir instead of resuming")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    report = run_batch(
+        args.output_dir, fmt=args.format, shard_size=args.shard_size, processes=args.processes,
+        max_records=args.limit, page_size=args.page_size, fetch_workers=args.fetch_workers, restart=args.restart,
+    )
+    print("\n".join(report.lines()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.engine.rules import get_rules
+
+def config_fingerprint() -> str:
+    """
+    Returns the version (content hash of ll97_limits.yaml + constants.yaml) of the
+    active rule table.
+    """
+    return get_rules().version
+
+class ResultCache:
+    """
+    Bounded LRU cache with per-entry TTL.
+    Every key is combined with a config fingerprint (the rule table version), so results
+    computed under an older ll97_limits.yaml / constants.yaml are never served.
+    Callers that computed a result with a specific rule table pass its version explicitly.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl_seconds: float = 300.0,
+        fingerprint: Callable[[], str] = config_fingerprint,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.fingerprint = fingerprint
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _full_key(self, key: Hashable, version: Optional[str]) -> Tuple:
+        return (version or self.fingerprint(), key)
+
+    def get(self, key: Hashable, version: Optional[str] = None) -> Optional[Any]:
+        full_key = self._full_key(key, version)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if self.clock() >= expires_at:
+                del self._entries[full_key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[str] = None):
+        full_key = self._full_key(key, version)
+        with self._lock:
+            self._entries[full_key] = (self.clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, match: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """
+        Drops every entry (match=None) or those whose key satisfies match(key).
+        Returns the number of entries removed.
+        """
+        with self._lock:
+            if match is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            stale = [k for k in self._entries if match(k[1])]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "config_fingerprint": self.fingerprint(),
+            }
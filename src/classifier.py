@@ -0,0 +1,67 @@
+import logging
+import re
+import yaml
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Pattern, Tuple
+
+from src.models import PROPERTY_TYPES
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.parent
+PROPERTY_TYPES_PATH = BASE_DIR / "config" / "property_types.yaml"
+
+# LL84 has a few hundred distinct raw use type strings, so every one of them stays cached.
+CLASSIFY_CACHE_SIZE = 4096
+
+@dataclass(frozen=True)
+class PropertyTypeClassifier:
+    """
+    Compiled form of property_types.yaml: one case-insensitive regex per category,
+    tried in file order, and the fallback type for raw types that match none.
+    """
+    categories: Tuple[Tuple[str, Pattern], ...]
+    default: str
+
+    def match(self, raw_type: str) -> Tuple[str, bool]:
+        """(LL97 property type, whether a category matched) for one raw LL84 type string."""
+        for property_type, pattern in self.categories:
+            if pattern.search(raw_type):
+                return property_type, True
+        return self.default, False
+
+def compile_classifier(path: Path = PROPERTY_TYPES_PATH) -> PropertyTypeClassifier:
+    """
+    Parses the classification table. Every category must name one of PROPERTY_TYPES.
+    """
+    with open(path, "r") as f:
+        raw = yaml.safe_load(f) or {}
+
+    default = raw.get("default", "Office")
+    categories = []
+    for entry in raw.get("categories") or []:
+        property_type = entry["type"]
+        if property_type not in PROPERTY_TYPES:
+            raise ValueError(f"{path}: unknown property type {property_type!r}; expected one of {PROPERTY_TYPES}")
+        keywords = sorted((str(k) for k in entry.get("keywords") or []), key=len, reverse=True)
+        if keywords:
+            pattern = re.compile("|".join(re.escape(k) for k in keywords), re.IGNORECASE)
+            categories.append((property_type, pattern))
+    if default not in PROPERTY_TYPES:
+        raise ValueError(f"{path}: unknown default property type {default!r}")
+    return PropertyTypeClassifier(categories=tuple(categories), default=default)
+
+_CLASSIFIER = compile_classifier()
+
+@lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+def classify_property_type(raw_type: str) -> str:
+    """
+    Maps a raw LL84 property use type onto an LL97 category, memoized per distinct string.
+    Unmatched types fall back to the table's default and are logged (once, thanks to the cache).
+    """
+    property_type, matched = _CLASSIFIER.match(raw_type)
+    if not matched:
+        logger.warning(f"Unmapped property type {raw_type!r}; using {property_type} limits")
+    return property_type
@@ -0,0 +1,345 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional
+from src.models import Building, PROPERTY_TYPES
+from src.engine.rules import RuleTable, get_rules
+from src.engine.roi import (
+    KWH_PER_THERM,
+    NPV_YEARS,
+    PENALTY_YEARS_2024,
+    PENALTY_YEARS_2030,
+)
+
+# Vectorized counterparts of calculate_penalty / calculate_roi.
+# Buildings are passed as parallel NumPy columns; property types are integer codes
+# indexing PROPERTY_TYPES (-1 = unknown type, which is never penalized).
+# Mixed-use buildings are passed separately as a UseMix over just those rows.
+
+@dataclass(frozen=True)
+class UseMix:
+    """
+    Floor-area split of the mixed-use buildings in a batch, for LL97 area-weighted limits.
+    codes/area are (m, k + 1): the listed uses (-1 / 0 in empty slots) followed by the
+    building's own type with the floor area no listed use covers. total is the floor
+    area the weights are taken over: max(gross_sq_ft, listed floor area).
+    """
+    rows: np.ndarray
+    codes: np.ndarray
+    area: np.ndarray
+    total: np.ndarray
+
+def build_use_mix(type_codes, use_codes, use_gfa, gross_sq_ft) -> Optional[UseMix]:
+    """
+    Collects the mixed-use buildings from (n, k) use type codes and floor areas (-1 / 0 in
+    empty slots). Only buildings with a use of another type than their own are kept;
+    returns None if there are none.
+    """
+    if use_codes is None or use_gfa is None or np.size(use_codes) == 0:
+        return None
+    type_codes = np.asarray(type_codes, dtype=np.int64)
+    use_codes = np.asarray(use_codes, dtype=np.int64).reshape(len(type_codes), -1)
+    use_gfa = np.asarray(use_gfa, dtype=np.float64).reshape(len(type_codes), -1)
+    listed = use_gfa > 0
+    rows = np.flatnonzero((listed & (use_codes != type_codes[:, None])).any(axis=1))
+    if len(rows) == 0:
+        return None
+
+    codes, gfa = use_codes[rows], np.where(listed[rows], use_gfa[rows], 0.0)
+    covered = np.zeros(len(rows))
+    for j in range(gfa.shape[1]):
+        covered += gfa[:, j]
+    total = np.maximum(np.asarray(gross_sq_ft, dtype=np.float64)[rows], covered)
+    return UseMix(
+        rows=rows,
+        codes=np.column_stack([codes, type_codes[rows]]),
+        area=np.column_stack([gfa, total - covered]),
+        total=total,
+    )
+
+def encode_use_mix(type_codes, use_types, use_gfa, gross_sq_ft) -> Optional[UseMix]:
+    """
+    build_use_mix for (n, k) property type names (None in empty slots), e.g. the
+    use_type_* / use_gfa_* columns of normalize_building_frame.
+    """
+    use_types = np.asarray(use_types, dtype=object)
+    if use_types.size == 0:
+        return None
+    use_codes = encode_property_types(use_types.reshape(-1)).reshape(use_types.shape)
+    return build_use_mix(type_codes, use_codes, use_gfa, gross_sq_ft)
+
+def encode_property_types(property_types: Iterable[str]) -> np.ndarray:
+    """
+    Converts property type names into integer codes (index into PROPERTY_TYPES, -1 if unknown).
+    """
+    lookup = {name: code for code, name in enumerate(PROPERTY_TYPES)}
+    return np.array([lookup.get(t, -1) for t in property_types], dtype=np.int64)
+
+def buildings_to_columns(buildings: List[Building]) -> Dict[str, np.ndarray]:
+    """
+    Converts a list of Building models into the column layout used by the batch engine.
+    """
+    sqft = np.array([b.gross_sq_ft for b in buildings], dtype=np.float64)
+    type_codes = encode_property_types(b.property_type for b in buildings)
+    use_types, use_gfa = use_slots(buildings)
+    return {
+        "gross_sq_ft": sqft,
+        "annual_gas_usage_therms": np.array([b.annual_gas_usage_therms for b in buildings], dtype=np.float64),
+        "annual_elec_usage_kwh": np.array([b.annual_elec_usage_kwh for b in buildings], dtype=np.float64),
+        "type_codes": type_codes,
+        "use_mix": encode_use_mix(type_codes, use_types, use_gfa, sqft),
+    }
+
+def use_slots(buildings: List[Building]):
+    """
+    Building.use_mix as (n, k) arrays of property type names (None in empty slots) and
+    floor areas, k being the longest mix. Slots keep the dict order.
+    """
+    slots = max([len(b.use_mix) for b in buildings if b.use_mix] or [0])
+    use_types = np.full((len(buildings), slots), None, dtype=object)
+    use_gfa = np.zeros((len(buildings), slots))
+    for i, b in enumerate(buildings):
+        for j, (use_type, gfa) in enumerate((b.use_mix or {}).items()):
+            use_types[i, j], use_gfa[i, j] = use_type, gfa
+    return use_types, use_gfa
+
+def round_half_even(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Rounds like Python's built-in round() on floats.
+    np.round scales by 10**ndigits first, which can flip values sitting exactly on a
+    decimal half (e.g. 2.675). Those rare elements are re-rounded with round().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, ndigits)
+    near_half = _near_half(values * (10.0 ** ndigits))
+    if near_half.any():
+        rounded = rounded.copy()
+        flat_values = values.reshape(-1)
+        flat = rounded.reshape(-1)
+        for i in np.flatnonzero(near_half.reshape(-1)):
+            flat[i] = round(float(flat_values[i]), ndigits)
+    return rounded
+
+def _near_half(scaled: np.ndarray) -> np.ndarray:
+    """Flags scaled values within a few ULPs of a .5 fraction (the only ones np.round can get wrong)."""
+    return np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) <= 4 * np.abs(np.spacing(scaled))
+
+def limit_factors(type_codes: np.ndarray, year: int, rules: RuleTable, mix: Optional[UseMix] = None) -> np.ndarray:
+    """
+    Looks up kgCO2e/sqft limits per building; NaN for unknown types or years before 2024.
+    Mixed-use buildings in `mix` get the area-weighted limit of their uses.
+    """
+    period = rules.period_index(year)
+    if period < 0:
+        return np.full(np.shape(type_codes), np.nan)
+    factors = rules.limits[rules.type_rows(type_codes), period]
+    if mix is not None:
+        factors[mix.rows] = _mixed_limits(mix, rules.limits[:, period], rules)
+    return factors
+
+def _mixed_limits(mix: UseMix, table: np.ndarray, rules: RuleTable) -> np.ndarray:
+    """
+    Area-weighted limits of the mixed-use rows. table is rules.limits or one column of it;
+    slots are summed in order, as in penalty.limit_factor.
+    """
+    factors = table[rules.type_rows(mix.codes)]
+    extra = (None,) * (factors.ndim - 2)
+    area = mix.area[(...,) + extra]
+    weighted = np.zeros(factors.shape[:1] + factors.shape[2:])
+    for j in range(factors.shape[1]):
+        weighted += np.where(area[:, j] > 0, area[:, j] * factors[:, j], 0.0)
+    weighted = weighted / mix.total[(...,) + extra]
+    # A building with no limit of its own stays without one
+    return np.where(np.isnan(factors[:, -1]), np.nan, weighted)
+
+def calculate_emissions_batch(
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    rules: Optional[RuleTable] = None,
+) -> np.ndarray:
+    """
+    Calculates total annual emissions in tCO2e for each building.
+    """
+    constants = (rules or get_rules()).constants
+    gas_emissions = np.asarray(annual_gas_usage_therms, dtype=np.float64) * constants["EMISSION_FACTOR_GAS_TCO2E_PER_THERM"]
+    elec_emissions = np.asarray(annual_elec_usage_kwh, dtype=np.float64) * constants["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]
+    return gas_emissions + elec_emissions
+
+def calculate_penalties_batch(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    year: int,
+    rules: Optional[RuleTable] = None,
+    mix: Optional[UseMix] = None,
+) -> np.ndarray:
+    """
+    Calculates estimated LL97 penalties for a given year across many buildings.
+    Element-wise identical to calculate_penalty.
+    """
+    rules = rules or get_rules()
+    sqft = np.asarray(gross_sq_ft, dtype=np.float64)
+    if rules.period_index(year) < 0:
+        return np.zeros_like(sqft)
+
+    limit_factor = limit_factors(type_codes, year, rules, mix)
+    return _penalties(sqft, annual_gas_usage_therms, annual_elec_usage_kwh, limit_factor, rules.constants)
+
+def _penalties(sqft, gas, elec, limit_factor, constants: Mapping) -> np.ndarray:
+    """
+    Penalty math shared by the batch functions. All arguments broadcast against each
+    other, and constants may hold arrays (used by the sweep / Monte Carlo engines).
+    """
+    annual_limit_tco2e = sqft * (limit_factor / 1000.0)
+    gas_emissions = np.asarray(gas, dtype=np.float64) * constants["EMISSION_FACTOR_GAS_TCO2E_PER_THERM"]
+    elec_emissions = np.asarray(elec, dtype=np.float64) * constants["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]
+    actual_emissions_tco2e = gas_emissions + elec_emissions
+
+    excess_emissions = np.maximum(0.0, actual_emissions_tco2e - annual_limit_tco2e)
+    penalty = round_half_even(excess_emissions * constants["PENALTY_RATE_PER_TON"], 2)
+
+    # Unknown property types carry no limit and therefore no penalty
+    return np.where(np.isnan(limit_factor), 0.0, penalty)
+
+def calculate_penalty_matrix(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    years: Iterable[int],
+    rules: Optional[RuleTable] = None,
+    mix: Optional[UseMix] = None,
+) -> np.ndarray:
+    """
+    Calculates a buildings x years penalty matrix in one broadcast.
+    Penalties are computed once per compliance period and then fanned out to the
+    requested years; element [i, j] equals calculate_penalty(building_i, years[j]).
+    """
+    rules = rules or get_rules()
+    sqft = np.asarray(gross_sq_ft, dtype=np.float64)
+    years = np.asarray(list(years), dtype=np.int64)
+
+    # (n, periods) limits -> (n, periods) penalties
+    limit_factor = rules.limits[rules.type_rows(type_codes)]
+    if mix is not None:
+        limit_factor[mix.rows] = _mixed_limits(mix, rules.limits, rules)
+    gas = np.asarray(annual_gas_usage_therms, dtype=np.float64)[:, None]
+    elec = np.asarray(annual_elec_usage_kwh, dtype=np.float64)[:, None]
+    by_period = _penalties(sqft[:, None], gas, elec, limit_factor, rules.constants)
+
+    # Append a zero column for years before the first compliance period (index -1)
+    by_period = np.concatenate([by_period, np.zeros((sqft.shape[0], 1))], axis=1)
+    period_index = np.searchsorted(rules.periods, years, side="right") - 1
+    return by_period[:, period_index]
+
+def calculate_roi_batch(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    rules: Optional[RuleTable] = None,
+    mix: Optional[UseMix] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Calculates electrification ROI across many buildings.
+    Returns the same keys as calculate_roi, each holding one value per building.
+    """
+    rules = rules or get_rules()
+    constants = rules.constants
+    sqft = np.asarray(gross_sq_ft, dtype=np.float64)
+    flows = electrification_cashflows(
+        sqft,
+        np.asarray(annual_gas_usage_therms, dtype=np.float64),
+        np.asarray(annual_elec_usage_kwh, dtype=np.float64),
+        limit_factors(type_codes, 2024, rules, mix),
+        limit_factors(type_codes, 2030, rules, mix),
+        constants,
+    )
+    annual_savings = flows["annual_savings"]
+    investment_cost = flows["investment_cost"]
+
+    payback = simple_payback(investment_cost, annual_savings)
+    npv = npv_exact(investment_cost, annual_savings, constants["DISCOUNT_RATE"])
+
+    return {
+        "baseline_opex": round_half_even(flows["baseline_opex"], 2),
+        "new_opex": round_half_even(flows["new_opex"], 2),
+        "annual_savings": round_half_even(annual_savings, 2),
+        "investment_cost": round_half_even(investment_cost, 2),
+        "simple_payback_years": round_half_even(payback, 1),
+        # calculate_roi rounds the NumPy scalar returned by npf.npv, i.e. with np.round
+        "npv": np.round(npv, 2),
+        "baseline_penalty_avg": round_half_even(flows["baseline_penalty_avg"], 2),
+        "new_penalty_avg": round_half_even(flows["new_penalty_avg"], 2),
+    }
+
+def electrification_cashflows(sqft, gas, elec, limit_2024, limit_2030, constants: Mapping) -> Dict[str, np.ndarray]:
+    """
+    Annual cash-flow components of the boiler -> heat pump retrofit, unrounded.
+    Follows calculate_roi step by step. Inputs broadcast, so constants may be arrays
+    shaped to add parameter axes after the building axis.
+    """
+    # --- 1. Baseline Financials ---
+    current_gas_cost = gas * constants["GAS_COST_PER_THERM"]
+    current_elec_cost = elec * constants["ELEC_COST_PER_KWH"]
+
+    penalty_2024 = _penalties(sqft, gas, elec, limit_2024, constants)
+    penalty_2030 = _penalties(sqft, gas, elec, limit_2030, constants)
+    avg_annual_penalty = ((penalty_2024 * PENALTY_YEARS_2024) + (penalty_2030 * PENALTY_YEARS_2030)) / NPV_YEARS
+
+    baseline_opex = current_gas_cost + current_elec_cost + avg_annual_penalty
+
+    # --- 2. Intervention: Electrification ---
+    heating_load_therms = gas * constants["GAS_BOILER_EFFICIENCY"]
+    heating_load_kwh_thermal = heating_load_therms * KWH_PER_THERM
+    new_heating_elec_kwh = heating_load_kwh_thermal / constants["HEAT_PUMP_COP"]
+
+    new_gas_usage = np.zeros_like(gas)
+    new_elec_usage = elec + new_heating_elec_kwh
+
+    # --- 3. New Financials ---
+    new_elec_cost = new_elec_usage * constants["ELEC_COST_PER_KWH"]
+
+    new_penalty_2024 = _penalties(sqft, new_gas_usage, new_elec_usage, limit_2024, constants)
+    new_penalty_2030 = _penalties(sqft, new_gas_usage, new_elec_usage, limit_2030, constants)
+    new_avg_penalty = ((new_penalty_2024 * PENALTY_YEARS_2024) + (new_penalty_2030 * PENALTY_YEARS_2030)) / NPV_YEARS
+
+    new_opex = 0.0 + new_elec_cost + new_avg_penalty
+
+    # --- 4. ROI Inputs ---
+    return {
+        "baseline_opex": baseline_opex,
+        "new_opex": new_opex,
+        "annual_savings": baseline_opex - new_opex,
+        "investment_cost": sqft * constants["RETROFIT_COST_PER_SQFT"],
+        "baseline_penalty_avg": avg_annual_penalty,
+        "new_penalty_avg": new_avg_penalty,
+    }
+
+def npv_exact(investment_cost: np.ndarray, annual_savings: np.ndarray, discount_rate: float) -> np.ndarray:
+    """
+    NPV (15 years) per building with the same (n, years) layout and row-wise sum as
+    numpy_financial.npv, so it matches calculate_roi bit for bit.
+    """
+    cash_flows = np.empty((investment_cost.shape[0], NPV_YEARS + 1), dtype=np.float64)
+    cash_flows[:, 0] = -investment_cost
+    cash_flows[:, 1:] = annual_savings[:, None]
+    discount = (1 + discount_rate) ** np.arange(0, NPV_YEARS + 1)
+    return (cash_flows / discount).sum(axis=1)
+
+def npv_from_annuity(investment_cost, annual_savings, discount_rate) -> np.ndarray:
+    """
+    NPV of -investment now plus NPV_YEARS of equal savings, for broadcast rate arrays.
+    Mathematically equal to the numpy_financial.npv form used by calculate_roi, but
+    not bit-identical; used by the sweep and Monte Carlo engines.
+    """
+    rate = np.asarray(discount_rate, dtype=np.float64)
+    annuity = ((1 + rate)[..., None] ** -np.arange(1, NPV_YEARS + 1)).sum(axis=-1)
+    return annual_savings * annuity - investment_cost
+
+def simple_payback(investment_cost, annual_savings) -> np.ndarray:
+    """Investment / annual savings, or -1.0 where the retrofit never pays back."""
+    investment_cost, annual_savings = np.broadcast_arrays(investment_cost, annual_savings)
+    payback = np.full(annual_savings.shape, -1.0)
+    np.divide(investment_cost, annual_savings, out=payback, where=annual_savings > 0)
+    return payback
@@ -0,0 +1,316 @@
+import logging
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from src.engine.batch import limit_factors, npv_exact, round_half_even, simple_payback
+from src.engine.rules import RuleTable, get_rules
+from src.engine.roi import KWH_PER_THERM, NPV_YEARS, PENALTY_YEARS_2024, PENALTY_YEARS_2030
+
+logger = logging.getLogger(__name__)
+
+# Building columns the graph starts from (the buildings_to_columns layout).
+INPUT_COLUMNS = ("gross_sq_ft", "annual_gas_usage_therms", "annual_elec_usage_kwh", "type_codes")
+
+# Pseudo-parameter for the LL97 limit table, alongside the constants.yaml names.
+LIMITS = "limits"
+
+# Above this share of dirty rows a node is recomputed in one full pass instead of patched.
+FULL_RECOMPUTE_FRACTION = 0.25
+
+@dataclass(frozen=True)
+class Node:
+    """
+    One derived quantity. `compute(v, p)` gets the values of `inputs` (building columns
+    or other nodes, sliced to the rows being recomputed) and the parameter mapping, and
+    returns one value per row. `parameters` lists the constants it reads.
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    parameters: Tuple[str, ...]
+    compute: Callable[[Mapping[str, np.ndarray], Mapping], np.ndarray]
+
+def _limit_node(year: int) -> Node:
+    return Node(
+        f"limit_factor_{year}", ("type_codes",), (LIMITS,),
+        lambda v, p: limit_factors(v["type_codes"], year, p[LIMITS]),
+    )
+
+def _limit_tco2e_node(year: int) -> Node:
+    return Node(
+        f"limit_tco2e_{year}", ("gross_sq_ft", f"limit_factor_{year}"), (),
+        lambda v, p: v["gross_sq_ft"] * (v[f"limit_factor_{year}"] / 1000.0),
+    )
+
+def _penalty_node(name: str, emissions: str, year: int) -> Node:
+    def compute(v, p):
+        excess_emissions = np.maximum(0.0, v[emissions] - v[f"limit_tco2e_{year}"])
+        penalty = round_half_even(excess_emissions * p["PENALTY_RATE_PER_TON"], 2)
+        # Unknown property types carry no limit and therefore no penalty
+        return np.where(np.isnan(v[f"limit_factor_{year}"]), 0.0, penalty)
+    return Node(name, (emissions, f"limit_tco2e_{year}", f"limit_factor_{year}"), ("PENALTY_RATE_PER_TON",), compute)
+
+def _penalty_avg_node(name: str, penalty_2024: str, penalty_2030: str) -> Node:
+    return Node(
+        name, (penalty_2024, penalty_2030), (),
+        lambda v, p: ((v[penalty_2024] * PENALTY_YEARS_2024) + (v[penalty_2030] * PENALTY_YEARS_2030)) / NPV_YEARS,
+    )
+
+# The calculate_penalty / calculate_roi chain, in topological order:
+# inputs -> emissions -> limits -> penalties -> opex -> NPV.
+# Every node repeats the batch engine's arithmetic in the same order, so the outputs
+# are identical to calculate_penalties_batch / calculate_roi_batch.
+NODES: Tuple[Node, ...] = (
+    # 1. Emissions
+    Node("gas_emissions", ("annual_gas_usage_therms",), ("EMISSION_FACTOR_GAS_TCO2E_PER_THERM",),
+         lambda v, p: v["annual_gas_usage_therms"] * p["EMISSION_FACTOR_GAS_TCO2E_PER_THERM"]),
+    Node("elec_emissions", ("annual_elec_usage_kwh",), ("EMISSION_FACTOR_ELEC_TCO2E_PER_KWH",),
+         lambda v, p: v["annual_elec_usage_kwh"] * p["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]),
+    Node("emissions", ("gas_emissions", "elec_emissions"), (),
+         lambda v, p: v["gas_emissions"] + v["elec_emissions"]),
+    # 2. Limits
+    _limit_node(2024),
+    _limit_node(2030),
+    _limit_tco2e_node(2024),
+    _limit_tco2e_node(2030),
+    # 3. Baseline penalties
+    _penalty_node("penalty_2024", "emissions", 2024),
+    _penalty_node("penalty_2030", "emissions", 2030),
+    _penalty_avg_node("baseline_penalty_avg", "penalty_2024", "penalty_2030"),
+    # 4. Electrification: usage and emissions after the retrofit
+    Node("new_elec_usage", ("annual_gas_usage_therms", "annual_elec_usage_kwh"), ("GAS_BOILER_EFFICIENCY", "HEAT_PUMP_COP"),
+         lambda v, p: v["annual_elec_usage_kwh"]
+         + v["annual_gas_usage_therms"] * p["GAS_BOILER_EFFICIENCY"] * KWH_PER_THERM / p["HEAT_PUMP_COP"]),
+    Node("new_emissions", ("new_elec_usage",), ("EMISSION_FACTOR_GAS_TCO2E_PER_THERM", "EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"),
+         lambda v, p: 0.0 * p["EMISSION_FACTOR_GAS_TCO2E_PER_THERM"] + v["new_elec_usage"] * p["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]),
+    _penalty_node("new_penalty_2024", "new_emissions", 2024),
+    _penalty_node("new_penalty_2030", "new_emissions", 2030),
+    _penalty_avg_node("new_penalty_avg", "new_penalty_2024", "new_penalty_2030"),
+    # 5. Operating cost
+    Node("baseline_energy_cost", ("annual_gas_usage_therms", "annual_elec_usage_kwh"), ("GAS_COST_PER_THERM", "ELEC_COST_PER_KWH"),
+         lambda v, p: v["annual_gas_usage_therms"] * p["GAS_COST_PER_THERM"] + v["annual_elec_usage_kwh"] * p["ELEC_COST_PER_KWH"]),
+    Node("baseline_opex", ("baseline_energy_cost", "baseline_penalty_avg"), (),
+         lambda v, p: v["baseline_energy_cost"] + v["baseline_penalty_avg"]),
+    Node("new_opex", ("new_elec_usage", "new_penalty_avg"), ("ELEC_COST_PER_KWH",),
+         lambda v, p: 0.0 + v["new_elec_usage"] * p["ELEC_COST_PER_KWH"] + v["new_penalty_avg"]),
+    Node("annual_savings", ("baseline_opex", "new_opex"), (),
+         lambda v, p: v["baseline_opex"] - v["new_opex"]),
+    # 6. Investment and NPV
+    Node("investment_cost", ("gross_sq_ft",), ("RETROFIT_COST_PER_SQFT",),
+         lambda v, p: v["gross_sq_ft"] * p["RETROFIT_COST_PER_SQFT"]),
+    Node("simple_payback_years", ("investment_cost", "annual_savings"), (),
+         lambda v, p: simple_payback(v["investment_cost"], v["annual_savings"])),
+    Node("npv", ("investment_cost", "annual_savings"), ("DISCOUNT_RATE",),
+         lambda v, p: npv_exact(v["investment_cost"], v["annual_savings"], p["DISCOUNT_RATE"])),
+)
+
+# Rounding applied by results(), matching calculate_roi_batch (np.round for NPV, as there).
+ROI_ROUNDING = {
+    "baseline_opex": 2,
+    "new_opex": 2,
+    "annual_savings": 2,
+    "investment_cost": 2,
+    "simple_payback_years": 1,
+    "npv": 2,
+    "baseline_penalty_avg": 2,
+    "new_penalty_avg": 2,
+}
+
+@dataclass
+class RecomputeReport:
+    """
+    What one evaluate() call did. `recomputed` maps node -> rows recomputed (all rows
+    for a full pass); `reused` lists nodes served from memo; `causes` lists the changes
+    that invalidated nodes since the previous evaluation.
+    """
+    n_rows: int
+    recomputed: Dict[str, int] = field(default_factory=dict)
+    reused: List[str] = field(default_factory=list)
+    causes: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def lines(self) -> List[str]:
+        out = [f"Changes: {', '.join(self.causes) if self.causes else 'none'}"]
+        for name, rows in self.recomputed.items():
+            out.append(f"  recomputed {name}: {rows:,} of {self.n_rows:,} rows")
+        if self.reused:
+            out.append(f"  reused: {', '.join(self.reused)}")
+        out.append(f"  took {self.seconds * 1000:.2f} ms")
+        return out
+
+    def __str__(self) -> str:
+        return "\n".join(self.lines())
+
+class CalculationGraph:
+    """
+    Memoized dependency graph over the penalty/ROI calculation for a set of buildings.
+    Changing a parameter marks only the nodes that read it (and their dependents) dirty;
+    changing one building's inputs marks only that row. evaluate() then recomputes the
+    dirty parts and reports what it did.
+
+    Arrays returned by evaluate() are the graph's memo: later evaluations patch them in
+    place, so copy them to keep a snapshot.
+    """
+
+    def __init__(self, columns: Mapping[str, np.ndarray], rules: Optional[RuleTable] = None):
+        missing = set(INPUT_COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(f"Missing input columns {sorted(missing)}")
+        self.rules = rules or get_rules()
+        self.columns = {
+            name: np.array(columns[name], dtype=np.int64 if name == "type_codes" else np.float64)
+            for name in INPUT_COLUMNS
+        }
+        self.n_rows = len(self.columns["type_codes"])
+        self.parameters: Dict[str, object] = dict(self.rules.constants)
+        self.parameters[LIMITS] = self.rules
+
+        self.nodes = {node.name: node for node in NODES}
+        # Sources (columns, parameters, nodes) -> every node downstream of them, in topological order
+        self._downstream: Dict[str, List[str]] = {}
+        for node in NODES:
+            for source in node.inputs + node.parameters:
+                for upstream in [source] + [s for s, nodes in self._downstream.items() if source in nodes]:
+                    affected = self._downstream.setdefault(upstream, [])
+                    if node.name not in affected:
+                        affected.append(node.name)
+
+        self._memo: Dict[str, Optional[np.ndarray]] = {node.name: None for node in NODES}
+        self._dirty_rows: Dict[str, List[np.ndarray]] = {node.name: [] for node in NODES}
+        self._causes: List[str] = ["initial build"]
+        self.last_report: Optional[RecomputeReport] = None
+
+    # --- Invalidation ---
+
+    def set_parameter(self, name: str, value):
+        """Overrides one constant; nodes downstream of it are fully invalidated."""
+        if name == LIMITS or name not in self.parameters:
+            raise ValueError(f"Unknown parameter {name!r}; limit tables are changed with set_rules()")
+        if self.parameters[name] == value:
+            return
+        self.parameters[name] = value
+        self._invalidate_all(name, f"{name} changed")
+
+    def set_rules(self, rules: RuleTable):
+        """
+        Switches to a new rule table. Only constants whose value differs, and the limit
+        table if it differs, invalidate anything.
+        """
+        old = self.rules
+        self.rules = rules
+        for name, value in rules.constants.items():
+            if self.parameters.get(name) != value:
+                self.parameters[name] = value
+                self._invalidate_all(name, f"{name} changed")
+        if old.periods != rules.periods or old.property_types != rules.property_types or not np.array_equal(
+            old.limits, rules.limits, equal_nan=True
+        ):
+            self._invalidate_all(LIMITS, "LL97 limits changed")
+        self.parameters[LIMITS] = rules
+
+    def update_rows(self, rows: Sequence[int], **columns: Sequence[float]):
+        """
+        Replaces input values for the given rows, e.g.
+            graph.update_rows([17], annual_gas_usage_therms=[12_000.0])
+        Only rows whose values actually change are invalidated, and only in the nodes
+        downstream of the changed columns.
+        """
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        unknown = set(columns) - set(INPUT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown input columns {sorted(unknown)}; expected some of {list(INPUT_COLUMNS)}")
+        for name, values in columns.items():
+            current = self.columns[name]
+            values = np.broadcast_to(np.asarray(values, dtype=current.dtype), rows.shape)
+            changed = current[rows] != values
+            if not changed.any():
+                continue
+            current[rows[changed]] = values[changed]
+            changed_rows = np.unique(rows[changed])
+            for node in self._downstream.get(name, []):
+                if self._memo[node] is not None:
+                    self._dirty_rows[node].append(changed_rows)
+            self._causes.append(f"{name} changed for {len(changed_rows):,} rows")
+
+    def _invalidate_all(self, source: str, cause: str):
+        for node in self._downstream.get(source, []):
+            self._memo[node] = None
+            self._dirty_rows[node] = []
+        self._causes.append(cause)
+
+    # --- Evaluation ---
+
+    def evaluate(self, outputs: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Brings the requested nodes (default: all) up to date and returns their values.
+        The report is left in `last_report`.
+        """
+        start = time.perf_counter()
+        names = list(outputs) if outputs is not None else list(self.nodes)
+        unknown = set(names) - set(self.nodes)
+        if unknown:
+            raise ValueError(f"Unknown nodes {sorted(unknown)}")
+        needed = self._upstream_closure(names)
+
+        report = RecomputeReport(n_rows=self.n_rows, causes=self._causes)
+        for node in NODES:
+            if node.name not in needed:
+                continue
+            rows = self._refresh(node)
+            if rows:
+                report.recomputed[node.name] = rows
+            else:
+                report.reused.append(node.name)
+        self._causes = []
+        report.seconds = time.perf_counter() - start
+        self.last_report = report
+        if report.recomputed:
+            logger.debug(f"Calculation graph recomputed {len(report.recomputed)} nodes, reused {len(report.reused)}")
+        return {name: self._memo[name] for name in names}
+
+    def results(self) -> Dict[str, np.ndarray]:
+        """
+        The calculate_roi_batch fields (rounded the same way) plus emissions and the
+        2024/2030 penalties.
+        """
+        values = self.evaluate(list(ROI_ROUNDING) + ["emissions", "penalty_2024", "penalty_2030"])
+        out = {
+            name: np.round(values[name], digits) if name == "npv" else round_half_even(values[name], digits)
+            for name, digits in ROI_ROUNDING.items()
+        }
+        out["emissions_tco2e"] = values["emissions"].copy()
+        out["penalty_2024"] = values["penalty_2024"].copy()
+        out["penalty_2030"] = values["penalty_2030"].copy()
+        return out
+
+    def _upstream_closure(self, names: List[str]) -> set:
+        needed, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name in needed or name not in self.nodes:
+                continue
+            needed.add(name)
+            stack.extend(self.nodes[name].inputs)
+        return needed
+
+    def _value(self, name: str) -> np.ndarray:
+        return self.columns[name] if name in self.columns else self._memo[name]
+
+    def _refresh(self, node: Node) -> int:
+        """Recomputes what is dirty in `node` (its inputs are already current); returns rows recomputed."""
+        memo = self._memo[node.name]
+        pending = self._dirty_rows[node.name]
+        if memo is not None and not pending:
+            return 0
+
+        rows = np.unique(np.concatenate(pending)) if memo is not None else None
+        self._dirty_rows[node.name] = []
+        if rows is None or len(rows) > FULL_RECOMPUTE_FRACTION * self.n_rows:
+            inputs = {name: self._value(name) for name in node.inputs}
+            self._memo[node.name] = np.asarray(node.compute(inputs, self.parameters), dtype=np.float64)
+            return self.n_rows
+
+        inputs = {name: self._value(name)[rows] for name in node.inputs}
+        memo[rows] = node.compute(inputs, self.parameters)
+        return len(rows)
@@ -0,0 +1,187 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from src.engine.batch import UseMix, electrification_cashflows, limit_factors, npv_from_annuity, simple_payback
+from src.engine.rules import RuleTable, get_rules
+
+# Constants that can be given a distribution; EMISSION_FACTOR_ELEC_TCO2E_PER_KWH is the grid factor.
+UNCERTAIN_PARAMETERS = (
+    "GAS_COST_PER_THERM",
+    "ELEC_COST_PER_KWH",
+    "HEAT_PUMP_COP",
+    "RETROFIT_COST_PER_SQFT",
+    "EMISSION_FACTOR_ELEC_TCO2E_PER_KWH",
+)
+
+# Sampled values are clipped here so a wide normal can't produce negative prices or COP.
+MIN_VALUES = {"HEAT_PUMP_COP": 0.5}
+
+# Upper bound on buildings x draws evaluated at once (bounds memory per block).
+DEFAULT_MAX_CELLS = 2_000_000
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    A sampling distribution for one parameter.
+      fixed:      value
+      uniform:    low, high
+      triangular: low, mode, high
+      normal:     mean, std
+      lognormal:  median, sigma (std of log(value))
+    """
+    kind: str
+    value: float = None
+    low: float = None
+    mode: float = None
+    high: float = None
+    mean: float = None
+    std: float = None
+    median: float = None
+    sigma: float = None
+
+    def __post_init__(self):
+        required = {
+            "fixed": ["value"],
+            "uniform": ["low", "high"],
+            "triangular": ["low", "mode", "high"],
+            "normal": ["mean", "std"],
+            "lognormal": ["median", "sigma"],
+        }
+        if self.kind not in required:
+            raise ValueError(f"Unknown distribution kind {self.kind!r}; expected one of {list(required)}")
+        missing = [f for f in required[self.kind] if getattr(self, f) is None]
+        if missing:
+            raise ValueError(f"{self.kind} distribution requires {missing}")
+        if self.kind in ("uniform", "triangular") and self.low > self.high:
+            raise ValueError("low must be <= high")
+        if self.kind == "triangular" and not self.low <= self.mode <= self.high:
+            raise ValueError("mode must lie between low and high")
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        if self.kind == "fixed":
+            return np.full(size, float(self.value))
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high, size)
+        if self.kind == "triangular":
+            if self.low == self.high:
+                return np.full(size, float(self.low))
+            return rng.triangular(self.low, self.mode, self.high, size)
+        if self.kind == "normal":
+            return rng.normal(self.mean, self.std, size)
+        return rng.lognormal(np.log(self.median), self.sigma, size)
+
+def default_distributions(rules: Optional[RuleTable] = None) -> Dict[str, Distribution]:
+    """
+    Reasonable spreads around constants.yaml: lognormal energy prices, triangular
+    COP and retrofit cost (skewed toward overruns), and a grid getting cleaner.
+    """
+    c = (rules or get_rules()).constants
+    return {
+        "GAS_COST_PER_THERM": Distribution("lognormal", median=c["GAS_COST_PER_THERM"], sigma=0.2),
+        "ELEC_COST_PER_KWH": Distribution("lognormal", median=c["ELEC_COST_PER_KWH"], sigma=0.15),
+        "HEAT_PUMP_COP": Distribution("triangular", low=c["HEAT_PUMP_COP"] * 0.8, mode=c["HEAT_PUMP_COP"], high=c["HEAT_PUMP_COP"] * 1.15),
+        "RETROFIT_COST_PER_SQFT": Distribution("triangular", low=c["RETROFIT_COST_PER_SQFT"] * 0.8, mode=c["RETROFIT_COST_PER_SQFT"], high=c["RETROFIT_COST_PER_SQFT"] * 1.4),
+        "EMISSION_FACTOR_ELEC_TCO2E_PER_KWH": Distribution("uniform", low=c["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"] * 0.7, high=c["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]),
+    }
+
+@dataclass
+class MonteCarloResult:
+    """
+    Per-building summaries; quantile arrays are shaped (n_buildings, len(quantiles)).
+    A payback quantile of -1.0 means that share of draws never pays back.
+    """
+    quantiles: List[float]
+    npv_quantiles: np.ndarray
+    payback_quantiles: np.ndarray
+    prob_positive_npv: np.ndarray
+    n_draws: int
+    seed: int
+    rule_version: str
+
+def sample_parameters(
+    distributions: Dict[str, Distribution], n_draws: int, seed: int
+) -> Dict[str, np.ndarray]:
+    """
+    Draws n_draws values per parameter. Draws are shared by all buildings (these are
+    market/technology uncertainties, not building-specific), so they are tiny to hold.
+    """
+    unknown = set(distributions) - set(UNCERTAIN_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Cannot sample {sorted(unknown)}; allowed parameters are {list(UNCERTAIN_PARAMETERS)}")
+    rng = np.random.default_rng(seed)
+    # Fixed order so a given seed always yields the same draws
+    return {
+        name: np.maximum(distributions[name].sample(rng, n_draws), MIN_VALUES.get(name, 0.0))
+        for name in UNCERTAIN_PARAMETERS
+        if name in distributions
+    }
+
+def simulate_roi(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    distributions: Optional[Dict[str, Distribution]] = None,
+    n_draws: int = 10_000,
+    seed: int = 0,
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    rules: Optional[RuleTable] = None,
+    max_cells: int = DEFAULT_MAX_CELLS,
+    mix: Optional[UseMix] = None,
+) -> MonteCarloResult:
+    """
+    Seeded Monte Carlo of the electrification NPV and payback.
+    Buildings are processed in blocks so at most `max_cells` building x draw values
+    exist at a time; results do not depend on the block size.
+    """
+    rules = rules or get_rules()
+    if n_draws < 1:
+        raise ValueError("n_draws must be >= 1")
+    distributions = default_distributions(rules) if distributions is None else distributions
+    draws = sample_parameters(distributions, n_draws, seed)
+
+    constants = dict(rules.constants)
+    for name, values in draws.items():
+        constants[name] = values[None, :]
+
+    sqft = np.asarray(gross_sq_ft, dtype=np.float64)
+    gas = np.asarray(annual_gas_usage_therms, dtype=np.float64)
+    elec = np.asarray(annual_elec_usage_kwh, dtype=np.float64)
+    limit_2024 = limit_factors(type_codes, 2024, rules, mix)
+    limit_2030 = limit_factors(type_codes, 2030, rules, mix)
+    # Discount rate is not uncertain here, so one annuity factor serves every draw
+    quantiles = [float(q) for q in quantiles]
+
+    n = sqft.shape[0]
+    npv_q = np.empty((n, len(quantiles)))
+    payback_q = np.empty((n, len(quantiles)))
+    prob_positive = np.empty(n)
+
+    block = max(1, max_cells // n_draws)
+    for a in range(0, n, block):
+        b = min(a + block, n)
+        flows = electrification_cashflows(
+            sqft[a:b, None], gas[a:b, None], elec[a:b, None], limit_2024[a:b, None], limit_2030[a:b, None], constants
+        )
+        npv = npv_from_annuity(flows["investment_cost"], flows["annual_savings"], constants["DISCOUNT_RATE"])
+        npv = np.broadcast_to(npv, (b - a, n_draws))
+        payback = np.broadcast_to(simple_payback(flows["investment_cost"], flows["annual_savings"]), (b - a, n_draws))
+
+        npv_q[a:b] = np.quantile(npv, quantiles, axis=1).T
+        # Never-paying draws rank as the longest paybacks, then map back to -1
+        payback_rank = np.where(payback < 0, np.inf, payback)
+        q = np.quantile(payback_rank, quantiles, axis=1, method="inverted_cdf").T
+        payback_q[a:b] = np.where(np.isinf(q), -1.0, q)
+        prob_positive[a:b] = (npv > 0).mean(axis=1)
+
+    return MonteCarloResult(
+        quantiles=quantiles,
+        npv_quantiles=npv_q,
+        payback_quantiles=payback_q,
+        prob_positive_npv=prob_positive,
+        n_draws=n_draws,
+        seed=seed,
+        rule_version=rules.version,
+    )
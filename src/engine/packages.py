@@ -0,0 +1,280 @@
+import numpy as np
+import yaml
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.engine.batch import UseMix, _penalties, limit_factors, npv_from_annuity
+from src.engine.roi import KWH_PER_THERM, NPV_YEARS, PENALTY_YEARS_2024, PENALTY_YEARS_2030
+from src.engine.rules import BASE_DIR, RuleTable, get_rules
+
+# Retrofit packages: any combination of measures from config/measures.yaml, encoded as a
+# bitmask (bit j = measures[j]) and scored per building as (n_buildings, n_packages) arrays.
+MEASURES_PATH = BASE_DIR / "config" / "measures.yaml"
+
+METHODS = ("exhaustive", "staged")
+
+# Libraries up to this size have all 2**n packages scored before pruning; larger ones
+# grow packages one measure at a time and prune after every step.
+EXHAUSTIVE_MAX_MEASURES = 6
+
+# Bitmasks are int64.
+MAX_MEASURES = 62
+
+# Upper bound on buildings x packages x packages compared in one dominance check.
+DEFAULT_MAX_CELLS = 2_000_000
+
+@dataclass(frozen=True)
+class Measure:
+    """
+    One retrofit measure; see config/measures.yaml for the meaning of each field.
+    """
+    name: str
+    cost_per_sqft: float
+    description: str = ""
+    heating_reduction: float = 0.0
+    elec_reduction: float = 0.0
+    electrify_heating: bool = False
+    solar_kwh_per_sqft: float = 0.0
+    excludes: Tuple[str, ...] = ()
+
+def load_measures(path: Path = MEASURES_PATH) -> List[Measure]:
+    """
+    Reads the measure library, in file order.
+    """
+    with open(path, "r") as f:
+        raw = yaml.safe_load(f) or {}
+
+    measures = []
+    for name, spec in (raw.get("measures") or {}).items():
+        spec = dict(spec or {})
+        spec["excludes"] = tuple(spec.get("excludes") or ())
+        measures.append(Measure(name=str(name), **spec))
+    validate_measures(measures)
+    return measures
+
+def validate_measures(measures: Sequence[Measure]):
+    names = [m.name for m in measures]
+    if len(set(names)) != len(names):
+        raise ValueError("Measure names must be unique")
+    if len(measures) > MAX_MEASURES:
+        raise ValueError(f"At most {MAX_MEASURES} measures are supported, got {len(measures)}")
+    for m in measures:
+        if m.cost_per_sqft < 0 or m.solar_kwh_per_sqft < 0:
+            raise ValueError(f"{m.name}: cost_per_sqft and solar_kwh_per_sqft must be >= 0")
+        if not (0 <= m.heating_reduction <= 1 and 0 <= m.elec_reduction <= 1):
+            raise ValueError(f"{m.name}: reductions must be fractions between 0 and 1")
+        unknown = set(m.excludes) - set(names)
+        if unknown:
+            raise ValueError(f"{m.name}: excludes unknown measures {sorted(unknown)}")
+
+@dataclass
+class PackageFrontier:
+    """
+    Pareto-efficient packages per building (no other package is at most as costly, at
+    most as emitting and at least as valuable, and strictly better on one of the three).
+    Arrays are (n_buildings, width): row i holds building i's frontier, cheapest first,
+    padded where valid is False. packages are bitmasks over `measures`; `evaluated`
+    counts the package scores computed to find the frontier.
+    """
+    measures: List[str]
+    method: str
+    packages: np.ndarray
+    valid: np.ndarray
+    cost: np.ndarray
+    emissions_tco2e: np.ndarray
+    npv: np.ndarray
+    annual_savings: np.ndarray
+    new_penalty_avg: np.ndarray
+    evaluated: int
+    rule_version: str
+
+    def names(self, package: int) -> List[str]:
+        return [name for j, name in enumerate(self.measures) if int(package) >> j & 1]
+
+    def building(self, i: int) -> List[Dict[str, Any]]:
+        """Frontier of building i as plain dicts, cheapest first."""
+        return [
+            {
+                "measures": self.names(self.packages[i, k]),
+                "cost": float(self.cost[i, k]),
+                "emissions_tco2e": float(self.emissions_tco2e[i, k]),
+                "npv": float(self.npv[i, k]),
+                "annual_savings": float(self.annual_savings[i, k]),
+                "new_penalty_avg": float(self.new_penalty_avg[i, k]),
+            }
+            for k in np.flatnonzero(self.valid[i])
+        ]
+
+def _exclusion_masks(measures: Sequence[Measure]) -> np.ndarray:
+    """Per measure, the bitmask of measures it cannot be combined with (both directions)."""
+    index = {m.name: j for j, m in enumerate(measures)}
+    masks = np.zeros(len(measures), dtype=np.int64)
+    for j, m in enumerate(measures):
+        for other in m.excludes:
+            masks[j] |= np.int64(1) << index[other]
+            masks[index[other]] |= np.int64(1) << j
+    return masks
+
+def _allowed(packages: np.ndarray, exclusions: np.ndarray) -> np.ndarray:
+    ok = np.ones(packages.shape, dtype=bool)
+    for j, mask in enumerate(exclusions):
+        if mask:
+            ok &= ~(((packages >> j) & 1).astype(bool) & ((packages & mask) != 0))
+    return ok
+
+def score_packages(sqft, gas, elec, limit_2024, limit_2030, packages: np.ndarray,
+                   measures: Sequence[Measure], constants) -> Dict[str, np.ndarray]:
+    """
+    Scores (n, k) package bitmasks for n buildings. Heating and electricity reductions
+    compound, a heat pump serves whatever heating load the other measures leave, and
+    solar only offsets the electricity the building still uses. The empty package is
+    the unchanged building, so savings and NPV are relative to doing nothing, as in
+    calculate_roi.
+    """
+    sqft, gas, elec = (np.asarray(a, dtype=np.float64)[:, None] for a in (sqft, gas, elec))
+    limit_2024, limit_2030 = np.asarray(limit_2024)[:, None], np.asarray(limit_2030)[:, None]
+
+    # 1. Combined effect of each package's measures
+    heating = np.ones(packages.shape)
+    elec_factor = np.ones(packages.shape)
+    electrify = np.zeros(packages.shape, dtype=bool)
+    solar = np.zeros(packages.shape)
+    cost_per_sqft = np.zeros(packages.shape)
+    for j, m in enumerate(measures):
+        selected = ((packages >> j) & 1).astype(bool)
+        heating = np.where(selected, heating * (1 - m.heating_reduction), heating)
+        elec_factor = np.where(selected, elec_factor * (1 - m.elec_reduction), elec_factor)
+        electrify |= selected & m.electrify_heating
+        solar = np.where(selected, solar + m.solar_kwh_per_sqft, solar)
+        cost_per_sqft = np.where(selected, cost_per_sqft + m.cost_per_sqft, cost_per_sqft)
+
+    # 2. Energy use after the package
+    heating_load_therms = gas * constants["GAS_BOILER_EFFICIENCY"] * heating
+    heat_pump_kwh = heating_load_therms * KWH_PER_THERM / constants["HEAT_PUMP_COP"]
+    new_gas = np.where(electrify, 0.0, gas * heating)
+    new_elec = np.maximum(elec * elec_factor + np.where(electrify, heat_pump_kwh, 0.0) - sqft * solar, 0.0)
+
+    # 3. Penalties, opex and NPV against the unchanged building
+    def opex(gas_use, elec_use):
+        penalty_2024 = _penalties(sqft, gas_use, elec_use, limit_2024, constants)
+        penalty_2030 = _penalties(sqft, gas_use, elec_use, limit_2030, constants)
+        penalty_avg = ((penalty_2024 * PENALTY_YEARS_2024) + (penalty_2030 * PENALTY_YEARS_2030)) / NPV_YEARS
+        return gas_use * constants["GAS_COST_PER_THERM"] + elec_use * constants["ELEC_COST_PER_KWH"] + penalty_avg, penalty_avg
+
+    baseline_opex, _ = opex(gas, elec)
+    new_opex, new_penalty_avg = opex(new_gas, new_elec)
+    annual_savings = baseline_opex - new_opex
+    cost = sqft * cost_per_sqft
+    return {
+        "cost": cost,
+        "emissions_tco2e": (new_gas * constants["EMISSION_FACTOR_GAS_TCO2E_PER_THERM"]
+                            + new_elec * constants["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]),
+        "npv": npv_from_annuity(cost, annual_savings, constants["DISCOUNT_RATE"]),
+        "annual_savings": annual_savings,
+        "new_penalty_avg": new_penalty_avg,
+    }
+
+def pareto_mask(cost: np.ndarray, emissions: np.ndarray, npv: np.ndarray, valid: np.ndarray,
+                max_cells: int = DEFAULT_MAX_CELLS) -> np.ndarray:
+    """
+    Per building (row), marks the valid packages that no other valid package dominates
+    (lower-or-equal cost and emissions, higher-or-equal NPV, strictly better on one).
+    Rows are compared in blocks so at most `max_cells` pairs exist at a time.
+    """
+    n, width = cost.shape
+    keep = valid.copy()
+    block = max(1, max_cells // max(width * width, 1))
+    for a in range(0, n, block):
+        b = min(a + block, n)
+        c, e, v = cost[a:b], emissions[a:b], npv[a:b]
+        # axis 1: the package being tested, axis 2: its rivals
+        no_worse = ((c[:, None, :] <= c[:, :, None]) & (e[:, None, :] <= e[:, :, None])
+                    & (v[:, None, :] >= v[:, :, None]) & valid[a:b, None, :])
+        better = (c[:, None, :] < c[:, :, None]) | (e[:, None, :] < e[:, :, None]) | (v[:, None, :] > v[:, :, None])
+        keep[a:b] &= ~(no_worse & better).any(axis=2)
+    return keep
+
+def _compact(keep: np.ndarray, sort_key: np.ndarray, arrays: Dict[str, np.ndarray]):
+    """Moves each row's kept entries to the front (ascending sort_key) and trims the padding."""
+    order = np.argsort(np.where(keep, sort_key, np.inf), axis=1, kind="stable")
+    width = int(keep.sum(axis=1).max()) if keep.size else 0
+    order = order[:, :max(width, 1)]
+    return (np.take_along_axis(keep, order, axis=1),
+            {name: np.take_along_axis(values, order, axis=1) for name, values in arrays.items()})
+
+def evaluate_packages(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    measures: Optional[Sequence[Measure]] = None,
+    rules: Optional[RuleTable] = None,
+    mix: Optional[UseMix] = None,
+    method: Optional[str] = None,
+    max_cells: int = DEFAULT_MAX_CELLS,
+) -> PackageFrontier:
+    """
+    Finds each building's efficient retrofit packages on cost, emissions and NPV.
+    "exhaustive" scores every allowed combination and then prunes. "staged" adds the
+    measures one at a time: every package on the current frontier is tried with and
+    without the next measure, and dominated packages are dropped before the next step,
+    so the work grows with the frontier size rather than 2**n. Because measures
+    interact, staged pruning can miss a package whose partial combination was
+    dominated; the default picks exhaustive for libraries of up to
+    EXHAUSTIVE_MAX_MEASURES measures.
+    """
+    rules = rules or get_rules()
+    measures = list(load_measures() if measures is None else measures)
+    validate_measures(measures)
+    method = method or ("exhaustive" if len(measures) <= EXHAUSTIVE_MAX_MEASURES else "staged")
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}; expected one of {list(METHODS)}")
+
+    sqft = np.asarray(gross_sq_ft, dtype=np.float64)
+    n = sqft.shape[0]
+    limits = (limit_factors(type_codes, 2024, rules, mix), limit_factors(type_codes, 2030, rules, mix))
+    exclusions = _exclusion_masks(measures)
+
+    def score(packages):
+        return score_packages(sqft, annual_gas_usage_therms, annual_elec_usage_kwh, *limits,
+                              packages, measures, rules.constants)
+
+    # 1. Candidate packages, pruned once (exhaustive) or after every added measure (staged)
+    if method == "exhaustive":
+        every = np.arange(2 ** len(measures), dtype=np.int64)
+        packages = np.tile(every[_allowed(every, exclusions)], (n, 1))
+        valid = np.ones(packages.shape, dtype=bool)
+        scores = score(packages)
+        evaluated = int(valid.sum())
+        keep = pareto_mask(scores["cost"], scores["emissions_tco2e"], scores["npv"], valid, max_cells)
+    else:
+        packages = np.zeros((n, 1), dtype=np.int64)
+        keep = np.ones((n, 1), dtype=bool)
+        evaluated = n
+        for j in range(len(measures)):
+            grown = packages | (np.int64(1) << j)
+            grown_ok = keep & _allowed(grown, exclusions)
+            packages = np.concatenate([packages, grown], axis=1)
+            evaluated += int(grown_ok.sum())
+            scores = score(packages)
+            keep = pareto_mask(scores["cost"], scores["emissions_tco2e"], scores["npv"],
+                               np.concatenate([keep, grown_ok], axis=1), max_cells)
+            keep, scores = _compact(keep, scores["cost"], {"packages": packages, **scores})
+            packages = scores.pop("packages")
+
+    # 2. Frontier per building, cheapest first
+    keep, arrays = _compact(keep, scores["cost"], {"packages": packages, **scores})
+    return PackageFrontier(
+        measures=[m.name for m in measures],
+        method=method,
+        packages=arrays["packages"],
+        valid=keep,
+        cost=arrays["cost"],
+        emissions_tco2e=arrays["emissions_tco2e"],
+        npv=arrays["npv"],
+        annual_savings=arrays["annual_savings"],
+        new_penalty_avg=arrays["new_penalty_avg"],
+        evaluated=evaluated,
+        rule_version=rules.version,
+    )
@@ -1,54 +1,68 @@
-import yaml
-from pathlib import Path
+from typing import Optional
 from src.models import Building
+from src.engine.rules import RuleTable, get_rules
 
-# Load Limits
-BASE_DIR = Path(__file__).parent.parent.parent
-with open(BASE_DIR / "config" / "ll97_limits.yaml", "r") as f:
-    LL97_LIMITS = yaml.safe_load(f)
-
-with open(BASE_DIR / "config" / "constants.yaml", "r") as f:
-    CONSTANTS = yaml.safe_load(f)
-
-def calculate_emissions(building: Building) -> float:
+def calculate_emissions(building: Building, rules: Optional[RuleTable] = None) -> float:
     """
     Calculates total annual emissions in tCO2e.
     """
-    gas_emissions = building.annual_gas_usage_therms * CONSTANTS["EMISSION_FACTOR_GAS_TCO2E_PER_THERM"]
-    elec_emissions = building.annual_elec_usage_kwh * CONSTANTS["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]
+    constants = (rules or get_rules()).constants
+    gas_emissions = building.annual_gas_usage_therms * constants["EMISSION_FACTOR_GAS_TCO2E_PER_THERM"]
+    elec_emissions = building.annual_elec_usage_kwh * constants["EMISSION_FACTOR_ELEC_TCO2E_PER_KWH"]
     return gas_emissions + elec_emissions
 
-def calculate_penalty(building: Building, year: int) -> float:
+def limit_factor(building: Building, year: int, rules: RuleTable) -> Optional[float]:
+    """
+    kgCO2e/sqft limit for one building, or None if no limit applies.
+    Mixed-use buildings get the floor-area-weighted limit of their uses; floor area not
+    covered by use_mix counts at the building's own property type.
+    """
+    own = rules.limit_factor(building.property_type, year)
+    uses = building.use_mix or {}
+    if own is None or not any(gfa > 0 and t != building.property_type for t, gfa in uses.items()):
+        return own
+
+    covered = 0.0
+    for gfa in uses.values():
+        covered += gfa
+    total = max(building.gross_sq_ft, covered)
+    weighted = 0.0
+    for use_type, gfa in uses.items():
+        if gfa > 0:
+            factor = rules.limit_factor(use_type, year)
+            if factor is None:
+                return None
+            weighted += gfa * factor
+    remainder = total - covered
+    if remainder > 0:
+        weighted += remainder * own
+    return weighted / total
+
+def calculate_penalty(building: Building, year: int, rules: Optional[RuleTable] = None) -> float:
     """
     Calculates estimated LL97 penalty for a given year.
     Returns 0.0 if under the limit.
     """
+    rules = rules or get_rules()
+
     # 1. Determine which period limits to use
-    if year < 2024:
-        return 0.0 # No penalties before 2024
-    
-    # Simple logic for periods
-    period_key = 2024
-    if year >= 2030:
-        period_key = 2030
-        
-    limits = LL97_LIMITS.get(period_key, {})
-    limit_factor = limits.get(building.property_type)
-    
-    if limit_factor is None:
+    # No penalties before the first compliance period (2024)
+    factor = limit_factor(building, year, rules)
+
+    if factor is None:
         # Assume 0 penalty if unknown type.
         return 0.0
 
     # 2. Calculate Limit in tCO2e
     # Limit factor is in kgCO2e/sqft. Convert to tCO2e/sqft -> / 1000
     # Total Limit (tCO2e) = sqft * (kg/sqft / 1000)
-    annual_limit_tco2e = building.gross_sq_ft * (limit_factor / 1000.0)
+    annual_limit_tco2e = building.gross_sq_ft * (factor / 1000.0)
 
     # 3. Calculate Actual Emissions
-    actual_emissions_tco2e = calculate_emissions(building)
+    actual_emissions_tco2e = calculate_emissions(building, rules)
 
     # 4. Calculate Penalty
     excess_emissions = max(0.0, actual_emissions_tco2e - annual_limit_tco2e)
-    penalty = excess_emissions * CONSTANTS["PENALTY_RATE_PER_TON"]
+    penalty = excess_emissions * rules.constants["PENALTY_RATE_PER_TON"]
     
     return round(penalty, 2)
@@ -0,0 +1,179 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.engine.batch import UseMix, calculate_roi_batch
+from src.engine.rules import RuleTable
+
+# Objectives the optimizer can maximize; see project_values().
+OBJECTIVES = ("npv", "avoided_penalty")
+
+# Candidate pools up to this size are solved exactly by branch-and-bound.
+EXACT_MAX_ITEMS = 40
+
+# Branch-and-bound gives up (keeping its best incumbent) after this many nodes.
+MAX_BB_NODES = 200_000
+
+@dataclass
+class PortfolioResult:
+    """
+    selected is a boolean mask over the input buildings.
+    upper_bound is the fractional (LP relaxation) optimum, so value / upper_bound is a
+    certificate of how close the chosen set is to the true optimum.
+    marginal_value_per_dollar is the LP shadow price of the budget: objective gained per
+    extra dollar of capital at the current budget.
+    """
+    objective: str
+    budget: float
+    method: str
+    selected: np.ndarray
+    total_cost: float
+    total_value: float
+    upper_bound: float
+    marginal_value_per_dollar: float
+    ratio: np.ndarray
+
+def project_values(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    objective: str = "npv",
+    rules: Optional[RuleTable] = None,
+    mix: Optional[UseMix] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Per-building cost and value of the electrification project.
+      npv:             15-year NPV of the retrofit (already net of its cost)
+      avoided_penalty: average annual LL97 penalty avoided ($/year)
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; expected one of {list(OBJECTIVES)}")
+    roi = calculate_roi_batch(gross_sq_ft, annual_gas_usage_therms, annual_elec_usage_kwh, type_codes, rules, mix)
+    if objective == "npv":
+        values = roi["npv"]
+    else:
+        values = roi["baseline_penalty_avg"] - roi["new_penalty_avg"]
+    return {"cost": roi["investment_cost"], "value": values}
+
+def _fractional_bound(costs: np.ndarray, values: np.ndarray, budget: float):
+    """
+    LP relaxation over items already sorted by ratio.
+    Returns (bound, number of whole items, ratio of the split item or 0).
+    """
+    cumulative = np.cumsum(costs)
+    whole = int(np.searchsorted(cumulative, budget, side="right"))
+    bound = float(values[:whole].sum())
+    if whole == len(costs):
+        return bound, whole, 0.0
+    spent = float(cumulative[whole - 1]) if whole else 0.0
+    ratio = float(values[whole] / costs[whole])
+    return bound + (budget - spent) * ratio, whole, ratio
+
+def _greedy(costs: np.ndarray, values: np.ndarray, budget: float) -> np.ndarray:
+    """
+    Takes items in ratio order, skipping any that no longer fit, then compares against
+    the single most valuable affordable item (which makes this a 1/2-approximation).
+    """
+    # 1. Ratio-ordered fill; the loop only runs past the critical item
+    chosen = np.zeros(len(costs), dtype=bool)
+    cumulative = np.cumsum(costs)
+    whole = int(np.searchsorted(cumulative, budget, side="right"))
+    chosen[:whole] = True
+    remaining = budget - (float(cumulative[whole - 1]) if whole else 0.0)
+    for i in range(whole, len(costs)):
+        if costs[i] <= remaining:
+            chosen[i] = True
+            remaining -= costs[i]
+
+    # 2. Best single item
+    affordable = np.flatnonzero(costs <= budget)
+    if len(affordable):
+        best = affordable[np.argmax(values[affordable])]
+        if values[best] > values[chosen].sum():
+            chosen[:] = False
+            chosen[best] = True
+    return chosen
+
+def _branch_and_bound(costs: np.ndarray, values: np.ndarray, budget: float, incumbent: np.ndarray):
+    """
+    Depth-first 0/1 knapsack over ratio-sorted items, pruned with the LP bound.
+    Returns (best mask, exhausted) where exhausted=False means the node limit was hit.
+    """
+    n = len(costs)
+    best = incumbent.copy()
+    best_value = float(values[best].sum())
+    # Stack of (next item, chosen so far, spent, value)
+    stack = [(0, np.zeros(n, dtype=bool), 0.0, 0.0)]
+    nodes = 0
+    while stack:
+        nodes += 1
+        if nodes > MAX_BB_NODES:
+            return best, False
+        i, chosen, spent, value = stack.pop()
+        if value > best_value:
+            best, best_value = chosen, value
+        if i == n:
+            continue
+        bound, _, _ = _fractional_bound(costs[i:], values[i:], budget - spent)
+        if value + bound <= best_value + 1e-9:
+            continue
+        # Exclude first so the include branch (popped next) is explored depth-first
+        stack.append((i + 1, chosen, spent, value))
+        if spent + costs[i] <= budget:
+            take = chosen.copy()
+            take[i] = True
+            stack.append((i + 1, take, spent + costs[i], value + values[i]))
+    return best, True
+
+def optimize_portfolio(
+    costs: np.ndarray,
+    values: np.ndarray,
+    budget: float,
+    objective: str = "npv",
+    exact_max_items: int = EXACT_MAX_ITEMS,
+) -> PortfolioResult:
+    """
+    Chooses projects maximizing total value subject to total cost <= budget.
+    Only projects with positive value are candidates; free ones are always taken.
+    Pools of at most `exact_max_items` candidates are solved exactly (branch-and-bound);
+    larger pools use greedy-by-ratio, whose gap is bounded by the LP relaxation.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if budget < 0:
+        raise ValueError("budget must be >= 0")
+
+    ratio = np.divide(values, costs, out=np.full_like(values, np.inf), where=costs > 0)
+    ratio = np.where(values > 0, ratio, -np.inf)
+
+    # 1. Candidates sorted by value per dollar (stable so ties keep input order)
+    free = (values > 0) & (costs <= 0)
+    candidates = np.flatnonzero((values > 0) & (costs > 0))
+    order = candidates[np.argsort(-ratio[candidates], kind="stable")]
+    c, v = costs[order], values[order]
+
+    # 2. LP bound and the shadow price of the budget
+    bound, _, critical_ratio = _fractional_bound(c, v, budget)
+
+    # 3. Greedy, then exact search when the pool is small
+    chosen = _greedy(c, v, budget)
+    method = "greedy"
+    if len(order) <= exact_max_items:
+        chosen, exhausted = _branch_and_bound(c, v, budget, chosen)
+        method = "branch_and_bound" if exhausted else "branch_and_bound_truncated"
+
+    selected = free.copy()
+    selected[order[chosen]] = True
+    free_value = float(values[free].sum())
+    return PortfolioResult(
+        objective=objective,
+        budget=float(budget),
+        method=method,
+        selected=selected,
+        total_cost=float(costs[selected].sum()),
+        total_value=float(values[selected].sum()),
+        upper_bound=bound + free_value,
+        marginal_value_per_dollar=critical_ratio,
+        ratio=ratio,
+    )
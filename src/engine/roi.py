@@ -1,38 +1,45 @@
-import yaml
 import numpy_financial as npf
-from pathlib import Path
+from typing import Optional
 from src.models import Building
 from src.engine.penalty import calculate_penalty, calculate_emissions
+from src.engine.rules import RuleTable, get_rules
 
-BASE_DIR = Path(__file__).parent.parent.parent
-with open(BASE_DIR / "config" / "constants.yaml", "r") as f:
-    AUTH_CONSTANTS = yaml.safe_load(f)
+# Shared with the batch engine so both stay element-wise identical.
+KWH_PER_THERM = 29.3071
+NPV_YEARS = 15
+# Years of the NPV horizon spent under each LL97 period's limits.
+PENALTY_YEARS_2024 = 6
+PENALTY_YEARS_2030 = 9
 
-def calculate_roi(building: Building) -> dict:
+def calculate_roi(building: Building, rules: Optional[RuleTable] = None) -> dict:
     """
     Calculates ROI for full electrification retrofit (Gas Boiler -> Heat Pump).
     """
+    # One rule table for the whole calculation, even if the config reloads mid-call
+    rules = rules or get_rules()
+    constants = rules.constants
+
     # --- 1. Baseline Financials ---
-    current_gas_cost = building.annual_gas_usage_therms * AUTH_CONSTANTS["GAS_COST_PER_THERM"]
-    current_elec_cost = building.annual_elec_usage_kwh * AUTH_CONSTANTS["ELEC_COST_PER_KWH"]
+    current_gas_cost = building.annual_gas_usage_therms * constants["GAS_COST_PER_THERM"]
+    current_elec_cost = building.annual_elec_usage_kwh * constants["ELEC_COST_PER_KWH"]
     
     # Average annual penalty over next 15 years (Simplified)
     # Using 2024 rate for first 6 years, 2030 for remaining 9.
-    penalty_2024 = calculate_penalty(building, 2024)
-    penalty_2030 = calculate_penalty(building, 2030)
-    avg_annual_penalty = ((penalty_2024 * 6) + (penalty_2030 * 9)) / 15
+    penalty_2024 = calculate_penalty(building, 2024, rules)
+    penalty_2030 = calculate_penalty(building, 2030, rules)
+    avg_annual_penalty = ((penalty_2024 * PENALTY_YEARS_2024) + (penalty_2030 * PENALTY_YEARS_2030)) / NPV_YEARS
     
     baseline_opex = current_gas_cost + current_elec_cost + avg_annual_penalty
 
     # --- 2. Intervention: Electrification ---
     # Convert Gas Heating Load to Electric Heating Load
     # Heat Output needed (therm) = Input Gas (therm) * Boiler Eff
-    heating_load_therms = building.annual_gas_usage_therms * AUTH_CONSTANTS["GAS_BOILER_EFFICIENCY"]
+    heating_load_therms = building.annual_gas_usage_therms * constants["GAS_BOILER_EFFICIENCY"]
     # Convert to kWh: 1 therm = 29.3071 kWh
-    heating_load_kwh_thermal = heating_load_therms * 29.3071
+    heating_load_kwh_thermal = heating_load_therms * KWH_PER_THERM
     
     # Elec Input needed = Output / COP
-    new_heating_elec_kwh = heating_load_kwh_thermal / AUTH_CONSTANTS["HEAT_PUMP_COP"]
+    new_heating_elec_kwh = heating_load_kwh_thermal / constants["HEAT_PUMP_COP"]
     
     # New Usage Profiles
     new_gas_usage = 0.0
@@ -44,17 +51,18 @@ def calculate_roi(building: Building) -> dict:
         gross_sq_ft=building.gross_sq_ft,
         annual_gas_usage_therms=new_gas_usage,
         annual_elec_usage_kwh=new_elec_usage,
-        property_type=building.property_type
+        property_type=building.property_type,
+        use_mix=building.use_mix
     )
 
     # --- 3. New Financials ---
     new_gas_cost = 0.0
-    new_elec_cost = new_elec_usage * AUTH_CONSTANTS["ELEC_COST_PER_KWH"]
+    new_elec_cost = new_elec_usage * constants["ELEC_COST_PER_KWH"]
     
     # New Penalties
-    new_penalty_2024 = calculate_penalty(retrofit_building, 2024)
-    new_penalty_2030 = calculate_penalty(retrofit_building, 2030)
-    new_avg_penalty = ((new_penalty_2024 * 6) + (new_penalty_2030 * 9)) / 15
+    new_penalty_2024 = calculate_penalty(retrofit_building, 2024, rules)
+    new_penalty_2030 = calculate_penalty(retrofit_building, 2030, rules)
+    new_avg_penalty = ((new_penalty_2024 * PENALTY_YEARS_2024) + (new_penalty_2030 * PENALTY_YEARS_2030)) / NPV_YEARS
     
     new_opex = new_gas_cost + new_elec_cost + new_avg_penalty
     
@@ -62,14 +70,14 @@ def calculate_roi(building: Building) -> dict:
     annual_savings = baseline_opex - new_opex
     
     # Investment Cost
-    investment_cost = building.gross_sq_ft * AUTH_CONSTANTS["RETROFIT_COST_PER_SQFT"]
+    investment_cost = building.gross_sq_ft * constants["RETROFIT_COST_PER_SQFT"]
     
     simple_payback = investment_cost / annual_savings if annual_savings > 0 else -1.0
     
     # NPV (15 years)
     # Cash flows: Year 0 = -Investment, Year 1-15 = Savings
-    cash_flows = [-investment_cost] + [annual_savings] * 15
-    npv = npf.npv(AUTH_CONSTANTS["DISCOUNT_RATE"], cash_flows)
+    cash_flows = [-investment_cost] + [annual_savings] * NPV_YEARS
+    npv = npf.npv(constants["DISCOUNT_RATE"], cash_flows)
     
     return {
         "baseline_opex": round(baseline_opex, 2),
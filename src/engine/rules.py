@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import threading
+import time
+import numpy as np
+import yaml
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple
+
+from src.models import PROPERTY_TYPES
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.parent.parent
+LIMITS_PATH = BASE_DIR / "config" / "ll97_limits.yaml"
+CONSTANTS_PATH = BASE_DIR / "config" / "constants.yaml"
+
+# How often (seconds) the config files are stat()ed for changes.
+RELOAD_CHECK_SECONDS = 1.0
+
+@dataclass(frozen=True)
+class RuleTable:
+    """
+    Compiled, immutable view of ll97_limits.yaml + constants.yaml.
+    limits[type_code, period_index] holds kgCO2e/sqft; the extra last row is NaN so
+    unknown type codes (-1) index straight into "no limit".
+    version is a content hash of both files and is stamped on every result.
+    """
+    version: str
+    property_types: Tuple[str, ...]
+    periods: Tuple[int, ...]
+    limits: np.ndarray
+    constants: Mapping[str, float]
+
+    def period_index(self, year: int) -> int:
+        """Index of the compliance period in force for `year` (-1 before the first period)."""
+        return int(np.searchsorted(self.periods, year, side="right")) - 1
+
+    def limit_factor(self, property_type: str, year: int) -> Optional[float]:
+        """kgCO2e/sqft limit for one building, or None if no limit applies."""
+        period = self.period_index(year)
+        if period < 0 or property_type not in self.property_types:
+            return None
+        value = self.limits[self.property_types.index(property_type), period]
+        return None if np.isnan(value) else float(value)
+
+    def type_rows(self, type_codes: np.ndarray) -> np.ndarray:
+        """Maps type codes onto rows of `limits`; unknown/out-of-range codes hit the NaN row."""
+        codes = np.asarray(type_codes, dtype=np.int64)
+        unknown = len(self.property_types)
+        return np.where((codes < 0) | (codes >= unknown), unknown, codes)
+
+def compile_rules(limits_path: Path = LIMITS_PATH, constants_path: Path = CONSTANTS_PATH) -> RuleTable:
+    """
+    Parses the YAML config into a RuleTable.
+    """
+    limits_bytes = Path(limits_path).read_bytes()
+    constants_bytes = Path(constants_path).read_bytes()
+    raw_limits = yaml.safe_load(limits_bytes) or {}
+    raw_constants = yaml.safe_load(constants_bytes) or {}
+
+    periods = tuple(sorted(int(p) for p in raw_limits))
+    limits = np.full((len(PROPERTY_TYPES) + 1, len(periods)), np.nan, dtype=np.float64)
+    for col, period in enumerate(periods):
+        for row, property_type in enumerate(PROPERTY_TYPES):
+            value = (raw_limits.get(period) or {}).get(property_type)
+            if value is not None:
+                limits[row, col] = value
+    limits.setflags(write=False)
+
+    digest = hashlib.sha256(limits_bytes + b"\0" + constants_bytes).hexdigest()[:16]
+    return RuleTable(
+        version=digest,
+        property_types=tuple(PROPERTY_TYPES),
+        periods=periods,
+        limits=limits,
+        constants=MappingProxyType(dict(raw_constants)),
+    )
+
+class RuleSource:
+    """
+    Holds the current RuleTable and swaps in a recompiled one when the files change.
+    A config edit that fails to parse is logged and the previous table stays active.
+    """
+
+    def __init__(self, paths: List[Path] = None, check_seconds: float = RELOAD_CHECK_SECONDS):
+        self.paths = [Path(p) for p in (paths or [LIMITS_PATH, CONSTANTS_PATH])]
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._stamp = self._stat()
+        self._table = compile_rules(*self.paths)
+        self._next_check = time.monotonic() + check_seconds
+
+    def _stat(self) -> Tuple:
+        return tuple((p.stat().st_mtime_ns, p.stat().st_size) for p in self.paths)
+
+    def current(self) -> RuleTable:
+        if time.monotonic() >= self._next_check:
+            self.reload_if_changed()
+        return self._table
+
+    def reload_if_changed(self) -> bool:
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_seconds
+            try:
+                stamp = self._stat()
+                if stamp == self._stamp:
+                    return False
+                table = compile_rules(*self.paths)
+            except (OSError, yaml.YAMLError, ValueError, TypeError) as e:
+                logger.error(f"Could not reload LL97 rules, keeping version {self._table.version}: {e}")
+                return False
+            self._stamp = stamp
+            if table.version != self._table.version:
+                logger.info(f"Loaded LL97 rules version {table.version} (was {self._table.version})")
+            # Single reference assignment: readers see either the old or the new table
+            self._table = table
+            return True
+
+_SOURCE = RuleSource()
+
+def get_rules() -> RuleTable:
+    """
+    Returns the active rule table, reloading it if the config files changed on disk.
+    """
+    return _SOURCE.current()
@@ -0,0 +1,169 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.engine.batch import UseMix, electrification_cashflows, limit_factors, npv_from_annuity, simple_payback
+from src.engine.rules import RuleTable, get_rules
+
+# Constants from constants.yaml that a sweep may vary.
+SWEEP_PARAMETERS = ("HEAT_PUMP_COP", "GAS_COST_PER_THERM", "ELEC_COST_PER_KWH", "DISCOUNT_RATE", "RETROFIT_COST_PER_SQFT")
+
+# Upper bound on buildings x grid cells evaluated in one broadcast (bounds intermediate memory).
+DEFAULT_MAX_CELLS = 2_000_000
+
+# Default tornado range: +/- this fraction around the configured value.
+DEFAULT_TORNADO_SPREAD = 0.2
+
+@dataclass
+class SweepResult:
+    """
+    Output tensors are shaped (n_buildings, len(values[0]), len(values[1]), ...),
+    with one axis per swept parameter in `parameters` order.
+    """
+    parameters: List[str]
+    values: List[np.ndarray]
+    npv: np.ndarray
+    simple_payback_years: np.ndarray
+    new_penalty_avg: np.ndarray
+    rule_version: str
+
+def _sweep_chunk(sqft, gas, elec, limit_2024, limit_2030, constants: Dict, names: List[str], values: List[np.ndarray]):
+    """Evaluates one block of buildings against the full grid via broadcasting."""
+    ndim = len(names)
+    building_shape = (-1,) + (1,) * ndim
+    constants = dict(constants)
+    for axis, (name, grid_values) in enumerate(zip(names, values)):
+        shape = [1] * (ndim + 1)
+        shape[axis + 1] = -1
+        constants[name] = grid_values.reshape(shape)
+
+    flows = electrification_cashflows(
+        sqft.reshape(building_shape),
+        gas.reshape(building_shape),
+        elec.reshape(building_shape),
+        limit_2024.reshape(building_shape),
+        limit_2030.reshape(building_shape),
+        constants,
+    )
+    full_shape = (sqft.shape[0],) + tuple(len(v) for v in values)
+    npv = npv_from_annuity(flows["investment_cost"], flows["annual_savings"], constants["DISCOUNT_RATE"])
+    payback = simple_payback(flows["investment_cost"], flows["annual_savings"])
+    return (
+        np.broadcast_to(npv, full_shape),
+        np.broadcast_to(payback, full_shape),
+        np.broadcast_to(flows["new_penalty_avg"], full_shape),
+    )
+
+def _sweep_chunk_args(args):
+    return _sweep_chunk(*args)
+
+def run_sweep(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    grid: Dict[str, Sequence[float]],
+    rules: Optional[RuleTable] = None,
+    max_cells: int = DEFAULT_MAX_CELLS,
+    processes: Optional[int] = None,
+    mix: Optional[UseMix] = None,
+) -> SweepResult:
+    """
+    Evaluates the electrification retrofit for every building at every point of a
+    parameter grid (the Cartesian product of `grid` values).
+    Small problems are one broadcast. Larger ones are split into building blocks of at
+    most `max_cells` cells, run across `processes` worker processes when given.
+    """
+    rules = rules or get_rules()
+    unknown = set(grid) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Cannot sweep {sorted(unknown)}; allowed parameters are {list(SWEEP_PARAMETERS)}")
+    names = list(grid)
+    values = [np.asarray(grid[name], dtype=np.float64).ravel() for name in names]
+    if any(v.size == 0 for v in values):
+        raise ValueError("Every swept parameter needs at least one value")
+
+    sqft = np.asarray(gross_sq_ft, dtype=np.float64)
+    gas = np.asarray(annual_gas_usage_therms, dtype=np.float64)
+    elec = np.asarray(annual_elec_usage_kwh, dtype=np.float64)
+    limit_2024 = limit_factors(type_codes, 2024, rules, mix)
+    limit_2030 = limit_factors(type_codes, 2030, rules, mix)
+    constants = dict(rules.constants)
+
+    grid_cells = int(np.prod([v.size for v in values]))
+    full_shape = (sqft.shape[0],) + tuple(v.size for v in values)
+    outputs = [np.empty(full_shape) for _ in range(3)]
+
+    block = max(1, max_cells // grid_cells)
+    bounds = [(start, min(start + block, sqft.shape[0])) for start in range(0, sqft.shape[0], block)]
+    chunks = [
+        (sqft[a:b], gas[a:b], elec[a:b], limit_2024[a:b], limit_2030[a:b], constants, names, values)
+        for a, b in bounds
+    ]
+
+    if processes and processes > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = pool.map(_sweep_chunk_args, chunks)
+            for (a, b), result in zip(bounds, results):
+                for out, part in zip(outputs, result):
+                    out[a:b] = part
+    else:
+        for (a, b), chunk in zip(bounds, chunks):
+            for out, part in zip(outputs, _sweep_chunk(*chunk)):
+                out[a:b] = part
+
+    return SweepResult(
+        parameters=names,
+        values=values,
+        npv=outputs[0],
+        simple_payback_years=outputs[1],
+        new_penalty_avg=outputs[2],
+        rule_version=rules.version,
+    )
+
+def tornado(
+    gross_sq_ft: np.ndarray,
+    annual_gas_usage_therms: np.ndarray,
+    annual_elec_usage_kwh: np.ndarray,
+    type_codes: np.ndarray,
+    ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+    rules: Optional[RuleTable] = None,
+    mix: Optional[UseMix] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    One-at-a-time sensitivity of NPV per building.
+    Each parameter moves to its low and high value while the others stay at the config
+    value. Defaults to +/-20% around constants.yaml for every sweepable parameter.
+    Returns arrays shaped (n_buildings, n_parameters) plus `order`, the per-building
+    parameter ranking by NPV swing (largest first) for drawing tornado bars.
+    """
+    rules = rules or get_rules()
+    if ranges is None:
+        ranges = {
+            name: (rules.constants[name] * (1 - DEFAULT_TORNADO_SPREAD), rules.constants[name] * (1 + DEFAULT_TORNADO_SPREAD))
+            for name in SWEEP_PARAMETERS
+        }
+    names = list(ranges)
+    columns = (gross_sq_ft, annual_gas_usage_therms, annual_elec_usage_kwh, type_codes)
+
+    baseline = run_sweep(*columns, grid={}, rules=rules, mix=mix).npv
+    npv_low = np.empty((baseline.shape[0], len(names)))
+    npv_high = np.empty_like(npv_low)
+    for i, name in enumerate(names):
+        low, high = ranges[name]
+        result = run_sweep(*columns, grid={name: [low, high]}, rules=rules, mix=mix)
+        npv_low[:, i] = result.npv[:, 0]
+        npv_high[:, i] = result.npv[:, 1]
+
+    swing = np.abs(npv_high - npv_low)
+    return {
+        "parameters": names,
+        "low": np.array([ranges[n][0] for n in names]),
+        "high": np.array([ranges[n][1] for n in names]),
+        "baseline_npv": baseline,
+        "npv_low": npv_low,
+        "npv_high": npv_high,
+        "swing": swing,
+        "order": np.argsort(-swing, axis=1, kind="stable"),
+    }
@@ -0,0 +1,83 @@
+from pydantic import BaseModel, Field
+from typing import Callable, Dict, List, Optional
+
+class TraceStep(BaseModel):
+    """
+    One step of the explainability trace in machine-readable form.
+    `code` identifies the finding; `values` holds the numbers behind it, with `units`.
+    """
+    code: str
+    values: Dict[str, float] = Field(default_factory=dict)
+    units: Dict[str, str] = Field(default_factory=dict)
+
+def _ordinal(n: int) -> str:
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+# Text rendering per step code. Each takes (values, context) where context carries the
+# building_id and property_type.
+RENDERERS: Dict[str, Callable[[Dict[str, float], Dict[str, str]], str]] = {
+    "building": lambda v, c: f"Analyzed Building {c['building_id']} ({c['property_type']}).",
+    "inputs": lambda v, c: f"Gross SQFT: {v['gross_sq_ft']:,.0f}. Annual Gas: {v['annual_gas_usage_therms']:,.0f} therms.",
+    "penalty_2024": lambda v, c: f"ALERT: Est. 2024 Penalty is ${v['penalty']:,.2f}/year.",
+    "under_limit_2024": lambda v, c: "Pass: Building is under 2024 LL97 emissions limits.",
+    "penalty_2030": lambda v, c: f"WARNING: Est. 2030 Penalty increases to ${v['penalty']:,.2f}/year.",
+    "peer_benchmark": lambda v, c: (
+        f"Benchmark: Emissions intensity ({v['emissions_intensity']:.2f} kgCO2e/sqft) is in the "
+        f"{_ordinal(int(v['percentile']))} percentile of {int(v['cohort_size']):,} NYC {c['property_type']} buildings."
+    ),
+    "electrification_savings": lambda v, c: (
+        f"OPPORTUNITY: Electrification could save ${v['annual_savings']:,.2f}/year "
+        f"with {v['simple_payback_years']} year payback."
+    ),
+    "no_immediate_roi": lambda v, c: "Note: Electrification may not have immediate positive ROI based on current assumptions.",
+}
+
+def build_trace(
+    building,
+    roi_result: Dict[str, float],
+    penalty_2024: float,
+    penalty_2030: float,
+    peers=None,
+    intensity: Optional[float] = None,
+) -> List[TraceStep]:
+    """
+    The analysis findings as structured steps, in the order they are reported.
+    """
+    steps = [
+        TraceStep(code="building"),
+        TraceStep(
+            code="inputs",
+            values={"gross_sq_ft": building.gross_sq_ft, "annual_gas_usage_therms": building.annual_gas_usage_therms,
+                    "annual_elec_usage_kwh": building.annual_elec_usage_kwh},
+            units={"gross_sq_ft": "sqft", "annual_gas_usage_therms": "therm/year", "annual_elec_usage_kwh": "kWh/year"},
+        ),
+    ]
+    if penalty_2024 > 0:
+        steps.append(TraceStep(code="penalty_2024", values={"penalty": penalty_2024}, units={"penalty": "USD/year"}))
+    else:
+        steps.append(TraceStep(code="under_limit_2024"))
+    if penalty_2030 > 0:
+        steps.append(TraceStep(code="penalty_2030", values={"penalty": penalty_2030}, units={"penalty": "USD/year"}))
+    if peers is not None:
+        steps.append(TraceStep(
+            code="peer_benchmark",
+            values={"emissions_intensity": intensity, "percentile": peers.emissions_intensity,
+                    "penalty_percentile": peers.penalty, "cohort_size": peers.cohort_size},
+            units={"emissions_intensity": "kgCO2e/sqft", "percentile": "percent",
+                   "penalty_percentile": "percent", "cohort_size": "buildings"},
+        ))
+    if roi_result["annual_savings"] > 0:
+        steps.append(TraceStep(
+            code="electrification_savings",
+            values={"annual_savings": roi_result["annual_savings"], "simple_payback_years": roi_result["simple_payback_years"]},
+            units={"annual_savings": "USD/year", "simple_payback_years": "years"},
+        ))
+    else:
+        steps.append(TraceStep(code="no_immediate_roi"))
+    return steps
+
+def render_trace(steps: List[TraceStep], building_id: str, property_type: str) -> List[str]:
+    """Human-readable lines for a structured trace."""
+    context = {"building_id": building_id, "property_type": property_type}
+    return [RENDERERS[step.code](step.values, context) for step in steps]
@@ -0,0 +1,184 @@
+import argparse
+import io
+import logging
+import sys
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from src.engine.batch import calculate_emissions_batch, calculate_penalties_batch, calculate_roi_batch, encode_property_types, encode_use_mix
+from src.engine.rules import RuleTable, get_rules
+from src.normalizer import USE_GFA_COLUMNS, USE_TYPE_COLUMNS, normalize_building_frame
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the Arrow and Parquet formats need it
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "arrow", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXTENSIONS = {"csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+
+ROI_COLUMNS = [
+    "baseline_opex", "new_opex", "annual_savings", "investment_cost",
+    "simple_payback_years", "npv", "baseline_penalty_avg", "new_penalty_avg",
+]
+EXPORT_COLUMNS = [
+    "building_id", "property_type", "gross_sq_ft", "annual_gas_usage_therms", "annual_elec_usage_kwh",
+    "latitude", "longitude", "emissions_tco2e", "penalty_2024", "penalty_2030",
+] + ROI_COLUMNS
+
+def format_available(fmt: str) -> bool:
+    return fmt == "csv" or pa is not None
+
+def analyze_frame(buildings: pd.DataFrame, rules: RuleTable) -> pd.DataFrame:
+    """
+    Emissions, 2024/2030 penalties and every calculate_roi field for a normalized frame.
+    """
+    sqft = buildings["gross_sq_ft"].to_numpy()
+    gas = buildings["annual_gas_usage_therms"].to_numpy()
+    elec = buildings["annual_elec_usage_kwh"].to_numpy()
+    codes = encode_property_types(buildings["property_type"])
+    mix = _frame_use_mix(buildings, codes, sqft)
+    roi = calculate_roi_batch(sqft, gas, elec, codes, rules, mix)
+
+    out = buildings[["building_id", "property_type", "gross_sq_ft", "annual_gas_usage_therms",
+                     "annual_elec_usage_kwh", "latitude", "longitude"]].reset_index(drop=True)
+    out["building_id"] = out["building_id"].astype(str)
+    out["property_type"] = out["property_type"].astype(str)
+    out["emissions_tco2e"] = calculate_emissions_batch(gas, elec, rules)
+    out["penalty_2024"] = calculate_penalties_batch(sqft, gas, elec, codes, 2024, rules, mix)
+    out["penalty_2030"] = calculate_penalties_batch(sqft, gas, elec, codes, 2030, rules, mix)
+    for name in ROI_COLUMNS:
+        out[name] = roi[name]
+    return out
+
+def _frame_use_mix(buildings: pd.DataFrame, codes, sqft):
+    # Frames built by hand may lack the mixed-use slots; they are then single-use
+    if not set(USE_TYPE_COLUMNS).issubset(buildings.columns):
+        return None
+    return encode_use_mix(codes, buildings[USE_TYPE_COLUMNS].to_numpy(), buildings[USE_GFA_COLUMNS].to_numpy(), sqft)
+
+def iter_result_frames(pages: Iterable[List[Dict[str, Any]]], rules: Optional[RuleTable] = None) -> Iterator[pd.DataFrame]:
+    """
+    Normalizes and analyzes raw LL84 pages one at a time; only one page is in memory.
+    One rule table is used for the whole export even if the config reloads meanwhile.
+    """
+    rules = rules or get_rules()
+    for page in pages:
+        buildings, _ = normalize_building_frame(page)
+        if len(buildings):
+            yield analyze_frame(buildings, rules)
+
+class _ByteSink(io.RawIOBase):
+    """
+    Write-only file that hands written bytes back out via drain().
+    tell() counts every byte ever written, which the Parquet writer relies on for offsets.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _arrow_schema():
+    fields = [pa.field("building_id", pa.string()), pa.field("property_type", pa.string())]
+    fields += [pa.field(name, pa.float64()) for name in EXPORT_COLUMNS[2:]]
+    return pa.schema(fields)
+
+def iter_export_bytes(frames: Iterable[pd.DataFrame], fmt: str, rule_version: str = "") -> Iterator[bytes]:
+    """
+    Serializes result frames as they arrive: CSV text, an Arrow IPC stream (one record
+    batch per frame) or Parquet (one row group per frame).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(FORMATS)}")
+    if fmt == "csv":
+        header = True
+        for frame in frames:
+            yield frame[EXPORT_COLUMNS].to_csv(index=False, header=header).encode()
+            header = False
+        if header:
+            yield (",".join(EXPORT_COLUMNS) + "\n").encode()
+        return
+
+    if pa is None:
+        raise RuntimeError(f"The {fmt} export format requires pyarrow")
+    schema = _arrow_schema().with_metadata({"rule_version": rule_version})
+    sink = _ByteSink()
+    writer = pa.ipc.new_stream(sink, schema) if fmt == "arrow" else pq.ParquetWriter(sink, schema)
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame[EXPORT_COLUMNS], schema=schema, preserve_index=False)
+            if fmt == "arrow":
+                for batch in table.to_batches():
+                    writer.write_batch(batch)
+            else:
+                writer.write_table(table)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def export_citywide(fmt: str, max_records: Optional[int] = None, page_size: int = 1000, workers: int = 4) -> Iterator[bytes]:
+    """
+    Streams the full analysis of LL84 properties from NYC Open Data in `fmt`.
+    """
+    from src.ingestor import iter_nyc_data
+
+    rules = get_rules()
+    pages = iter_nyc_data(page_size=page_size, max_records=max_records, workers=workers, chunked=True)
+    return iter_export_bytes(iter_result_frames(pages, rules), fmt, rules.version)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export penalties and ROI for every LL84 property.")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--output", type=Path, required=True, help="Destination file ('-' for stdout)")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum records to ingest (default: all)")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent page fetches")
+    args = parser.parse_args(argv)
+
+    chunks = export_citywide(args.format, args.limit, args.page_size, args.workers)
+    if str(args.output) == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        return
+    # Written under a temporary name so an interrupted export never looks complete
+    partial = args.output.with_name(args.output.name + ".partial")
+    written = 0
+    with open(partial, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            written += len(chunk)
+    partial.replace(args.output)
+    logger.info(f"Wrote {written:,} bytes to {args.output}")
+
+if __name__ == "__main__":
+    main()
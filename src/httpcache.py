@@ -0,0 +1,335 @@
+import hashlib
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache of upstream (Socrata) GET responses, shared by the requests and httpx clients.
+#   ECOCALC_HTTP_CACHE=off      no caching; plain requests/httpx (default)
+#   ECOCALC_HTTP_CACHE=on       store 200 responses, revalidate them with ETag / If-Modified-Since
+#   ECOCALC_HTTP_CACHE=offline  strict replay: serve recorded responses, fail on anything else
+MODES = ("off", "on", "offline")
+MODE = os.environ.get("ECOCALC_HTTP_CACHE", "off").lower()
+
+BASE_DIR = Path(__file__).parent.parent
+CACHE_DIR = Path(os.environ.get("ECOCALC_HTTP_CACHE_DIR", BASE_DIR / "data" / "http_cache"))
+DEFAULT_MAX_BYTES = int(float(os.environ.get("ECOCALC_HTTP_CACHE_MAX_MB", 256)) * 1_000_000)
+# Entries younger than this are served without revalidating (0: always revalidate).
+DEFAULT_MAX_AGE_SECONDS = float(os.environ.get("ECOCALC_HTTP_CACHE_MAX_AGE_SECONDS", 0))
+
+CACHE_STATUS_HEADER = "X-EcoCalc-Cache"
+
+# Not replayed: stored bodies are already decoded and complete.
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+def cache_key(method: str, url: str) -> str:
+    """Hash of the method and URL with its query parameters sorted, so param order doesn't matter."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    canonical = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+    return hashlib.sha256(f"{method.upper()} {canonical}".encode()).hexdigest()
+
+@dataclass
+class CachedResponse:
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    stored_at: float
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidating this entry."""
+        headers = {k.lower(): v for k, v in self.headers.items()}
+        out = {}
+        if "etag" in headers:
+            out["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            out["If-Modified-Since"] = headers["last-modified"]
+        return out
+
+class HttpCache:
+    """
+    Size-bounded LRU store of GET responses keyed by URL and query parameters.
+    Each entry is a body file plus a JSON metadata file, both written atomically; an
+    entry's file mtime records its last use, so the LRU order survives restarts.
+    """
+
+    def __init__(
+        self,
+        directory: Path = CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        mode: str = "on",
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        clock=time.time,
+    ):
+        if mode not in MODES[1:]:
+            raise ValueError(f"Unknown HTTP cache mode {mode!r}; expected one of {list(MODES[1:])}")
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, list]] = None  # key -> [bytes, last_used]
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    @property
+    def offline(self) -> bool:
+        return self.mode == "offline"
+
+    def _paths(self, key: str):
+        folder = self.directory / key[:2]
+        return folder / f"{key}.json", folder / f"{key}.body"
+
+    def _entries(self) -> Dict[str, list]:
+        """Lazily scans the directory once; kept up to date in memory afterwards."""
+        if self._index is None:
+            index = {}
+            for meta in self.directory.glob("*/*.json"):
+                body = meta.with_suffix(".body")
+                try:
+                    index[meta.stem] = [body.stat().st_size + meta.stat().st_size, meta.stat().st_mtime]
+                except FileNotFoundError:
+                    continue
+            self._index = index
+        return self._index
+
+    def lookup(self, method: str, url: str) -> Optional[CachedResponse]:
+        key = cache_key(method, url)
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            body = body_path.read_bytes()
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        now = self.clock()
+        with self._lock:
+            self.hits += 1
+            entry = self._entries().get(key)
+            if entry is not None:
+                entry[1] = now
+        try:
+            os.utime(meta_path, (now, now))
+        except FileNotFoundError:
+            pass
+        return CachedResponse(url=meta["url"], status=meta["status"], headers=meta["headers"], body=body,
+                              stored_at=meta["stored_at"])
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return self.clock() - entry.stored_at < self.max_age_seconds
+
+    def store(self, method: str, url: str, status: int, headers: Dict[str, str], body: bytes) -> Optional[CachedResponse]:
+        """Saves a 200 response (unless the server said no-store) and evicts down to max_bytes."""
+        if status != 200 or "no-store" in {k.lower(): v for k, v in headers.items()}.get("cache-control", ""):
+            return None
+        key = cache_key(method, url)
+        kept = {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS}
+        entry = CachedResponse(url=url, status=status, headers=kept, body=body, stored_at=self.clock())
+        self._write(key, entry)
+        return entry
+
+    def mark_revalidated(self, method: str, url: str, entry: CachedResponse):
+        """Records a 304: the stored body is current as of now."""
+        entry.stored_at = self.clock()
+        self._write(cache_key(method, url), entry)
+        with self._lock:
+            self.revalidated += 1
+
+    def _write(self, key: str, entry: CachedResponse):
+        meta_path, body_path = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = json.dumps({"url": entry.url, "status": entry.status, "headers": entry.headers,
+                           "stored_at": entry.stored_at}).encode()
+        # Body first, then metadata: a reader never finds metadata without its body
+        for path, data in ((body_path, entry.body), (meta_path, meta)):
+            partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.partial")
+            partial.write_bytes(data)
+            os.replace(partial, path)
+        with self._lock:
+            self._entries()[key] = [len(entry.body) + len(meta), self.clock()]
+            self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries until the cache fits max_bytes (caller holds the lock)."""
+        index = self._entries()
+        total = sum(size for size, _ in index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                path.unlink(missing_ok=True)
+            del index[key]
+            total -= size
+            self.evictions += 1
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(size for size, _ in self._entries().values())
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries()):
+                for path in self._paths(key):
+                    path.unlink(missing_ok=True)
+            self._index = {}
+
+def _offline_miss(method: str, url: str) -> str:
+    return f"Offline HTTP cache has no recorded response for {method} {url}"
+
+class CachingAdapter(HTTPAdapter):
+    """
+    requests transport adapter that answers GETs from an HttpCache.
+    Accepts the usual HTTPAdapter arguments (pool sizes, max_retries).
+    """
+
+    def __init__(self, cache: HttpCache, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        method, url = request.method.upper(), request.url
+        entry = self.cache.lookup(method, url) if method == "GET" else None
+        if self.cache.offline:
+            if entry is None:
+                raise requests.exceptions.ConnectionError(_offline_miss(method, url), request=request)
+            return self._replay(entry, request, "HIT")
+        if entry is not None and self.cache.is_fresh(entry):
+            return self._replay(entry, request, "HIT")
+
+        if entry is not None:
+            for name, value in entry.validators().items():
+                request.headers.setdefault(name, value)
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            self.cache.mark_revalidated(method, url, entry)
+            return self._replay(entry, request, "REVALIDATED")
+        if method == "GET":
+            self.cache.store(method, url, response.status_code, dict(response.headers), response.content)
+            response.headers[CACHE_STATUS_HEADER] = "MISS"
+        return response
+
+    @staticmethod
+    def _replay(entry: CachedResponse, request: requests.PreparedRequest, status: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry.status
+        response.reason = http.client.responses.get(entry.status, "")
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.headers[CACHE_STATUS_HEADER] = status
+        response._content = entry.body
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that answers GETs from an HttpCache and forwards the rest to
+    `transport` (a default AsyncHTTPTransport if None).
+    """
+
+    def __init__(self, cache: HttpCache, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cache = cache
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        method, url = request.method.upper(), str(request.url)
+        entry = self.cache.lookup(method, url) if method == "GET" else None
+        if self.cache.offline:
+            if entry is None:
+                raise httpx.ConnectError(_offline_miss(method, url), request=request)
+            return self._replay(entry, request, "HIT")
+        if entry is not None and self.cache.is_fresh(entry):
+            return self._replay(entry, request, "HIT")
+
+        if entry is not None:
+            for name, value in entry.validators().items():
+                request.headers.setdefault(name, value)
+        response = await self.transport.handle_async_request(request)
+        if response.status_code == 304 and entry is not None:
+            await response.aclose()
+            self.cache.mark_revalidated(method, url, entry)
+            return self._replay(entry, request, "REVALIDATED")
+        if method != "GET":
+            return response
+
+        # Read (and decode) the body here so it can be stored and replayed as-is
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+        self.cache.store(method, url, response.status_code, headers, body)
+        headers[CACHE_STATUS_HEADER] = "MISS"
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    @staticmethod
+    def _replay(entry: CachedResponse, request: httpx.Request, status: str) -> httpx.Response:
+        headers = dict(entry.headers)
+        headers[CACHE_STATUS_HEADER] = status
+        return httpx.Response(entry.status, headers=headers, content=entry.body, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+_lock = threading.Lock()
+_cache: Optional[HttpCache] = None
+_session: Optional[requests.Session] = None
+
+def get_cache() -> Optional[HttpCache]:
+    """The process-wide cache configured by ECOCALC_HTTP_CACHE, or None when it is off."""
+    global _cache
+    if MODE == "off":
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = HttpCache(CACHE_DIR, DEFAULT_MAX_BYTES, MODE, DEFAULT_MAX_AGE_SECONDS)
+            logger.info(f"HTTP cache {MODE} at {CACHE_DIR} (max {DEFAULT_MAX_BYTES / 1e6:.0f} MB)")
+        return _cache
+
+def http_get(url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> requests.Response:
+    """
+    requests.get through the cache when it is enabled; plain requests.get otherwise.
+    """
+    global _session
+    cache = get_cache()
+    if cache is None:
+        return requests.get(url, params=params, **kwargs)
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = CachingAdapter(cache)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        session = _session
+    return session.get(url, params=params, **kwargs)
+
+def async_transport(**transport_kwargs: Any) -> Optional[httpx.AsyncBaseTransport]:
+    """
+    A caching transport over httpx.AsyncHTTPTransport(**transport_kwargs) when the cache
+    is enabled, else None (httpx's default transport).
+    """
+    cache = get_cache()
+    return None if cache is None else CachingTransport(cache, httpx.AsyncHTTPTransport(**transport_kwargs))
@@ -1,21 +1,53 @@
 import requests
 import pandas as pd
-from typing import List, Dict, Any
+import logging
+import yaml
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Iterator, Optional, Union
+
+from src.httpcache import CachingAdapter, get_cache, http_get
+
+logger = logging.getLogger(__name__)
+
+SOCRATA_RESOURCE_URL = "https://data.cityofnewyork.us/resource"
+NYC_DATA_URL = f"{SOCRATA_RESOURCE_URL}/5zyy-y8am.json"
+GFA_FILTER = "property_gfa_self_reported IS NOT NULL" # Filter out empty GFA
+
+DATASETS_PATH = Path(__file__).parent.parent / "config" / "datasets.yaml"
+
+# Socrata system fields: last modification time and the stable internal row ID.
+UPDATED_AT_FIELD = ":updated_at"
+ROW_ID_FIELD = ":id"
+
+# Delta pulls re-read this much before the stored watermark. Rows edited while a sync is
+# paging can shift between pages; the overlap picks them up next time, and upserts are
+# idempotent, so re-reading them is harmless.
+WATERMARK_OVERLAP = timedelta(hours=1)
+
+# Socrata caps a single page; larger pulls must page with $offset.
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_TIMEOUT_SECONDS = 30
 
 def fetch_nyc_data(limit: int = 1000) -> List[Dict[str, Any]]:
     """
     Fetches LL84 benchmarking data from NYC Open Data.
     Dataset ID: 5zyy-y8am (2023 data)
     """
-    url = "https://data.cityofnewyork.us/resource/5zyy-y8am.json"
+    url = NYC_DATA_URL
     params = {
         "$limit": limit,
         "$order": "property_id",
-        "$where": "property_gfa_self_reported IS NOT NULL" # Filter out empty GFA
+        "$where": GFA_FILTER
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = http_get(url, params=params)
         response.raise_for_status()
         data = response.json()
         return data
@@ -23,6 +55,157 @@ def fetch_nyc_data(limit: int = 1000) -> List[Dict[str, Any]]:
         print(f"Error fetching data: {e}")
         return []
 
+def make_session(pool_size: int = 8, retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Builds a pooled requests.Session that retries transient Socrata failures
+    (429/5xx and connection errors) with exponential backoff, answering from the
+    on-disk HTTP cache when it is enabled.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+    )
+    cache = get_cache()
+    if cache is None:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    else:
+        adapter = CachingAdapter(cache, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def iter_nyc_data(
+    page_size: int = DEFAULT_PAGE_SIZE,
+    max_records: Optional[int] = None,
+    workers: int = 4,
+    chunked: bool = False,
+    session: Optional[requests.Session] = None,
+    url: str = NYC_DATA_URL,
+    where: Optional[str] = GFA_FILTER,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    start_offset: int = 0,
+    order: str = "property_id",
+    select: Optional[str] = None,
+) -> Iterator[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Streams LL84 records page by page using $offset/$order (`order` must be a stable
+    total order for paging to be exact; `select` adds e.g. system fields).
+    Up to `workers` pages are fetched concurrently over one pooled session, and pages
+    are yielded in dataset order: single records by default, or one list per page when
+    chunked=True. At most `workers` pages are held in memory at once.
+    Stops at the first short page or once max_records have been yielded.
+    start_offset skips that many records of the ordered dataset (used to resume runs).
+    Raises requests.RequestException if a page still fails after retries.
+    """
+    own_session = session is None
+    session = session or make_session(pool_size=workers)
+
+    def fetch_page(offset: int, limit: int) -> List[Dict[str, Any]]:
+        params = {"$limit": limit, "$offset": offset, "$order": order}
+        if where:
+            params["$where"] = where
+        if select:
+            params["$select"] = select
+        response = session.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    yielded = 0
+    next_offset = start_offset
+    pending = deque()  # (limit, future) in offset order
+
+    def submit_next(pool):
+        nonlocal next_offset
+        limit = page_size
+        if max_records is not None:
+            limit = min(page_size, max_records - (next_offset - start_offset))
+            if limit <= 0:
+                return
+        pending.append((limit, pool.submit(fetch_page, next_offset, limit)))
+        next_offset += limit
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in range(workers):
+                submit_next(pool)
+            while pending:
+                limit, future = pending.popleft()
+                try:
+                    page = future.result()
+                except requests.RequestException as e:
+                    logger.error(f"Error fetching page at offset {start_offset + yielded}: {e}")
+                    raise
+                if page:
+                    yielded += len(page)
+                    if chunked:
+                        yield page
+                    else:
+                        yield from page
+                if len(page) < limit:
+                    # Past the end of the dataset: drop any speculative requests
+                    for _, extra in pending:
+                        extra.cancel()
+                    break
+                submit_next(pool)
+    finally:
+        if own_session:
+            session.close()
+
+@dataclass(frozen=True)
+class Dataset:
+    """One LL84 reporting-year dataset on NYC Open Data."""
+    id: str
+    reporting_year: int
+
+    @property
+    def url(self) -> str:
+        return f"{SOCRATA_RESOURCE_URL}/{self.id}.json"
+
+def load_datasets(path: Path = DATASETS_PATH) -> List[Dataset]:
+    """
+    Reads config/datasets.yaml, oldest reporting year first (later years take precedence
+    when the same property appears in several datasets).
+    """
+    with open(path, "r") as f:
+        raw = yaml.safe_load(f) or {}
+    datasets = [Dataset(id=str(d["id"]), reporting_year=int(d["reporting_year"])) for d in raw.get("datasets", [])]
+    if not datasets:
+        raise ValueError(f"No datasets configured in {path}")
+    return sorted(datasets, key=lambda d: d.reporting_year)
+
+def _overlap_start(watermark: str) -> str:
+    """Watermark minus WATERMARK_OVERLAP, in Socrata's floating timestamp format."""
+    moment = datetime.fromisoformat(watermark.rstrip("Z")) - WATERMARK_OVERLAP
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+def iter_dataset_changes(
+    dataset: Dataset,
+    since: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    workers: int = 4,
+    session: Optional[requests.Session] = None,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Pages of records of `dataset` modified at or after `since` (an :updated_at
+    watermark, less WATERMARK_OVERLAP), or every record with a GFA when `since` is None.
+    Each record carries its :updated_at. Delta pulls keep rows whose GFA was cleared so
+    the caller can drop them; pages are ordered by :id, which edits do not reorder.
+    """
+    select = f"*, {UPDATED_AT_FIELD}"
+    if since is None:
+        where = GFA_FILTER
+    else:
+        where = f"{UPDATED_AT_FIELD} >= '{_overlap_start(since)}'"
+    return iter_nyc_data(
+        page_size=page_size, workers=workers, chunked=True, session=session, url=dataset.url,
+        where=where, timeout=timeout, order=ROW_ID_FIELD, select=select,
+    )
+
 if __name__ == "__main__":
     # Test run
     data = fetch_nyc_data(limit=5)
@@ -1,117 +1,867 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, Dict, Any, List, Literal, Tuple
 import logging
+import numpy as np
 
 from src.models import Building
-from src.ingestor import fetch_nyc_data
+from src.ingestor import fetch_nyc_data, NYC_DATA_URL
 from src.normalizer import normalize_building_data
 from src.engine.roi import calculate_roi
 from src.engine.penalty import calculate_penalty
+from src.engine.rules import RuleTable, get_rules
+from src.engine.batch import buildings_to_columns, calculate_penalties_batch, calculate_penalty_matrix, calculate_roi_batch
+from src.engine.sweep import tornado
+from src.engine.montecarlo import Distribution, simulate_roi
+from src.engine.portfolio import optimize_portfolio, project_values
+from src.engine.packages import METHODS as PACKAGE_METHODS, evaluate_packages, load_measures
+from src.streaming import iter_json_rows, RowError
+from src.snapshot import get_snapshot
+from src.spatial import get_spatial_index
+from src.peers import PEER_PENALTY_YEAR, emissions_intensity, get_peer_index
+from src.tiles import DEFAULT_ZOOMS, PENALTY_BUCKETS, POINT_ZOOM, aggregate_tiles, build_tile_pyramid, penalty_buckets, tile_bounds
+from src.cache import ResultCache
+from src.upstream import UpstreamClient
+from src.httpcache import http_get
+from src.metrics import REGISTRY, ServerTimingMiddleware, inc, stage
+from src.explain import TraceStep, build_trace, render_trace
+from src.export import EXTENSIONS, MEDIA_TYPES, export_citywide, format_available
 import requests
+import httpx
+import json
+import orjson
+import os
+import tempfile
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for Accept: application/msgpack
+    msgpack = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await UPSTREAM.aclose()
+
 app = FastAPI(
     title="EcoCalc Engine API",
     description="API for calculating decarbonization ROI and LL97 penalties for NYC buildings.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.add_middleware(ServerTimingMiddleware)
+
+class PeerPercentiles(BaseModel):
+    property_type: str
+    cohort_size: int = Field(..., description="Snapshot buildings of the same property type")
+    emissions_intensity: float = Field(..., description="Percentile (0-100) of kgCO2e/sqft among peers")
+    penalty: float = Field(..., description="Percentile (0-100) of the 2024 penalty among peers")
 
 class AnalysisResult(BaseModel):
     building_id: str
     roi_analysis: Dict[str, float]
     penalties: Dict[int, float]
-    explainability: List[str]
+    explainability: Optional[List[str]] = Field(None, description="Text trace; only with ?explain=true")
+    trace: Optional[List[TraceStep]] = Field(None, description="Structured trace steps; only with ?explain=true")
+    rule_version: str = Field(..., description="Version (content hash) of the LL97 rule table used")
+    peer_percentiles: Optional[PeerPercentiles] = Field(None, description="Standing among snapshot peers, when a snapshot exists")
+
+class TrajectoryRequest(BaseModel):
+    buildings: List[Building]
+    start_year: int = Field(2024, ge=2000, le=2100)
+    end_year: int = Field(2050, ge=2000, le=2100)
+
+class TrajectoryResult(BaseModel):
+    years: List[int]
+    building_ids: List[str]
+    penalties: List[List[float]] = Field(..., description="Annual penalty ($) per building (rows) and year (columns)")
+    portfolio_totals: List[float] = Field(..., description="Sum of penalties across buildings for each year")
+    rule_version: str
+
+class TornadoRequest(BaseModel):
+    buildings: List[Building]
+    ranges: Optional[Dict[str, Tuple[float, float]]] = Field(
+        None, description="Low/high value per parameter; defaults to +/-20% around constants.yaml"
+    )
+
+class TornadoBar(BaseModel):
+    parameter: str
+    low: float
+    high: float
+    npv_low: float
+    npv_high: float
+    swing: float
+
+class TornadoSummary(BaseModel):
+    building_id: str
+    baseline_npv: float
+    bars: List[TornadoBar] = Field(..., description="Sorted by NPV swing, largest first")
+
+class TornadoResult(BaseModel):
+    results: List[TornadoSummary]
+    rule_version: str
+
+class DistributionSpec(BaseModel):
+    kind: Literal["fixed", "uniform", "triangular", "normal", "lognormal"]
+    value: Optional[float] = None
+    low: Optional[float] = None
+    mode: Optional[float] = None
+    high: Optional[float] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    median: Optional[float] = None
+    sigma: Optional[float] = None
+
+class MonteCarloRequest(BaseModel):
+    buildings: List[Building]
+    distributions: Optional[Dict[str, DistributionSpec]] = Field(
+        None, description="Per-parameter distribution; defaults to spreads around constants.yaml"
+    )
+    n_draws: int = Field(10_000, ge=1, le=200_000)
+    seed: int = 0
+
+class MonteCarloSummary(BaseModel):
+    building_id: str
+    npv: Dict[str, float] = Field(..., description="NPV at P10/P50/P90")
+    simple_payback_years: Dict[str, float] = Field(..., description="Payback at P10/P50/P90; -1 means never")
+    prob_positive_npv: float
+
+class MonteCarloResult(BaseModel):
+    results: List[MonteCarloSummary]
+    n_draws: int
+    seed: int
+    rule_version: str
+
+class PortfolioRequest(BaseModel):
+    buildings: List[Building]
+    budget: float = Field(..., ge=0, description="Capital available for retrofits ($)")
+    objective: Literal["npv", "avoided_penalty"] = "npv"
+
+class PortfolioProject(BaseModel):
+    building_id: str
+    cost: float
+    value: float
+    value_per_dollar: float
+
+class PortfolioResult(BaseModel):
+    objective: str
+    method: str
+    budget: float
+    total_cost: float
+    total_value: float
+    upper_bound: float = Field(..., description="LP relaxation optimum; no selection can beat it")
+    marginal_value_per_dollar: float = Field(..., description="Objective gained per extra dollar of budget")
+    selected: List[PortfolioProject]
+    rule_version: str
+
+class PackageRequest(BaseModel):
+    buildings: List[Building]
+    measures: Optional[List[str]] = Field(None, description="Subset of config/measures.yaml to combine; default all")
+    method: Optional[Literal[PACKAGE_METHODS]] = Field(None, description="exhaustive or staged; default by library size")
+
+class RetrofitPackage(BaseModel):
+    measures: List[str]
+    cost: float
+    emissions_tco2e: float
+    npv: float
+    annual_savings: float
+    new_penalty_avg: float
+
+class PackageFrontierSummary(BaseModel):
+    building_id: str
+    frontier: List[RetrofitPackage] = Field(..., description="Efficient packages, cheapest first")
+
+class PackageFrontierResult(BaseModel):
+    results: List[PackageFrontierSummary]
+    method: str
+    evaluated: int = Field(..., description="Package scores computed across all buildings")
+    rule_version: str
+
+class NearbyBuilding(BaseModel):
+    building_id: str
+    property_type: str
+    distance_m: float
+    penalty_2024: float
+    penalty_2030: float
+    npv: float
+    annual_savings: float
+    simple_payback_years: float
+
+class NearbySummary(BaseModel):
+    count: int
+    total_penalty_2024: float
+    total_penalty_2030: float
+    total_npv: float
+    total_gross_sq_ft: float
+
+class NearbyResult(BaseModel):
+    latitude: float
+    longitude: float
+    buildings: List[NearbyBuilding] = Field(..., description="Nearest first")
+    summary: NearbySummary
+    snapshot_version: str
+    rule_version: str
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to EcoCalc Engine API. Use /docs for documentation."}
 
+# Results are keyed on building inputs plus the rule table version (see src/cache.py).
+RESULT_CACHE = ResultCache(
+    maxsize=int(os.environ.get("ECOCALC_CACHE_SIZE", 4096)),
+    ttl_seconds=float(os.environ.get("ECOCALC_CACHE_TTL_SECONDS", 900)),
+)
+
+def _analysis_key(building: Building) -> tuple:
+    return ("analyze", building.building_id, building.gross_sq_ft, building.annual_gas_usage_therms,
+            building.annual_elec_usage_kwh, building.property_type,
+            tuple((building.use_mix or {}).items()))
+
 @app.post("/analyze", response_model=AnalysisResult)
-def analyze_building(building: Building):
+def analyze_building(building: Building, request: Request, explain: bool = False, render: bool = True, compact: bool = False):
     """
     Analyzes a building object provided in the request body.
-    Returns ROI analysis, penalties, and an explainability trace.
+    Returns ROI analysis and penalties. With explain=true the response also carries the
+    explainability trace as structured steps (`trace`) and, unless render=false, as text
+    (`explainability`). compact=true returns minified JSON without null fields;
+    `Accept: application/msgpack` returns MessagePack when the msgpack package is installed.
     """
+    return _encode(_analyze(building, explain, render), request, compact)
+
+def _analyze(building: Building, explain: bool = False, render: bool = True) -> AnalysisResult:
+    rules = get_rules()
+    snapshot = get_snapshot()
+    # Peer percentiles depend on the snapshot, so its version is part of the key
+    key = _analysis_key(building) + (snapshot.version if snapshot is not None else None, explain, explain and render)
+    cached = RESULT_CACHE.get(key, version=rules.version)
+    if cached is not None:
+        return cached.model_copy(deep=True)
+    result = _compute_analysis(building, rules, snapshot, explain, render)
+    RESULT_CACHE.set(key, result.model_copy(deep=True), version=rules.version)
+    return result
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+def _encode(result: BaseModel, request: Request, compact: bool):
+    """
+    Serializes a response model: MessagePack when the client asks for it, minified
+    orjson for compact=true, otherwise the model for FastAPI's regular JSON encoding.
+    """
+    accept = request.headers.get("accept", "")
+    if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="MessagePack responses require the msgpack package")
+        return Response(msgpack.packb(result.model_dump(mode="json", exclude_none=True)), media_type="application/msgpack")
+    if compact:
+        body = orjson.dumps(result.model_dump(exclude_none=True), option=orjson.OPT_NON_STR_KEYS)
+        return Response(body, media_type="application/json")
+    return result
+
+def _compute_analysis(
+    building: Building, rules: RuleTable, snapshot=None, explain: bool = False, render: bool = True
+) -> AnalysisResult:
     try:
         # 1. Calculate ROI
-        roi_result = calculate_roi(building)
+        with stage("roi"):
+            roi_result = calculate_roi(building, rules)
         
         # 2. Calculate Penalties explicitly for reporting
-        penalty_2024 = calculate_penalty(building, 2024)
-        penalty_2030 = calculate_penalty(building, 2030)
-        
-        # 3. Generate Explainability Trace
-        trace = []
-        trace.append(f"Analyzed Building {building.building_id} ({building.property_type}).")
-        trace.append(f"Gross SQFT: {building.gross_sq_ft:,.0f}. Annual Gas: {building.annual_gas_usage_therms:,.0f} therms.")
+        with stage("penalty"):
+            penalty_2024 = calculate_penalty(building, 2024, rules)
+            penalty_2030 = calculate_penalty(building, 2030, rules)
+
+        # 3. Peer benchmarking against the snapshot cohort of the same property type
+        with stage("peers"):
+            peers, intensity = _peer_percentiles(building, rules, snapshot)
         
-        if penalty_2024 > 0:
-            trace.append(f"ALERT: Est. 2024 Penalty is ${penalty_2024:,.2f}/year.")
-        else:
-            trace.append("Pass: Building is under 2024 LL97 emissions limits.")
-            
-        if penalty_2030 > 0:
-            trace.append(f"WARNING: Est. 2030 Penalty increases to ${penalty_2030:,.2f}/year.")
-            
-        if roi_result['annual_savings'] > 0:
-            trace.append(f"OPPORTUNITY: Electrification could save ${roi_result['annual_savings']:,.2f}/year with {roi_result['simple_payback_years']} year payback.")
-        else:
-            trace.append("Note: Electrification may not have immediate positive ROI based on current assumptions.")
+        # 4. Explainability trace, only when asked for
+        steps, text = None, None
+        if explain:
+            with stage("trace"):
+                steps = build_trace(building, roi_result, penalty_2024, penalty_2030, peers, intensity)
+                if render:
+                    text = render_trace(steps, building.building_id, building.property_type)
 
         return AnalysisResult(
             building_id=building.building_id,
             roi_analysis=roi_result,
             penalties={2024: penalty_2024, 2030: penalty_2030},
-            explainability=trace
+            explainability=text,
+            trace=steps,
+            rule_version=rules.version,
+            peer_percentiles=peers
         )
         
     except Exception as e:
         logger.error(f"Error analyzing building: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/building/{property_id}", response_model=AnalysisResult)
-def get_building_analysis(property_id: str):
+def _peer_percentiles(building: Building, rules: RuleTable, snapshot) -> Tuple[Optional[PeerPercentiles], float]:
+    """Percentile ranks within the building's property-type cohort, and its kgCO2e/sqft."""
+    peer_index = get_peer_index(snapshot)
+    if peer_index is None:
+        return None, 0.0
+    intensity = float(emissions_intensity(
+        [building.gross_sq_ft], [building.annual_gas_usage_therms], [building.annual_elec_usage_kwh], rules
+    )[0])
+    peer_penalty = calculate_penalty(building, PEER_PENALTY_YEAR, rules)
+    ranks = peer_index.percentiles(building.property_type, intensity, peer_penalty)
+    if ranks is None:
+        return None, intensity
+    peers = PeerPercentiles(
+        property_type=building.property_type,
+        cohort_size=peer_index.cohort_size(building.property_type),
+        emissions_intensity=round(ranks["emissions_intensity"], 1),
+        penalty=round(ranks["penalty"], 1),
+    )
+    return peers, intensity
+
+@app.post("/penalties/trajectory", response_model=TrajectoryResult)
+def penalty_trajectory(request: TrajectoryRequest):
     """
-    Fetches data for a specific building ID from NYC Open Data and analyzes it.
-    Note: In a real app, this would be cached or optimized. Currently scans dataset.
+    Returns the LL97 penalty trajectory (one value per building per year) for a portfolio,
+    using the compliance periods defined in ll97_limits.yaml.
     """
+    if request.end_year < request.start_year:
+        raise HTTPException(status_code=422, detail="end_year must be >= start_year")
+    rules = get_rules()
+    years = list(range(request.start_year, request.end_year + 1))
+    cols = buildings_to_columns(request.buildings)
+    matrix = calculate_penalty_matrix(
+        cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"],
+        cols["type_codes"], years, rules, cols["use_mix"]
+    )
+    return TrajectoryResult(
+        years=years,
+        building_ids=[b.building_id for b in request.buildings],
+        penalties=matrix.tolist(),
+        portfolio_totals=np.round(matrix.sum(axis=0), 2).tolist(),
+        rule_version=rules.version
+    )
+
+@app.post("/sweep/tornado", response_model=TornadoResult)
+def sweep_tornado(request: TornadoRequest):
+    """
+    One-at-a-time NPV sensitivity per building for the sweepable constants
+    (HEAT_PUMP_COP, energy prices, DISCOUNT_RATE, RETROFIT_COST_PER_SQFT).
+    """
+    rules = get_rules()
+    cols = buildings_to_columns(request.buildings)
     try:
-        # 1. Fetch Data (Inefficient linear scan for demo - ideally filter API side via ingestor params)
-        # We will attempt to fetch with a filter if ingestor supported it, but our ingestor is simple.
-        # Let's fetch a chunk and look for it, or just fail if not found in top N.
-        # Ideally, update ingestor to accept a property_id filter.
-        # For now, let's just fetch a small batch and see if we get lucky, or better yet,
-        # update the logic to fetch *specifically* this ID.
-        
-        # HACK: Using a specialized fetch logic here or updating ingestor.
-        # Let's rely on a new function we'll monkey-patch or add to ingestor? 
-        # Actually, let's just use the ingestor as is but maybe we should've added filtering.
-        # Let's try to filter using the generic fetch but requesting a specific ID via SODA if possible.
-        # Socrata supports ?property_id=...
-        
-        url = "https://data.cityofnewyork.us/resource/5zyy-y8am.json"
-        
-        resp = requests.get(url, params={"property_id": property_id, "$limit": 1})
-        resp.raise_for_status()
-        data = resp.json()
-        
-        if not data:
-            raise HTTPException(status_code=404, detail=f"Building {property_id} not found in NYC Open Data (2023).")
-            
-        # 2. Normalize
-        buildings = normalize_building_data(data)
-        if not buildings:
-             raise HTTPException(status_code=400, detail="Could not normalize building data (missing GFA or Energy data).")
-             
-        # 3. Analyze
-        return analyze_building(buildings[0])
+        summary = tornado(
+            cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"],
+            cols["type_codes"], request.ranges, rules, cols["use_mix"]
+        )
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid sweep ranges: {e}")
+
+    results = []
+    for i, building in enumerate(request.buildings):
+        bars = [
+            TornadoBar(
+                parameter=summary["parameters"][j],
+                low=summary["low"][j],
+                high=summary["high"][j],
+                npv_low=round(float(summary["npv_low"][i, j]), 2),
+                npv_high=round(float(summary["npv_high"][i, j]), 2),
+                swing=round(float(summary["swing"][i, j]), 2),
+            )
+            for j in summary["order"][i]
+        ]
+        results.append(TornadoSummary(
+            building_id=building.building_id,
+            baseline_npv=round(float(summary["baseline_npv"][i]), 2),
+            bars=bars
+        ))
+    return TornadoResult(results=results, rule_version=rules.version)
+
+@app.post("/roi/montecarlo", response_model=MonteCarloResult)
+def roi_montecarlo(request: MonteCarloRequest):
+    """
+    Seeded Monte Carlo of electrification NPV and payback under uncertain energy prices,
+    heat pump COP, retrofit cost and grid emission factor. Same seed, same answer.
+    """
+    rules = get_rules()
+    cols = buildings_to_columns(request.buildings)
+    try:
+        distributions = None
+        if request.distributions is not None:
+            distributions = {
+                name: Distribution(**spec.model_dump()) for name, spec in request.distributions.items()
+            }
+        sim = simulate_roi(
+            cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"],
+            cols["type_codes"], distributions, request.n_draws, request.seed, rules=rules, mix=cols["use_mix"]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid distributions: {e}")
+
+    labels = [f"p{round(q * 100)}" for q in sim.quantiles]
+    results = [
+        MonteCarloSummary(
+            building_id=building.building_id,
+            npv={label: round(float(v), 2) for label, v in zip(labels, sim.npv_quantiles[i])},
+            simple_payback_years={label: round(float(v), 1) for label, v in zip(labels, sim.payback_quantiles[i])},
+            prob_positive_npv=round(float(sim.prob_positive_npv[i]), 4),
+        )
+        for i, building in enumerate(request.buildings)
+    ]
+    return MonteCarloResult(results=results, n_draws=sim.n_draws, seed=sim.seed, rule_version=rules.version)
+
+@app.post("/portfolio/optimize", response_model=PortfolioResult)
+def portfolio_optimize(request: PortfolioRequest):
+    """
+    Picks the electrification projects that maximize NPV (or avoided LL97 penalties)
+    within a capital budget.
+    """
+    rules = get_rules()
+    cols = buildings_to_columns(request.buildings)
+    projects = project_values(
+        cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"],
+        cols["type_codes"], request.objective, rules, cols["use_mix"]
+    )
+    result = optimize_portfolio(projects["cost"], projects["value"], request.budget, request.objective)
+
+    selected = np.flatnonzero(result.selected)
+    selected = selected[np.argsort(-result.ratio[selected], kind="stable")]
+    return PortfolioResult(
+        objective=result.objective,
+        method=result.method,
+        budget=result.budget,
+        total_cost=round(result.total_cost, 2),
+        total_value=round(result.total_value, 2),
+        upper_bound=round(result.upper_bound, 2),
+        marginal_value_per_dollar=round(result.marginal_value_per_dollar, 6),
+        selected=[
+            PortfolioProject(
+                building_id=request.buildings[i].building_id,
+                cost=float(projects["cost"][i]),
+                value=float(projects["value"][i]),
+                # Free projects have an infinite ratio, which JSON can't carry
+                value_per_dollar=round(float(result.ratio[i]), 6) if np.isfinite(result.ratio[i]) else 0.0,
+            )
+            for i in selected
+        ],
+        rule_version=rules.version
+    )
+
+@app.post("/packages/frontier", response_model=PackageFrontierResult)
+def packages_frontier(request: PackageRequest):
+    """
+    Combines retrofit measures into packages and returns, per building, the packages not
+    dominated on cost, emissions and NPV.
+    """
+    rules = get_rules()
+    library = load_measures()
+    measures = library
+    if request.measures is not None:
+        by_name = {m.name: m for m in library}
+        unknown = sorted(set(request.measures) - set(by_name))
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown measures {unknown}; expected some of {list(by_name)}")
+        measures = [m for m in library if m.name in request.measures]
+    cols = buildings_to_columns(request.buildings)
+    frontier = evaluate_packages(
+        cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"],
+        cols["type_codes"], measures, rules, cols["use_mix"], request.method
+    )
+    results = [
+        PackageFrontierSummary(
+            building_id=building.building_id,
+            frontier=[
+                RetrofitPackage(**{k: (v if k == "measures" else round(v, 2)) for k, v in package.items()})
+                for package in frontier.building(i)
+            ],
+        )
+        for i, building in enumerate(request.buildings)
+    ]
+    return PackageFrontierResult(results=results, method=frontier.method, evaluated=frontier.evaluated,
+                                 rule_version=rules.version)
+
+# Uploads are spooled to disk beyond this size so memory stays flat for large batches.
+BATCH_SPOOL_MAX_BYTES = 1_000_000
+BATCH_READ_CHUNK_BYTES = 64 * 1024
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request, explain: bool = False):
+    """
+    Analyzes many buildings in one request.
+    Accepts a JSON array or NDJSON body of Building objects and streams back NDJSON:
+    one line per input row, in input order, each carrying the row's "index". Successful
+    rows are AnalysisResult objects; rows that fail validation or analysis are reported
+    inline as {"index", "building_id", "error"} instead of failing the request.
+    The last line is {"summary": {...}} with row counts and whether the whole upload
+    was read ("complete" is false if a malformed JSON array element cut it short).
+    Lines omit null fields; explain=true adds the trace to every result.
+    """
+    # Read the body before the response starts: once streaming, Starlette listens for
+    # client disconnects on the same receive channel and would swallow body messages.
+    spool = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_MAX_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+
+    # A sync generator: StreamingResponse iterates it in the threadpool, keeping the
+    # per-row validation and penalty/ROI math off the event loop.
+    def results():
+        counts = {"rows": 0, "succeeded": 0, "failed": 0}
+        complete = True
+        try:
+            chunks = iter(lambda: spool.read(BATCH_READ_CHUNK_BYTES), b"")
+            for index, row in iter_json_rows(chunks):
+                line, ok = _analyze_row(index, row, explain)
+                counts["rows"] += 1
+                counts["succeeded" if ok else "failed"] += 1
+                if isinstance(row, RowError) and row.fatal:
+                    complete = False
+                yield line + "\n"
+        finally:
+            spool.close()
+        yield json.dumps({"summary": {**counts, "complete": complete}}) + "\n"
 
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def _analyze_row(index: int, row: Any, explain: bool = False) -> Tuple[str, bool]:
+    """Analyzes one uploaded row; returns its JSON line and whether it succeeded."""
+    if isinstance(row, RowError):
+        return json.dumps({"index": index, "building_id": None, "error": str(row)}), False
+    building_id = row.get("building_id") if isinstance(row, dict) else None
+    try:
+        building = Building.model_validate(row)
+    except ValidationError as e:
+        errors = "; ".join(
+            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" if err["loc"] else err["msg"]
+            for err in e.errors()
+        )
+        return json.dumps({"index": index, "building_id": building_id, "error": errors}), False
+    try:
+        result = _analyze(building, explain)
     except HTTPException as he:
-        raise he
+        return json.dumps({"index": index, "building_id": building_id, "error": he.detail}), False
+    line = orjson.dumps({"index": index, **result.model_dump(exclude_none=True)}, option=orjson.OPT_NON_STR_KEYS)
+    return line.decode(), True
+
+# Per-property upstream lookups share one pooled async client (see src/upstream.py).
+UPSTREAM_TIMEOUT_SECONDS = float(os.environ.get("ECOCALC_UPSTREAM_TIMEOUT_SECONDS", 10))
+UPSTREAM = UpstreamClient(
+    timeout=UPSTREAM_TIMEOUT_SECONDS,
+    max_concurrency=int(os.environ.get("ECOCALC_UPSTREAM_MAX_CONCURRENCY", 8)),
+)
+
+@app.get("/building/{property_id}", response_model=AnalysisResult)
+async def get_building_analysis_async(
+    property_id: str, request: Request, explain: bool = False, render: bool = True, compact: bool = False
+):
+    """
+    Analyzes a building by ID.
+    Served from the local snapshot when present (see `python -m src.snapshot build`),
+    then from the result cache; only a miss on both goes to NYC Open Data.
+    Concurrent requests for the same ID share a single upstream fetch.
+    explain/render/compact behave as on POST /analyze.
+    """
+    with stage("lookup"):
+        local = await run_in_threadpool(_lookup_local, property_id, explain, render)
+    if local is not None:
+        return _encode(local, request, compact)
+    try:
+        with stage("fetch"):
+            data = await UPSTREAM.fetch_property(property_id)
+    except httpx.TimeoutException as e:
+        inc("ecocalc_upstream_errors_total", kind="timeout")
+        logger.error(f"Timed out fetching building {property_id}: {e}")
+        raise HTTPException(status_code=504, detail="NYC Open Data timed out.")
+    except httpx.HTTPError as e:
+        inc("ecocalc_upstream_errors_total", kind="http")
+        logger.error(f"Error fetching building {property_id}: {e}")
+        raise HTTPException(status_code=502, detail=f"NYC Open Data error: {e}")
+    result = await run_in_threadpool(_analyze_records, property_id, data, explain, render)
+    return _encode(result, request, compact)
+
+def get_building_analysis(property_id: str, explain: bool = False, render: bool = True) -> AnalysisResult:
+    """
+    Synchronous variant of GET /building/{property_id} for scripts and the dashboard.
+    """
+    with stage("lookup"):
+        local = _lookup_local(property_id, explain, render)
+    if local is not None:
+        return local
+    try:
+        with stage("fetch"):
+            resp = http_get(NYC_DATA_URL, params={"property_id": property_id, "$limit": 1},
+                            timeout=UPSTREAM_TIMEOUT_SECONDS)
+            resp.raise_for_status()
+            data = resp.json()
     except Exception as e:
-        logger.error(f"Error fetching/analyzing building {property_id}: {e}")
+        inc("ecocalc_upstream_errors_total", kind="timeout" if isinstance(e, requests.Timeout) else "http")
+        logger.error(f"Error fetching building {property_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    return _analyze_records(property_id, data, explain, render)
+
+def _lookup_local(property_id: str, explain: bool = False, render: bool = True) -> Optional[AnalysisResult]:
+    """Snapshot first, then results cached from earlier upstream lookups."""
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        building = snapshot.get(property_id)
+        if building is not None:
+            return _analyze(building, explain, render)
+
+    # Upstream lookups are cached by ID; the TTL bounds how stale Socrata data can get
+    cached = RESULT_CACHE.get(("building", property_id, explain, explain and render))
+    if cached is not None:
+        return cached.model_copy(deep=True)
+    return None
+
+def _analyze_records(
+    property_id: str, data: List[Dict[str, Any]], explain: bool = False, render: bool = True
+) -> AnalysisResult:
+    """Normalizes and analyzes the upstream records for one property, caching the result."""
+    if not data:
+        raise HTTPException(status_code=404, detail=f"Building {property_id} not found in NYC Open Data (2023).")
+
+    with stage("normalize"):
+        buildings = normalize_building_data(data)
+    if not buildings:
+        raise HTTPException(status_code=400, detail="Could not normalize building data (missing GFA or Energy data).")
+
+    result = _analyze(buildings[0], explain, render)
+    RESULT_CACHE.set(("building", property_id, explain, explain and render), result.model_copy(deep=True),
+                     version=result.rule_version)
+    return result
+
+def _snapshot_map_layers(year: int):
+    """
+    Penalties and the precomputed tile pyramid for every snapshot building in `year`.
+    Cached per snapshot version and rule version, so a refresh of either rebuilds it.
+    """
+    snapshot = _snapshot_or_503()
+    rules = get_rules()
+    key = ("map", snapshot.version, year)
+    layers = RESULT_CACHE.get(key, version=rules.version)
+    if layers is None:
+        cols = snapshot.columns
+        penalties = calculate_penalties_batch(
+            cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"],
+            cols["type_codes"], year, rules, snapshot.use_mix()
+        )
+        layers = {
+            "penalties": penalties,
+            "pyramid": build_tile_pyramid(cols["latitude"], cols["longitude"], penalties, DEFAULT_ZOOMS),
+        }
+        RESULT_CACHE.set(key, layers, version=rules.version)
+    return snapshot, layers, rules
+
+@app.get("/map/tiles")
+def map_tiles(zoom: int = 12, year: int = 2024):
+    """
+    Buildings binned into slippy-map tiles at `zoom`, with counts, total/max penalty and
+    a color bucket (see PENALTY_BUCKETS) per tile. Levels in DEFAULT_ZOOMS are precomputed.
+    """
+    if not 0 <= zoom <= POINT_ZOOM:
+        raise HTTPException(status_code=422, detail=f"zoom must be between 0 and {POINT_ZOOM}; use /map/points beyond that")
+    snapshot, layers, rules = _snapshot_map_layers(year)
+    tiles = layers["pyramid"].get(zoom)
+    if tiles is None:
+        cols = snapshot.columns
+        tiles = aggregate_tiles(cols["latitude"], cols["longitude"], layers["penalties"], zoom)
+    bounds = tile_bounds(tiles["x"], tiles["y"], zoom)
+    return {
+        "zoom": zoom,
+        "year": year,
+        "bucket_edges": PENALTY_BUCKETS.tolist(),
+        "snapshot_version": snapshot.version,
+        "rule_version": rules.version,
+        "tiles": [
+            {
+                "x": int(tiles["x"][i]),
+                "y": int(tiles["y"][i]),
+                "bounds": [float(bounds[edge][i]) for edge in ("south", "west", "north", "east")],
+                "latitude": float(tiles["latitude"][i]),
+                "longitude": float(tiles["longitude"][i]),
+                "count": int(tiles["count"][i]),
+                "penalized_count": int(tiles["penalized_count"][i]),
+                "total_penalty": round(float(tiles["total_penalty"][i]), 2),
+                "max_penalty": round(float(tiles["max_penalty"][i]), 2),
+                "bucket": int(tiles["bucket"][i]),
+            }
+            for i in range(len(tiles["x"]))
+        ],
+    }
+
+# Point queries are meant for drill-down at high zoom; cap the response size.
+MAP_POINTS_LIMIT = 5000
+
+@app.get("/map/points")
+def map_points(south: float, west: float, north: float, east: float, year: int = 2024, limit: int = MAP_POINTS_LIMIT):
+    """
+    Individual penalized buildings inside a bounding box, largest penalty first.
+    """
+    snapshot, layers, rules = _snapshot_map_layers(year)
+    cols = snapshot.columns
+    lat, lon, penalties = cols["latitude"], cols["longitude"], layers["penalties"]
+    matches = np.flatnonzero((lat >= south) & (lat <= north) & (lon >= west) & (lon <= east) & (penalties > 0))
+    inside = matches[np.argsort(-penalties[matches], kind="stable")][:max(0, min(limit, MAP_POINTS_LIMIT))]
+    buckets = penalty_buckets(penalties[inside])
+    return {
+        "year": year,
+        "truncated": bool(len(inside) < len(matches)),
+        "snapshot_version": snapshot.version,
+        "rule_version": rules.version,
+        "points": [
+            {
+                "building_id": str(cols["building_id"][row]),
+                "latitude": float(lat[row]),
+                "longitude": float(lon[row]),
+                "penalty": float(penalties[row]),
+                "bucket": int(bucket),
+            }
+            for row, bucket in zip(inside, buckets)
+        ],
+    }
+
+# Bounds on neighborhood queries so one request can't ask for the whole city.
+NEARBY_MAX_RADIUS_M = 5000.0
+NEARBY_MAX_K = 1000
+
+def _query_point(snapshot, building_id: Optional[str], latitude: Optional[float], longitude: Optional[float]):
+    """Resolves the query location from a snapshot building or explicit coordinates."""
+    if building_id is not None:
+        building = snapshot.get(building_id)
+        if building is None:
+            raise HTTPException(status_code=404, detail="Building not found in snapshot")
+        if building.latitude is None or building.longitude is None:
+            raise HTTPException(status_code=422, detail="Building has no coordinates")
+        return building.latitude, building.longitude
+    if latitude is None or longitude is None:
+        raise HTTPException(status_code=422, detail="Provide building_id or latitude and longitude")
+    return latitude, longitude
+
+def _nearby_result(snapshot, rows: np.ndarray, distances: np.ndarray, latitude: float, longitude: float) -> NearbyResult:
+    """Penalty and ROI summaries for the matched snapshot rows."""
+    rules = get_rules()
+    cols = snapshot.columns
+    sqft = np.asarray(cols["gross_sq_ft"][rows])
+    gas = np.asarray(cols["annual_gas_usage_therms"][rows])
+    elec = np.asarray(cols["annual_elec_usage_kwh"][rows])
+    codes = np.asarray(cols["type_codes"][rows])
+    mix = snapshot.use_mix(rows)
+    penalty_2024 = calculate_penalties_batch(sqft, gas, elec, codes, 2024, rules, mix)
+    penalty_2030 = calculate_penalties_batch(sqft, gas, elec, codes, 2030, rules, mix)
+    roi = calculate_roi_batch(sqft, gas, elec, codes, rules, mix)
+
+    buildings = [
+        NearbyBuilding(
+            building_id=str(cols["building_id"][row]),
+            property_type=rules.property_types[int(codes[i])],
+            distance_m=round(float(distances[i]), 1),
+            penalty_2024=float(penalty_2024[i]),
+            penalty_2030=float(penalty_2030[i]),
+            npv=float(roi["npv"][i]),
+            annual_savings=float(roi["annual_savings"][i]),
+            simple_payback_years=float(roi["simple_payback_years"][i]),
+        )
+        for i, row in enumerate(rows)
+    ]
+    summary = NearbySummary(
+        count=len(rows),
+        total_penalty_2024=round(float(penalty_2024.sum()), 2),
+        total_penalty_2030=round(float(penalty_2030.sum()), 2),
+        total_npv=round(float(roi["npv"].sum()), 2),
+        total_gross_sq_ft=float(sqft.sum()),
+    )
+    return NearbyResult(
+        latitude=latitude, longitude=longitude, buildings=buildings, summary=summary,
+        snapshot_version=snapshot.version, rule_version=rules.version
+    )
+
+def _snapshot_or_503():
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="No building snapshot available; run `python -m src.snapshot build`")
+    return snapshot
+
+@app.get("/nearby/radius", response_model=NearbyResult)
+def nearby_radius(
+    radius_m: float = 500.0,
+    building_id: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+):
+    """
+    Snapshot buildings within `radius_m` of a building or a coordinate, with penalty and ROI summaries.
+    """
+    if not 0 < radius_m <= NEARBY_MAX_RADIUS_M:
+        raise HTTPException(status_code=422, detail=f"radius_m must be in (0, {NEARBY_MAX_RADIUS_M:.0f}]")
+    snapshot = _snapshot_or_503()
+    latitude, longitude = _query_point(snapshot, building_id, latitude, longitude)
+    rows, distances = get_spatial_index(snapshot).within(latitude, longitude, radius_m)
+    return _nearby_result(snapshot, rows, distances, latitude, longitude)
+
+@app.get("/nearby/nearest", response_model=NearbyResult)
+def nearby_nearest(
+    k: int = 10,
+    building_id: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+):
+    """
+    The k snapshot buildings nearest to a building or a coordinate, with penalty and ROI summaries.
+    """
+    if not 0 < k <= NEARBY_MAX_K:
+        raise HTTPException(status_code=422, detail=f"k must be in [1, {NEARBY_MAX_K}]")
+    snapshot = _snapshot_or_503()
+    latitude, longitude = _query_point(snapshot, building_id, latitude, longitude)
+    rows, distances = get_spatial_index(snapshot).nearest(latitude, longitude, k)
+    return _nearby_result(snapshot, rows, distances, latitude, longitude)
+
+def _cache_gauges() -> Dict[str, float]:
+    stats = RESULT_CACHE.stats()
+    return {k: stats[k] for k in ("size", "hits", "misses", "hit_rate", "evictions", "expirations")}
+
+REGISTRY.register_gauges("ecocalc_result_cache", _cache_gauges)
+REGISTRY.register_gauges("ecocalc_upstream", lambda: {"fetches": UPSTREAM.fetches, "coalesced": UPSTREAM.coalesced})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, upstream error counts, and
+    result-cache and upstream gauges. Stage timing is off when ECOCALC_METRICS=0.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/export")
+def export_results(format: Literal["csv", "arrow", "parquet"] = "parquet", limit: Optional[int] = None):
+    """
+    Streams emissions, 2024/2030 penalties and all ROI fields for every LL84 property
+    as CSV, an Arrow IPC stream or Parquet. Pages are fetched, normalized and analyzed
+    one at a time, so the export never holds the whole city in memory.
+    """
+    if not format_available(format):
+        raise HTTPException(status_code=501, detail=f"The {format} export format requires pyarrow")
+    return StreamingResponse(
+        export_citywide(format, max_records=limit),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="ecocalc_export.{EXTENSIONS[format]}"'},
+    )
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters and size of the analysis result cache."""
+    return RESULT_CACHE.stats()
+
+@app.delete("/cache")
+def invalidate_cache(building_id: Optional[str] = None):
+    """
+    Invalidates cached analyses: all of them, or only those for one building_id.
+    """
+    if building_id is None:
+        removed = RESULT_CACHE.invalidate()
+    else:
+        removed = RESULT_CACHE.invalidate(lambda key: key[1] == building_id)
+    return {"invalidated": removed}
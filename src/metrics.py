@@ -0,0 +1,180 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Set ECOCALC_METRICS=0 to turn instrumentation into no-ops.
+ENABLED = os.environ.get("ECOCALC_METRICS", "1").lower() not in ("0", "false", "no", "off")
+
+# Histogram bucket upper bounds (seconds), from sub-millisecond math to slow upstream calls.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus exposition model.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Cumulative bucket counts (ending with +Inf), sum and count."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+class MetricsRegistry:
+    """
+    Stage-latency histograms and labelled counters, plus gauges read at scrape time.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage: str, seconds: float):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + amount
+
+    def register_gauges(self, prefix: str, read: Callable[[], Dict[str, float]]):
+        """`read()` returns {suffix: value}; exported as `{prefix}_{suffix}` on every scrape."""
+        self.gauges[prefix] = read
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            "# HELP ecocalc_stage_seconds Time spent per request stage.",
+            "# TYPE ecocalc_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets + (float("inf"),), cumulative):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'ecocalc_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {value}')
+            lines.append(f'ecocalc_stage_seconds_sum{{stage="{stage}"}} {total!r}')
+            lines.append(f'ecocalc_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value!r}" if label_text else f"{name} {value!r}")
+
+        for prefix, read in sorted(self.gauges.items()):
+            for suffix, value in sorted(read().items()):
+                lines.append(f"# TYPE {prefix}_{suffix} gauge")
+                lines.append(f"{prefix}_{suffix} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+# Stage timings of the current request, for the Server-Timing header.
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "ecocalc_request_timings", default=None
+)
+
+@contextmanager
+def _timed(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe_stage(name, elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+_DISABLED = nullcontext()
+
+def stage(name: str):
+    """
+    Times a block as request stage `name`:
+        with stage("normalize"):
+            ...
+    Returns a shared no-op context manager when metrics are disabled.
+    """
+    return _timed(name) if ENABLED else _DISABLED
+
+def inc(name: str, amount: float = 1.0, **labels: str):
+    if ENABLED:
+        REGISTRY.inc(name, amount, **labels)
+
+def start_request() -> Optional[contextvars.Token]:
+    """Begins collecting stage timings for the current request (None when disabled)."""
+    return _request_timings.set([]) if ENABLED else None
+
+def server_timing(timings: Optional[List[Tuple[str, float]]] = None) -> Optional[str]:
+    """Server-Timing header value for the stages recorded so far in this request."""
+    timings = _request_timings.get() if timings is None else timings
+    if not timings:
+        return None
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings)
+
+def finish_request(token: Optional[contextvars.Token]):
+    if token is not None:
+        _request_timings.reset(token)
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that adds a Server-Timing header listing the stages timed while
+    handling the request. Pure ASGI (not BaseHTTPMiddleware) so streamed request bodies
+    and responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        token = start_request()
+        # Held directly: send() may be called from a task with a copied context
+        timings = _request_timings.get()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = server_timing(timings)
+                if header:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            finish_request(token)
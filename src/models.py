@@ -1,5 +1,12 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional
+from typing import Dict, Optional
+
+# LL97 property categories, in the order used for integer type codes by the batch engine.
+# Codes are stored in snapshots, so new categories are only ever appended.
+PROPERTY_TYPES = [
+    "Office", "Multifamily", "Hotel", "Store", "Industrial",
+    "Healthcare", "Education", "Assembly", "Storage", "Institutional",
+]
 
 class Building(BaseModel):
     """
@@ -12,11 +19,25 @@ class Building(BaseModel):
     property_type: str = Field(..., description="Type of property (e.g., Office, Multifamily)")
     latitude: Optional[float] = Field(None, description="Latitude")
     longitude: Optional[float] = Field(None, description="Longitude")
+    use_mix: Optional[Dict[str, float]] = Field(
+        None, description="Mixed-use buildings: gross floor area per property type, largest use first"
+    )
 
     @field_validator('property_type')
     @classmethod
     def validate_property_type(cls, v: str) -> str:
-        allowed_types = ["Office", "Multifamily", "Hotel", "Store", "Industrial"]
-        if v not in allowed_types:
-            raise ValueError(f"Property type must be one of {allowed_types}")
+        if v not in PROPERTY_TYPES:
+            raise ValueError(f"Property type must be one of {PROPERTY_TYPES}")
+        return v
+
+    @field_validator('use_mix')
+    @classmethod
+    def validate_use_mix(cls, v: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+        if v is None:
+            return v
+        for property_type, gfa in v.items():
+            if property_type not in PROPERTY_TYPES:
+                raise ValueError(f"use_mix property types must be one of {PROPERTY_TYPES}")
+            if gfa < 0:
+                raise ValueError("use_mix floor areas must be >= 0")
         return v
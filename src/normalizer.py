@@ -1,6 +1,9 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
+from src.classifier import classify_property_type
 from src.models import Building
 import logging
+import numpy as np
+import pandas as pd
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -8,24 +11,23 @@ logger = logging.getLogger(__name__)
 
 def map_property_type(raw_type: str) -> str:
     """
-    Maps NYC raw property types to LL97 limits categories.
+    Maps NYC raw property types to LL97 limits categories (table in config/property_types.yaml).
     """
-    raw_type = raw_type.lower()
-    if "office" in raw_type or "bank" in raw_type or "financial" in raw_type:
-        return "Office"
-    elif "multifamily" in raw_type or "residential" in raw_type or "dormitory" in raw_type:
-        return "Multifamily"
-    elif "hotel" in raw_type:
-        return "Hotel"
-    elif "retail" in raw_type or "store" in raw_type or "mall" in raw_type or "supermarket" in raw_type:
-        return "Store"
-    elif "warehouse" in raw_type or "distribution" in raw_type or "manufacturing" in raw_type:
-        return "Industrial"
-    else:
-        # Default fallback or could return "Other" if model supported it
-        # For now, mapping to Office as a safe default or raising warning
-        # logger.warning(f"Unmapped property type: {raw_type}. Defaulting to Office.")
-        return "Office"
+    return classify_property_type(raw_type)
+
+# Placeholders the LL84 extract uses for missing values.
+MISSING_STRINGS = ["not available", "n/a", "nan", ""]
+
+# LL84 largest / 2nd / 3rd largest property uses: (type keys, gross floor area keys).
+# Socrata truncates long column names, so both spellings are tried.
+USE_FIELDS = [
+    (["largest_property_use_type"],
+     ["largest_property_use_type_gross_floor_area", "largest_property_use_type_1"]),
+    (["2nd_largest_property_use_type", "_2nd_largest_property_use"],
+     ["2nd_largest_property_use_type_gross_floor_area", "_2nd_largest_property_use_1"]),
+    (["3rd_largest_property_use_type", "_3rd_largest_property_use"],
+     ["3rd_largest_property_use_type_gross_floor_area", "_3rd_largest_property_use_1"]),
+]
 
 def get_value(record: Dict[str, Any], keys: List[str], default: float = 0.0) -> float:
     """Helper to get float value from multiple potential keys."""
@@ -34,7 +36,7 @@ def get_value(record: Dict[str, Any], keys: List[str], default: float = 0.0) ->
             val = record[key]
             # Handle "Not Available" or other strings
             if isinstance(val, str):
-                if val.lower() in ["not available", "n/a", "nan", ""]:
+                if val.lower() in MISSING_STRINGS:
                     continue
             try:
                 return float(val)
@@ -42,6 +44,31 @@ def get_value(record: Dict[str, Any], keys: List[str], default: float = 0.0) ->
                 continue
     return default
 
+def get_label(record: Dict[str, Any], keys: List[str]) -> Optional[str]:
+    """First non-placeholder string value across keys, else None."""
+    for key in keys:
+        val = record.get(key)
+        if isinstance(val, str) and val.lower() not in MISSING_STRINGS:
+            return val
+    return None
+
+def get_use_mix(record: Dict[str, Any], property_type: str) -> Optional[Dict[str, float]]:
+    """
+    Floor area per LL97 property type from the largest/2nd/3rd use fields (uses mapping to
+    the same type are summed), or None unless some use differs from property_type.
+    """
+    mix: Dict[str, float] = {}
+    for type_keys, gfa_keys in USE_FIELDS:
+        raw_use = get_label(record, type_keys)
+        gfa = get_value(record, gfa_keys)
+        if raw_use is None or gfa <= 0:
+            continue
+        use_type = map_property_type(raw_use)
+        mix[use_type] = mix.get(use_type, 0.0) + gfa
+    if all(use_type == property_type for use_type in mix):
+        return None
+    return mix
+
 # Maximum plausible site EUI (kBtu/ft²). NYC median office ~80, worst real buildings ~500.
 # Records above this threshold are almost certainly estimated/aggregated campus data.
 MAX_SITE_EUI_KBTU_FT2 = 5000.0
@@ -102,6 +129,7 @@ def normalize_building_data(raw_data: List[Dict[str, Any]]) -> List[Building]:
             # Extract Type
             raw_type = record.get("primary_property_type_self_selected", "Office")
             prop_type = map_property_type(raw_type)
+            use_mix = get_use_mix(record, prop_type)
 
             # Extract Geo
             lat = get_value(record, ["latitude"])
@@ -114,7 +142,8 @@ def normalize_building_data(raw_data: List[Dict[str, Any]]) -> List[Building]:
                 annual_elec_usage_kwh=elec_kwh,
                 property_type=prop_type,
                 latitude=lat if lat != 0 else None,
-                longitude=lon if lon != 0 else None
+                longitude=lon if lon != 0 else None,
+                use_mix=use_mix
             )
             buildings.append(building)
             
@@ -123,3 +152,210 @@ def normalize_building_data(raw_data: List[Dict[str, Any]]) -> List[Building]:
             continue
             
     return buildings
+
+
+# --- Vectorized (DataFrame) normalizer ---
+# Same rules as normalize_building_data, applied as column operations.
+
+SQFT_KEYS = ["property_gfa_self_reported", "gross_floor_area_ft"]
+GAS_KBTU_KEYS = ["natural_gas_use_kbtu"]
+GAS_THERMS_KEYS = ["natural_gas_use_therms"]
+ELEC_KBTU_KEYS = ["electricity_use_grid_purchase_kbtu", "electricity_use_grid_purchase"]
+ELEC_KWH_KEYS = ["electricity_use_grid_purchase_kwh", "electricity_use_generated_from_onsite_renewable_systems_kwh"]
+
+# Mixed-use slots (largest use first): LL97 type (None if empty) and floor area (0 if empty).
+# Only filled for buildings with a use of a different type than property_type.
+USE_TYPE_COLUMNS = [f"use_type_{i}" for i in range(1, len(USE_FIELDS) + 1)]
+USE_GFA_COLUMNS = [f"use_gfa_{i}" for i in range(1, len(USE_FIELDS) + 1)]
+
+BUILDING_COLUMNS = [
+    "building_id", "gross_sq_ft", "annual_gas_usage_therms", "annual_elec_usage_kwh",
+    "property_type", "latitude", "longitude",
+] + USE_TYPE_COLUMNS + USE_GFA_COLUMNS
+REJECTION_COLUMNS = ["row", "building_id", "reason", "detail"]
+
+def _parse_numeric(values: pd.Series) -> pd.Series:
+    """Column version of get_value's parsing: placeholders and unparseable strings become NaN."""
+    parsed = pd.to_numeric(values, errors="coerce").astype(np.float64)
+    valid = parsed.notna().to_numpy()
+    if valid.any():
+        # pandas' fast string parser is not correctly rounded; re-parse valid entries
+        # with float() semantics so results match get_value bit for bit
+        exact = parsed.to_numpy(copy=True)
+        exact[valid] = values.to_numpy(dtype=object)[valid].astype(np.float64)
+        parsed = pd.Series(exact, index=values.index)
+    return parsed
+
+def _coalesce(df: pd.DataFrame, keys: List[str], default: float = 0.0) -> pd.Series:
+    """Column version of get_value: first parseable value across keys, else default."""
+    result = pd.Series(np.nan, index=df.index, dtype=np.float64)
+    for key in keys:
+        if key in df.columns:
+            result = result.fillna(_parse_numeric(df[key]))
+    return result.fillna(default)
+
+def _column(df: pd.DataFrame, key: str) -> pd.Series:
+    if key in df.columns:
+        return df[key]
+    return pd.Series(np.nan, index=df.index, dtype=object)
+
+def _label(df: pd.DataFrame, keys: List[str]) -> pd.Series:
+    """Column version of get_label: first non-placeholder string across keys, else None."""
+    result = pd.Series(None, index=df.index, dtype=object)
+    for key in keys:
+        if key in df.columns:
+            values = df[key]
+            usable = values.map(lambda v: isinstance(v, str) and v.lower() not in MISSING_STRINGS)
+            result = result.where(result.notna() | ~usable, values)
+    return result
+
+def _use_slots(df: pd.DataFrame, prop_types: pd.Series) -> Tuple[List[pd.Series], List[pd.Series]]:
+    """
+    Column version of get_use_mix: per slot, the LL97 type and floor area of that use.
+    A use whose type already appears in an earlier slot is added to that slot, and rows
+    that are not mixed-use get empty slots.
+    """
+    types, areas = [], []
+    for type_keys, gfa_keys in USE_FIELDS:
+        raw_use = _label(df, type_keys)
+        gfa = _coalesce(df, gfa_keys)
+        valid = raw_use.notna() & (gfa > 0)
+        lookup = {t: map_property_type(t) for t in raw_use[valid].unique()}
+        types.append(raw_use.where(valid).map(lookup))
+        areas.append(gfa.where(valid, 0.0))
+
+    for j in range(1, len(types)):
+        for i in range(j):
+            same = types[j].notna() & (types[i] == types[j])
+            areas[i] = areas[i].where(~same, areas[i] + areas[j])
+            areas[j] = areas[j].where(~same, 0.0)
+            types[j] = types[j].where(~same)
+
+    mixed = pd.Series(False, index=df.index)
+    for use_type in types:
+        mixed |= use_type.notna() & (use_type != prop_types)
+    types = [t.astype(object).where(mixed & t.notna(), None) for t in types]
+    areas = [a.where(mixed, 0.0) for a in areas]
+    return types, areas
+
+def normalize_building_frame(
+    raw_data: Union[List[Dict[str, Any]], pd.DataFrame]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Vectorized equivalent of normalize_building_data.
+    Returns (buildings, rejected):
+      - buildings: one row per accepted record with BUILDING_COLUMNS (NaN for missing lat/lon),
+        indexed by the record's position in raw_data.
+      - rejected: one row per dropped record with REJECTION_COLUMNS; reason is one of
+        "missing_gfa", "implausible_eui" or "invalid_record".
+    A key present with an explicit None is kept distinct from a missing key (as in the
+    dict-based function) when raw_data is a list of dicts.
+    """
+    if isinstance(raw_data, pd.DataFrame):
+        df = raw_data.reset_index(drop=True)
+    else:
+        df = pd.DataFrame(raw_data, dtype=object)
+    index = df.index
+    reasons = pd.Series(None, index=index, dtype=object)
+    details = pd.Series("", index=index, dtype=object)
+
+    def reject(mask, reason: str, detail):
+        mask = mask & reasons.isna()
+        reasons[mask] = reason
+        details[mask] = detail if isinstance(detail, str) else detail[mask]
+
+    # Missing key -> "Unknown"; explicit None (or non-string) fails Building validation
+    raw_ids = _column(df, "property_id")
+    explicit_none_id = np.equal(raw_ids.to_numpy(dtype=object), None)
+    ids = raw_ids.where(~(raw_ids.isna() & ~explicit_none_id), "Unknown")
+
+    # 1. SQFT
+    sqft = _coalesce(df, SQFT_KEYS)
+    reject(sqft <= 0, "missing_gfa", "gross floor area missing or not positive")
+
+    # 2. EUI sanity filter
+    site_eui = _parse_numeric(_column(df, "site_eui_kbtu_ft"))
+    reject(
+        site_eui > MAX_SITE_EUI_KBTU_FT2,
+        "implausible_eui",
+        site_eui.map(lambda v: f"site EUI {v:.0f} kBtu/ft² exceeds {MAX_SITE_EUI_KBTU_FT2:.0f}"),
+    )
+
+    # 3. Energy: kBtu fields win when positive
+    gas_kbtu = _coalesce(df, GAS_KBTU_KEYS)
+    gas_therms = (gas_kbtu / 100.0).where(gas_kbtu > 0, _coalesce(df, GAS_THERMS_KEYS))
+    elec_kbtu = _coalesce(df, ELEC_KBTU_KEYS)
+    elec_kwh = (elec_kbtu / 3.41214).where(elec_kbtu > 0, _coalesce(df, ELEC_KWH_KEYS))
+
+    # 4. Property type: map each distinct raw string once
+    raw_types = _column(df, "primary_property_type_self_selected")
+    explicit_none_type = np.equal(raw_types.to_numpy(dtype=object), None)
+    raw_types = raw_types.where(~(raw_types.isna() & ~explicit_none_type), "Office")
+    is_str_type = raw_types.map(lambda v: isinstance(v, str))
+    type_lookup = {t: map_property_type(t) for t in raw_types[is_str_type].unique()}
+    prop_types = raw_types.map(type_lookup)
+    reject(~is_str_type, "invalid_record", "primary_property_type_self_selected is not a string")
+
+    # 5. Remaining Building validation rules
+    is_str_id = ids.map(lambda v: isinstance(v, str))
+    reject(~is_str_id, "invalid_record", "building_id must be a string")
+    reject(gas_therms < 0, "invalid_record", "annual_gas_usage_therms must be >= 0")
+    reject(elec_kwh < 0, "invalid_record", "annual_elec_usage_kwh must be >= 0")
+
+    # 6. Geo: 0 means unknown
+    lat = _coalesce(df, ["latitude"])
+    lon = _coalesce(df, ["longitude"])
+
+    # 7. Mixed use: largest / 2nd / 3rd use types and floor areas
+    use_types, use_gfas = _use_slots(df, prop_types)
+
+    accepted = reasons.isna()
+    buildings = pd.DataFrame({
+        "building_id": ids,
+        "gross_sq_ft": sqft,
+        "annual_gas_usage_therms": gas_therms,
+        "annual_elec_usage_kwh": elec_kwh,
+        "property_type": prop_types,
+        "latitude": lat.where(lat != 0),
+        "longitude": lon.where(lon != 0),
+        **dict(zip(USE_TYPE_COLUMNS, use_types)),
+        **dict(zip(USE_GFA_COLUMNS, use_gfas)),
+    })[accepted]
+
+    rejected = pd.DataFrame({
+        "row": index[~accepted],
+        "building_id": raw_ids[~accepted].where(raw_ids[~accepted].notna(), None),
+        "reason": reasons[~accepted],
+        "detail": details[~accepted],
+    }, columns=REJECTION_COLUMNS).reset_index(drop=True)
+
+    if len(rejected):
+        counts = rejected["reason"].value_counts().to_dict()
+        logger.info(f"Rejected {len(rejected)} of {len(df)} records: {counts}")
+    return buildings, rejected
+
+def frame_to_buildings(frame: pd.DataFrame) -> List[Building]:
+    """
+    Converts the accepted rows from normalize_building_frame into Building objects.
+    """
+    return [
+        Building(
+            building_id=row.building_id,
+            gross_sq_ft=row.gross_sq_ft,
+            annual_gas_usage_therms=row.annual_gas_usage_therms,
+            annual_elec_usage_kwh=row.annual_elec_usage_kwh,
+            property_type=row.property_type,
+            latitude=None if pd.isna(row.latitude) else row.latitude,
+            longitude=None if pd.isna(row.longitude) else row.longitude,
+            use_mix=_row_use_mix(row),
+        )
+        for row in frame.itertuples(index=False)
+    ]
+
+def _row_use_mix(row) -> Optional[Dict[str, float]]:
+    mix = {}
+    for type_column, gfa_column in zip(USE_TYPE_COLUMNS, USE_GFA_COLUMNS):
+        use_type = getattr(row, type_column, None)
+        if isinstance(use_type, str):
+            mix[use_type] = getattr(row, gfa_column)
+    return mix or None
@@ -0,0 +1,193 @@
+import logging
+import threading
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from src.engine.batch import calculate_emissions_batch, calculate_penalties_batch
+from src.engine.rules import RuleTable, get_rules
+
+logger = logging.getLogger(__name__)
+
+# Penalty year used for the penalty percentile.
+PEER_PENALTY_YEAR = 2024
+
+# Above this share of changed buildings a refresh re-sorts everything instead of patching.
+INCREMENTAL_MAX_CHANGE = 0.25
+
+METRICS = ("emissions_intensity", "penalty")
+
+def emissions_intensity(gross_sq_ft, annual_gas_usage_therms, annual_elec_usage_kwh, rules: RuleTable) -> np.ndarray:
+    """kgCO2e per square foot."""
+    sqft = np.asarray(gross_sq_ft, dtype=np.float64)
+    emissions = calculate_emissions_batch(annual_gas_usage_therms, annual_elec_usage_kwh, rules)
+    return np.divide(emissions * 1000.0, sqft, out=np.zeros_like(sqft), where=sqft > 0)
+
+def percentile_rank(sorted_values: np.ndarray, value: float) -> float:
+    """
+    Share of the cohort (0-100) below `value`, counting ties as half.
+    Two binary searches, so O(log n).
+    """
+    n = len(sorted_values)
+    if n == 0:
+        return float("nan")
+    below = np.searchsorted(sorted_values, value, side="left")
+    at_or_below = np.searchsorted(sorted_values, value, side="right")
+    return float((below + at_or_below) / 2 / n * 100)
+
+@dataclass
+class PeerIndex:
+    """
+    Sorted per-property-type arrays of emissions intensity and penalty.
+    Also keeps each building's values by ID so a refreshed snapshot can be applied as
+    a delta (removing and inserting only the changed buildings) rather than a re-sort.
+    """
+    snapshot_version: str
+    rule_version: str
+    property_types: Tuple[str, ...]
+    cohorts: Dict[int, Dict[str, np.ndarray]]
+    ids: np.ndarray
+    codes: np.ndarray
+    values: Dict[str, np.ndarray]
+    rebuilt_types: Tuple[int, ...] = field(default=())
+
+    def cohort_size(self, property_type: str) -> int:
+        code = self._code(property_type)
+        return 0 if code is None else len(self.cohorts[code]["penalty"])
+
+    def percentiles(self, property_type: str, intensity: float, penalty: float) -> Optional[Dict[str, float]]:
+        code = self._code(property_type)
+        if code is None or not len(self.cohorts[code]["penalty"]):
+            return None
+        cohort = self.cohorts[code]
+        return {
+            "emissions_intensity": percentile_rank(cohort["emissions_intensity"], intensity),
+            "penalty": percentile_rank(cohort["penalty"], penalty),
+        }
+
+    def _code(self, property_type: str) -> Optional[int]:
+        return self.property_types.index(property_type) if property_type in self.property_types else None
+
+def _snapshot_values(snapshot, rules: RuleTable):
+    """Building IDs (sorted) with their type codes and metric values."""
+    cols = snapshot.columns
+    ids = np.asarray(cols["building_id"])
+    order = np.argsort(ids, kind="stable")
+    # Snapshot IDs can repeat; like the snapshot's own index, the first occurrence wins
+    ids, first = np.unique(ids[order], return_index=True)
+    rows = order[first]
+    sqft = np.asarray(cols["gross_sq_ft"])[rows]
+    gas = np.asarray(cols["annual_gas_usage_therms"])[rows]
+    elec = np.asarray(cols["annual_elec_usage_kwh"])[rows]
+    codes = np.asarray(cols["type_codes"], dtype=np.int64)[rows]
+    values = {
+        "emissions_intensity": emissions_intensity(sqft, gas, elec, rules),
+        "penalty": calculate_penalties_batch(sqft, gas, elec, codes, PEER_PENALTY_YEAR, rules, snapshot.use_mix(rows)),
+    }
+    return ids, codes, values
+
+def build_peer_index(snapshot, rules: Optional[RuleTable] = None) -> PeerIndex:
+    """
+    Builds the index from scratch.
+    """
+    rules = rules or get_rules()
+    ids, codes, values = _snapshot_values(snapshot, rules)
+    cohorts = {
+        code: {metric: np.sort(values[metric][codes == code]) for metric in METRICS}
+        for code in range(len(rules.property_types))
+    }
+    return PeerIndex(
+        snapshot_version=snapshot.version,
+        rule_version=rules.version,
+        property_types=tuple(rules.property_types),
+        cohorts=cohorts,
+        ids=ids,
+        codes=codes,
+        values=values,
+        rebuilt_types=tuple(cohorts),
+    )
+
+def refresh_peer_index(index: Optional[PeerIndex], snapshot, rules: Optional[RuleTable] = None) -> PeerIndex:
+    """
+    Brings `index` up to date with `snapshot`.
+    Only cohorts with added, removed or changed buildings are touched: old values are
+    deleted and new ones inserted at their searchsorted positions, so each touched cohort
+    costs one merge instead of a sort. A new rule version (which changes every value) or a
+    large change set falls back to build_peer_index().
+    """
+    rules = rules or get_rules()
+    if (index is None or not len(index.ids) or index.rule_version != rules.version
+            or index.property_types != tuple(rules.property_types)):
+        return build_peer_index(snapshot, rules)
+    if index.snapshot_version == snapshot.version:
+        return index
+
+    ids, codes, values = _snapshot_values(snapshot, rules)
+
+    # 1. Diff by building ID (both ID arrays are sorted and unique)
+    pos = np.minimum(np.searchsorted(index.ids, ids), len(index.ids) - 1)
+    same = (index.ids[pos] == ids) & (index.codes[pos] == codes)
+    for metric in METRICS:
+        same &= index.values[metric][pos] == values[metric]
+    kept_old = np.zeros(len(index.ids), dtype=bool)
+    kept_old[pos[same]] = True
+
+    removed = ~kept_old
+    added = ~same
+    changed = int(removed.sum() + added.sum())
+    if changed > INCREMENTAL_MAX_CHANGE * max(len(ids), 1):
+        return build_peer_index(snapshot, rules)
+
+    # 2. Patch only the affected cohorts
+    cohorts = dict(index.cohorts)
+    touched = sorted(set(index.codes[removed].tolist()) | set(codes[added].tolist()))
+    for code in touched:
+        patched = {}
+        for metric in METRICS:
+            current = cohorts[code][metric]
+            gone = np.sort(index.values[metric][removed & (index.codes == code)])
+            if len(gone):
+                # Each removed value deletes one matching entry; ties are interchangeable
+                slots = np.searchsorted(current, gone, side="left")
+                slots += np.arange(len(gone)) - np.searchsorted(gone, gone, side="left")
+                current = np.delete(current, slots)
+            new = np.sort(values[metric][added & (codes == code)])
+            patched[metric] = np.insert(current, np.searchsorted(current, new), new)
+        cohorts[code] = patched
+
+    logger.info(f"Peer index patched for snapshot {snapshot.version}: {changed} changes across {len(touched)} cohorts")
+    return PeerIndex(
+        snapshot_version=snapshot.version,
+        rule_version=rules.version,
+        property_types=index.property_types,
+        cohorts=cohorts,
+        ids=ids,
+        codes=codes,
+        values=values,
+        rebuilt_types=tuple(touched),
+    )
+
+_lock = threading.Lock()
+_current: Optional[PeerIndex] = None
+
+def get_peer_index(snapshot) -> Optional[PeerIndex]:
+    """
+    Peer index for `snapshot` (None without a snapshot), refreshed when the snapshot
+    or rule version changes.
+    """
+    global _current
+    if snapshot is None:
+        return None
+    rules = get_rules()
+    with _lock:
+        index = _current
+        if index is None or index.snapshot_version != snapshot.version or index.rule_version != rules.version:
+            index = refresh_peer_index(index, snapshot, rules)
+            _current = index
+        return index
+
+def reset_peer_index():
+    """Drops the cached index; the next lookup rebuilds it."""
+    global _current
+    with _lock:
+        _current = None
@@ -0,0 +1,365 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.engine.batch import UseMix, build_use_mix, encode_property_types, use_slots
+from src.models import Building, PROPERTY_TYPES
+from src.normalizer import USE_GFA_COLUMNS, USE_TYPE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Local columnar copy of normalized LL84 buildings, so lookups don't depend on Socrata.
+# Layout: one .npy file per column (memory-mapped on load) plus meta.json.
+BASE_DIR = Path(__file__).parent.parent
+SNAPSHOT_DIR = Path(os.environ.get("ECOCALC_SNAPSHOT_DIR", BASE_DIR / "data" / "snapshot"))
+
+FLOAT_COLUMNS = ["gross_sq_ft", "annual_gas_usage_therms", "annual_elec_usage_kwh", "latitude", "longitude"]
+# Reporting year of the dataset each row came from; written by `sync`, absent in older snapshots.
+YEAR_COLUMN = "reporting_year"
+# Mixed-use floor areas as (n, k) type codes (-1 = empty slot) and GFAs; absent in older snapshots.
+USE_COLUMNS = ["use_codes", "use_gfa"]
+META_FILE = "meta.json"
+
+class SnapshotStore:
+    """
+    Read-only view over a snapshot directory with a hash index on building_id.
+    """
+
+    def __init__(self, directory: Path, columns: Dict[str, np.ndarray], meta: Dict):
+        self.directory = Path(directory)
+        self.columns = columns
+        self.meta = meta
+        # First occurrence wins if the source has duplicate IDs
+        self.index: Dict[str, int] = {}
+        for row, building_id in enumerate(columns["building_id"].tolist()):
+            self.index.setdefault(building_id, row)
+
+    @classmethod
+    def load(cls, directory: Path) -> "SnapshotStore":
+        directory = Path(directory)
+        with open(directory / META_FILE, "r") as f:
+            meta = json.load(f)
+        columns = {}
+        for name in ["building_id", "type_codes"] + FLOAT_COLUMNS:
+            columns[name] = np.load(directory / f"{name}.npy", mmap_mode="r")
+        for name in [YEAR_COLUMN] + USE_COLUMNS:
+            if (directory / f"{name}.npy").exists():
+                columns[name] = np.load(directory / f"{name}.npy", mmap_mode="r")
+        return cls(directory, columns, meta)
+
+    @property
+    def version(self) -> str:
+        return self.meta["version"]
+
+    def __len__(self) -> int:
+        return len(self.columns["building_id"])
+
+    def __contains__(self, building_id: str) -> bool:
+        return building_id in self.index
+
+    def row(self, row: int) -> Building:
+        lat = float(self.columns["latitude"][row])
+        lon = float(self.columns["longitude"][row])
+        return Building(
+            building_id=str(self.columns["building_id"][row]),
+            gross_sq_ft=float(self.columns["gross_sq_ft"][row]),
+            annual_gas_usage_therms=float(self.columns["annual_gas_usage_therms"][row]),
+            annual_elec_usage_kwh=float(self.columns["annual_elec_usage_kwh"][row]),
+            property_type=PROPERTY_TYPES[int(self.columns["type_codes"][row])],
+            latitude=None if np.isnan(lat) else lat,
+            longitude=None if np.isnan(lon) else lon,
+            use_mix=self._row_use_mix(row),
+        )
+
+    def _row_use_mix(self, row: int) -> Optional[Dict[str, float]]:
+        if "use_codes" not in self.columns:
+            return None
+        codes, gfa = self.columns["use_codes"][row], self.columns["use_gfa"][row]
+        mix = {PROPERTY_TYPES[int(c)]: float(a) for c, a in zip(codes, gfa) if c >= 0}
+        return mix or None
+
+    def use_mix(self, rows: Optional[np.ndarray] = None) -> Optional[UseMix]:
+        """Mixed-use buildings among all rows (or `rows`) for the batch engine; None if there are none."""
+        if "use_codes" not in self.columns:
+            return None
+        select = np.s_[:] if rows is None else rows
+        return build_use_mix(
+            np.asarray(self.columns["type_codes"])[select],
+            np.asarray(self.columns["use_codes"])[select],
+            np.asarray(self.columns["use_gfa"])[select],
+            np.asarray(self.columns["gross_sq_ft"])[select],
+        )
+
+    def get(self, building_id: str) -> Optional[Building]:
+        row = self.index.get(building_id)
+        return None if row is None else self.row(row)
+
+def write_snapshot(buildings: Iterable[Building], directory: Path = None, source: str = "") -> Dict:
+    """
+    Writes buildings to a snapshot directory.
+    The new snapshot is staged next to the old one and swapped in with a rename,
+    so readers never see a half-written snapshot.
+    """
+    buildings = list(buildings)
+    type_lookup = {name: code for code, name in enumerate(PROPERTY_TYPES)}
+    use_types, use_gfa = use_slots(buildings)
+
+    columns = {
+        "building_id": np.array([b.building_id for b in buildings], dtype=np.str_),
+        "type_codes": np.array([type_lookup[b.property_type] for b in buildings], dtype=np.int8),
+        "gross_sq_ft": np.array([b.gross_sq_ft for b in buildings], dtype=np.float64),
+        "annual_gas_usage_therms": np.array([b.annual_gas_usage_therms for b in buildings], dtype=np.float64),
+        "annual_elec_usage_kwh": np.array([b.annual_elec_usage_kwh for b in buildings], dtype=np.float64),
+        "latitude": np.array([np.nan if b.latitude is None else b.latitude for b in buildings], dtype=np.float64),
+        "longitude": np.array([np.nan if b.longitude is None else b.longitude for b in buildings], dtype=np.float64),
+    }
+    if use_types.size:
+        columns["use_codes"] = _encode_uses(use_types)
+        columns["use_gfa"] = use_gfa
+    return write_columns(columns, directory, source=source)
+
+def _encode_uses(use_types: np.ndarray) -> np.ndarray:
+    return encode_property_types(use_types.reshape(-1)).reshape(use_types.shape).astype(np.int8)
+
+def write_columns(columns: Dict[str, np.ndarray], directory: Path = None, source: str = "", **extra_meta: Any) -> Dict:
+    """
+    Writes snapshot columns (the SnapshotStore layout) with a fresh version, staged and
+    swapped in like write_snapshot. `extra_meta` is stored in meta.json.
+    """
+    directory = Path(directory or SNAPSHOT_DIR)
+    meta = {
+        "version": f"{time.time_ns():x}",
+        "rows": len(columns["building_id"]),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "source": source,
+        "property_types": PROPERTY_TYPES,
+        **extra_meta,
+    }
+
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    staging = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    for name, values in columns.items():
+        np.save(staging / f"{name}.npy", values)
+    with open(staging / META_FILE, "w") as f:
+        json.dump(meta, f, indent=2)
+
+    previous = directory.with_name(directory.name + ".old")
+    shutil.rmtree(previous, ignore_errors=True)
+    if directory.exists():
+        directory.rename(previous)
+    staging.rename(directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    return meta
+
+_lock = threading.Lock()
+_loaded: Dict[Path, tuple] = {}
+
+def get_snapshot(directory: Path = None) -> Optional[SnapshotStore]:
+    """
+    Returns the snapshot at `directory` (default SNAPSHOT_DIR), or None if none has been built.
+    Reloads automatically when the snapshot is refreshed on disk.
+    """
+    directory = Path(directory or SNAPSHOT_DIR)
+    try:
+        stamp = (directory / META_FILE).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _lock:
+        cached = _loaded.get(directory)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        try:
+            store = SnapshotStore.load(directory)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load snapshot from {directory}: {e}")
+            return None
+        _loaded[directory] = (stamp, store)
+        return store
+
+def build_snapshot(directory: Path = None, limit: Optional[int] = None, workers: int = 4) -> Dict:
+    """
+    Pulls LL84 data page by page, normalizes each page and writes a fresh snapshot.
+    """
+    from src.ingestor import iter_nyc_data, NYC_DATA_URL
+    from src.normalizer import normalize_building_data
+
+    buildings: List[Building] = []
+    for page in iter_nyc_data(max_records=limit, workers=workers, chunked=True):
+        buildings.extend(normalize_building_data(page))
+    return write_snapshot(buildings, directory, source=NYC_DATA_URL)
+
+# Columns of the working frame used by sync_snapshot (indexed by building_id).
+_SYNC_COLUMNS = FLOAT_COLUMNS + ["property_type"] + USE_TYPE_COLUMNS + USE_GFA_COLUMNS + [YEAR_COLUMN]
+
+def _load_frame(directory: Path) -> Tuple[pd.DataFrame, Dict]:
+    """The current snapshot as a frame indexed by building_id (first occurrence wins), plus its meta."""
+    try:
+        store = SnapshotStore.load(directory)
+    except FileNotFoundError:
+        return pd.DataFrame(columns=_SYNC_COLUMNS, index=pd.Index([], name="building_id")), {}
+    cols = store.columns
+    frame = pd.DataFrame({name: np.array(cols[name]) for name in FLOAT_COLUMNS},
+                         index=pd.Index(np.array(cols["building_id"]).astype(str), name="building_id"))
+    frame["property_type"] = np.array(PROPERTY_TYPES, dtype=object)[np.asarray(cols["type_codes"], dtype=np.int64)]
+    names = np.array(PROPERTY_TYPES + [None], dtype=object)
+    for j, (type_column, gfa_column) in enumerate(zip(USE_TYPE_COLUMNS, USE_GFA_COLUMNS)):
+        if "use_codes" in cols and j < cols["use_codes"].shape[1]:
+            frame[type_column] = names[np.asarray(cols["use_codes"][:, j], dtype=np.int64)]
+            frame[gfa_column] = np.array(cols["use_gfa"][:, j], dtype=np.float64)
+        else:
+            frame[type_column] = None
+            frame[gfa_column] = 0.0
+    # Rows from snapshots built before sync existed yield to any dataset
+    frame[YEAR_COLUMN] = np.array(cols[YEAR_COLUMN], dtype=np.int64) if YEAR_COLUMN in cols else 0
+    return frame[~frame.index.duplicated(keep="first")], store.meta
+
+def _apply_changes(frame: pd.DataFrame, accepted: List[pd.DataFrame], removed_ids: Iterable[str], year: int):
+    """
+    Upserts normalized rows from one dataset and drops properties whose new record no
+    longer normalizes. Rows owned by a later reporting year are left alone, as are rows
+    whose values did not change. Returns the new frame and the change counts.
+    """
+    if accepted:
+        changes = pd.concat(accepted).drop_duplicates("building_id", keep="last").set_index("building_id")
+    else:
+        changes = pd.DataFrame(columns=_SYNC_COLUMNS[:-1], index=pd.Index([], name="building_id"))
+    changes = changes[_SYNC_COLUMNS[:-1]].assign(**{YEAR_COLUMN: year})
+
+    owner_year = frame[YEAR_COLUMN].reindex(changes.index)
+    changes = changes[owner_year.isna().to_numpy() | (owner_year <= year).to_numpy()]
+    existing = changes.index.intersection(frame.index)
+    current, incoming = frame.loc[existing, _SYNC_COLUMNS], changes.loc[existing, _SYNC_COLUMNS]
+    same = ((current == incoming) | (current.isna() & incoming.isna())).all(axis=1)
+    updated = existing[~same.to_numpy()]
+    inserted = changes.index.difference(frame.index)
+
+    frame = frame.copy()
+    frame.loc[updated, _SYNC_COLUMNS] = changes.loc[updated, _SYNC_COLUMNS]
+    frame = pd.concat([frame, changes.loc[inserted]]) if len(inserted) else frame
+
+    removals = pd.Index(sorted(set(removed_ids) - set(changes.index))).intersection(frame.index)
+    removals = removals[(frame.loc[removals, YEAR_COLUMN] <= year).to_numpy()]
+    frame = frame.drop(removals)
+    counts = {"updated": len(updated), "inserted": len(inserted), "removed": len(removals),
+              "unchanged": int(same.sum())}
+    return frame, counts
+
+def _frame_to_columns(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    type_lookup = {name: code for code, name in enumerate(PROPERTY_TYPES)}
+    columns = {
+        "building_id": np.array(frame.index.astype(str), dtype=np.str_),
+        "type_codes": np.array([type_lookup[t] for t in frame["property_type"]], dtype=np.int8),
+    }
+    for name in FLOAT_COLUMNS:
+        columns[name] = frame[name].to_numpy(dtype=np.float64)
+    columns["use_codes"] = _encode_uses(frame[USE_TYPE_COLUMNS].to_numpy(dtype=object))
+    columns["use_gfa"] = frame[USE_GFA_COLUMNS].to_numpy(dtype=np.float64)
+    columns[YEAR_COLUMN] = frame[YEAR_COLUMN].to_numpy(dtype=np.int16)
+    return columns
+
+def sync_snapshot(directory: Path = None, datasets=None, full: bool = False, workers: int = 4,
+                  page_size: Optional[int] = None) -> Dict:
+    """
+    Incrementally brings the snapshot up to date with every configured LL84 dataset.
+    Each dataset keeps an :updated_at high-water mark in meta.json; only rows modified
+    since then are fetched, normalized and upserted (a dataset without a mark, or
+    full=True, is pulled completely). A new snapshot version is written only if some
+    row actually changed. Readers pick it up via get_snapshot(), and the derived
+    structures follow: the peer index patches just the changed cohorts and cached
+    results are keyed by snapshot version.
+    Deleted source rows are not detected; run `build` occasionally for a clean copy.
+    """
+    from src.ingestor import DEFAULT_PAGE_SIZE, UPDATED_AT_FIELD, iter_dataset_changes, load_datasets
+    from src.normalizer import normalize_building_frame
+
+    directory = Path(directory or SNAPSHOT_DIR)
+    datasets = sorted(datasets or load_datasets(), key=lambda d: d.reporting_year)
+    start = time.perf_counter()
+
+    # 1. Current rows and per-dataset watermarks
+    frame, meta = _load_frame(directory)
+    if full:
+        frame = frame.iloc[0:0]
+    state: Dict[str, Dict] = {} if full else dict(meta.get("datasets", {}))
+
+    # 2. Pull each dataset's changes, oldest reporting year first
+    report = {}
+    changed = 0
+    for dataset in datasets:
+        previous = state.get(dataset.id, {})
+        since = previous.get("watermark")
+        accepted, removed_ids, fetched, watermark = [], [], 0, since
+        for page in iter_dataset_changes(dataset, since, page_size=page_size or DEFAULT_PAGE_SIZE, workers=workers):
+            fetched += len(page)
+            stamps = [r[UPDATED_AT_FIELD] for r in page if r.get(UPDATED_AT_FIELD)]
+            if stamps:
+                watermark = max(stamps + ([watermark] if watermark else []))
+            buildings, rejected = normalize_building_frame(page)
+            accepted.append(buildings)
+            removed_ids.extend(rejected["building_id"].dropna().astype(str))
+
+        frame, counts = _apply_changes(frame, accepted, removed_ids, dataset.reporting_year)
+        changed += counts["updated"] + counts["inserted"] + counts["removed"]
+        state[dataset.id] = {
+            "reporting_year": dataset.reporting_year,
+            "watermark": watermark,
+            "synced_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        report[dataset.id] = {"fetched": fetched, **counts, "watermark": watermark}
+        logger.info(f"Dataset {dataset.id} ({dataset.reporting_year}): fetched {fetched}, {counts}")
+
+    # 3. Write a new version only when rows changed; otherwise just advance the watermarks
+    source = ",".join(d.id for d in datasets)
+    if changed or full or not (directory / META_FILE).exists():
+        meta = write_columns(_frame_to_columns(frame), directory, source=source, datasets=state)
+    else:
+        meta = dict(meta, datasets=state)
+        partial = directory / (META_FILE + ".partial")
+        with open(partial, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(partial, directory / META_FILE)
+    return {"version": meta["version"], "rows": meta["rows"], "changed": changed,
+            "seconds": round(time.perf_counter() - start, 3), "datasets": report}
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build or refresh the local LL84 building snapshot.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Fetch, normalize and write a new snapshot (replaces any existing one)")
+    build.add_argument("--dir", type=Path, default=None, help=f"Snapshot directory (default: {SNAPSHOT_DIR})")
+    build.add_argument("--limit", type=int, default=None, help="Maximum records to ingest (default: all)")
+    build.add_argument("--workers", type=int, default=4, help="Concurrent page fetches")
+    sync = sub.add_parser("sync", help="Pull only rows changed since the last sync from every configured dataset")
+    sync.add_argument("--dir", type=Path, default=None)
+    sync.add_argument("--full", action="store_true", help="Ignore watermarks and re-pull every dataset")
+    sync.add_argument("--workers", type=int, default=4, help="Concurrent page fetches")
+    info = sub.add_parser("info", help="Show metadata of the current snapshot")
+    info.add_argument("--dir", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        meta = build_snapshot(args.dir, limit=args.limit, workers=args.workers)
+        print(f"Wrote snapshot {meta['version']} with {meta['rows']} buildings")
+    elif args.command == "sync":
+        result = sync_snapshot(args.dir, full=args.full, workers=args.workers)
+        print(f"Snapshot {result['version']}: {result['rows']} buildings, {result['changed']} changed in {result['seconds']}s")
+        for dataset_id, counts in result["datasets"].items():
+            print(f"  {dataset_id}: {counts}")
+    else:
+        store = get_snapshot(args.dir)
+        if store is None:
+            print("No snapshot found.")
+        else:
+            print(json.dumps(store.meta, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# Grid cell edge (meters). Close to a typical query radius so a lookup touches ~9 cells.
+DEFAULT_CELL_METERS = 250.0
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in meters."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class SpatialIndex:
+    """
+    Uniform grid over building coordinates.
+    Points are projected to local meters (equirectangular around the dataset's mean
+    latitude, accurate to well under 1% across a city), bucketed into square cells and
+    stored sorted by cell key, so each row of cells is one contiguous slice found with
+    two binary searches. Final distances are exact haversine.
+    Rows without coordinates are left out; query results are row numbers of the input.
+    """
+
+    def __init__(self, latitude: np.ndarray, longitude: np.ndarray, cell_meters: float = DEFAULT_CELL_METERS):
+        lat = np.asarray(latitude, dtype=np.float64)
+        lon = np.asarray(longitude, dtype=np.float64)
+        located = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        self.cell_meters = cell_meters
+        self.size = len(located)
+
+        self._lat0 = float(lat[located].mean()) if self.size else 0.0
+        x, y = self._project(lat[located], lon[located])
+        self._origin = (float(x.min()), float(y.min())) if self.size else (0.0, 0.0)
+        ix, iy = self._cell(x, y)
+        self._width = int(ix.max()) + 1 if self.size else 1
+        self._height = int(iy.max()) + 1 if self.size else 1
+
+        keys = iy * self._width + ix
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._rows = located[order]
+        self._lat = lat[self._rows]
+        self._lon = lon[self._rows]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _project(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        scale = np.pi / 180.0 * EARTH_RADIUS_M
+        return np.asarray(lon) * scale * np.cos(np.radians(self._lat0)), np.asarray(lat) * scale
+
+    def _cell(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        ix = np.floor((np.asarray(x) - self._origin[0]) / self.cell_meters).astype(np.int64)
+        iy = np.floor((np.asarray(y) - self._origin[1]) / self.cell_meters).astype(np.int64)
+        return ix, iy
+
+    def _candidates(self, latitude: float, longitude: float, meters: float) -> np.ndarray:
+        """Positions (into the sorted arrays) of points in cells overlapping the query box."""
+        x, y = self._project(latitude, longitude)
+        # Projected box is slightly generous so points near the edge are never missed
+        reach = meters * 1.01 + 1.0
+        ix0, iy0 = self._cell(x - reach, y - reach)
+        ix1, iy1 = self._cell(x + reach, y + reach)
+        ix0, ix1 = max(int(ix0), 0), min(int(ix1), self._width - 1)
+        iy0, iy1 = max(int(iy0), 0), min(int(iy1), self._height - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.arange(iy0, iy1 + 1, dtype=np.int64) * self._width
+        starts = np.searchsorted(self._keys, rows + ix0, side="left")
+        ends = np.searchsorted(self._keys, rows + ix1, side="right")
+        if len(starts) == 1:
+            return np.arange(starts[0], ends[0])
+        return np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+
+    def within(self, latitude: float, longitude: float, meters: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rows, distances in meters) of points within `meters`, nearest first.
+        """
+        if not self.size:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions = self._candidates(latitude, longitude, meters)
+        distances = haversine_m(latitude, longitude, self._lat[positions], self._lon[positions])
+        keep = distances <= meters
+        positions, distances = positions[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return self._rows[positions[order]], distances[order]
+
+    def nearest(self, latitude: float, longitude: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rows, distances in meters) of the k nearest points, nearest first.
+        Searches a growing radius until k points lie inside it.
+        """
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        extent = self.cell_meters * max(self._width, self._height) * 2
+        x, y = self._project(latitude, longitude)
+        # Distance from the query to the grid, so queries outside it start far enough out
+        gap = max(self._origin[0] - x, x - self._origin[0] - self._width * self.cell_meters,
+                  self._origin[1] - y, y - self._origin[1] - self._height * self.cell_meters, 0.0)
+        meters = self.cell_meters + gap
+        while True:
+            rows, distances = self.within(latitude, longitude, meters)
+            if len(rows) >= k or meters > extent + gap:
+                return rows[:k], distances[:k]
+            meters *= 2
+
+_lock = threading.Lock()
+_indexes: Dict[str, SpatialIndex] = {}
+
+def get_spatial_index(snapshot) -> Optional[SpatialIndex]:
+    """
+    Spatial index over a snapshot's buildings, built once per snapshot version.
+    """
+    if snapshot is None:
+        return None
+    with _lock:
+        index = _indexes.get(snapshot.version)
+        if index is None:
+            index = SpatialIndex(snapshot.columns["latitude"], snapshot.columns["longitude"])
+            # Only the current snapshot's index is worth keeping
+            _indexes.clear()
+            _indexes[snapshot.version] = index
+        return index
@@ -0,0 +1,135 @@
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Tuple
+
+# Rows larger than this are treated as malformed instead of being buffered indefinitely.
+MAX_ROW_BYTES = 1_000_000
+
+class RowError(Exception):
+    """
+    A single uploaded row could not be decoded as JSON.
+    fatal=True means the decoder lost its place in the upload and no further rows follow.
+    """
+    def __init__(self, message: str, fatal: bool = False):
+        super().__init__(message)
+        self.fatal = fatal
+
+_WHITESPACE = " \t\r\n"
+
+def iter_json_rows(chunks: Iterable[bytes]) -> Iterator[Tuple[int, Any]]:
+    """
+    Incrementally decodes an upload that is either a JSON array or NDJSON.
+    Yields (row_index, value) pairs; value is a RowError for rows that failed to decode.
+    Only the current row is buffered, so memory stays flat regardless of upload size.
+
+    NDJSON rows are independent: a malformed or oversized line is reported and
+    decoding resumes at the next newline. A JSON array has no such resync point,
+    so a malformed element ends the array with a fatal RowError.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    mode = None  # "array" or "ndjson", decided from the first non-whitespace character
+    index = 0
+    skipping = False  # NDJSON: discarding the rest of an oversized line
+    array_state = _ArrayState()
+
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        if mode is None:
+            stripped = buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                buffer = ""
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            buffer = stripped[1:] if mode == "array" else stripped
+
+        if mode == "ndjson":
+            if skipping:
+                newline = buffer.find("\n")
+                if newline < 0:
+                    buffer = ""
+                    continue
+                buffer = buffer[newline + 1:]
+                skipping = False
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield index, _decode_line(line)
+                    index += 1
+            if len(buffer) > MAX_ROW_BYTES:
+                yield index, RowError("Row exceeds maximum size")
+                index += 1
+                buffer = ""
+                skipping = True
+        elif not array_state.closed:
+            for value in array_state.feed(buffer):
+                yield index, value
+                index += 1
+            buffer = array_state.remainder
+        else:
+            buffer = ""
+
+    buffer += decoder.decode(b"", final=True)
+    if mode == "ndjson":
+        if buffer.strip() and not skipping:
+            yield index, _decode_line(buffer)
+    elif mode == "array" and not array_state.closed:
+        for value in array_state.feed(buffer, final=True):
+            yield index, value
+            index += 1
+        if not array_state.closed:
+            yield index, RowError("Unexpected end of JSON array", fatal=True)
+
+def _decode_line(line: str) -> Any:
+    if len(line) > MAX_ROW_BYTES:
+        return RowError("Row exceeds maximum size")
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return RowError(f"Invalid JSON: {e.msg}")
+
+class _ArrayState:
+    """Tracks position inside a top-level JSON array across chunk boundaries."""
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.remainder = ""
+        self.closed = False
+        self.expect_value = True
+
+    def feed(self, text: str, final: bool = False):
+        pos = 0
+        n = len(text)
+        while not self.closed:
+            while pos < n and text[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= n:
+                break
+            char = text[pos]
+            if char == "]":
+                self.closed = True
+                pos += 1
+                break
+            if not self.expect_value:
+                if char != ",":
+                    self.closed = True
+                    yield RowError(f"Expected ',' or ']' but found {char!r}", fatal=True)
+                    break
+                pos += 1
+                self.expect_value = True
+                continue
+            try:
+                value, end = self.decoder.raw_decode(text, pos)
+            except json.JSONDecodeError as e:
+                # Usually the element is just split across chunks; wait for more data
+                if final or n - pos > MAX_ROW_BYTES:
+                    self.closed = True
+                    yield RowError(f"Invalid JSON: {e.msg}", fatal=True)
+                break
+            if end >= n and not final and not isinstance(value, (dict, list, str)):
+                # A bare number/literal at the buffer edge may still be incomplete
+                break
+            pos = end
+            self.expect_value = False
+            yield value
+        self.remainder = "" if self.closed else text[pos:]
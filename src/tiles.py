@@ -0,0 +1,89 @@
+import numpy as np
+from typing import Dict, Iterable
+
+# Penalty brackets ($/year) shared by the API and the heatmap:
+# White < $10k | Yellow < $100k | Orange < $1M | Red < $10M | Deep Red >= $10M
+PENALTY_BUCKETS = np.array([10_000, 100_000, 1_000_000, 10_000_000], dtype=np.float64)
+BUCKET_COLORS = np.array([
+    [255, 255, 255, 200],
+    [255, 220, 0, 220],
+    [255, 120, 0, 220],
+    [220, 0, 0, 230],
+    [120, 0, 0, 240],
+], dtype=np.uint8)
+
+# Zoom levels precomputed for the citywide map (slippy-map tiles; z12 cells are ~7km wide in NYC).
+DEFAULT_ZOOMS = (10, 12, 14, 16)
+
+# At or above this zoom the dashboard draws individual buildings instead of cells.
+POINT_ZOOM = 16
+
+# Web Mercator is undefined at the poles.
+MAX_LATITUDE = 85.05112878
+
+def penalty_buckets(penalties: np.ndarray) -> np.ndarray:
+    """Bracket index (0-4) per penalty."""
+    return np.digitize(np.asarray(penalties, dtype=np.float64), PENALTY_BUCKETS)
+
+def penalty_colors(penalties: np.ndarray) -> np.ndarray:
+    """RGBA colors shaped (n, 4) for each penalty."""
+    return BUCKET_COLORS[penalty_buckets(penalties)]
+
+def tile_xy(latitude: np.ndarray, longitude: np.ndarray, zoom: int):
+    """Slippy-map tile column/row containing each point at `zoom`."""
+    n = 2 ** zoom
+    lat = np.radians(np.clip(np.asarray(latitude, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    lon = np.asarray(longitude, dtype=np.float64)
+    x = np.floor((lon + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64)
+
+def tile_bounds(x: np.ndarray, y: np.ndarray, zoom: int) -> Dict[str, np.ndarray]:
+    """South/west/north/east edges (degrees) of tiles."""
+    n = 2 ** zoom
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    def lat(row):
+        return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * row / n))))
+
+    return {"south": lat(y + 1), "west": x / n * 360.0 - 180.0, "north": lat(y), "east": (x + 1) / n * 360.0 - 180.0}
+
+def aggregate_tiles(
+    latitude: np.ndarray, longitude: np.ndarray, penalty: np.ndarray, zoom: int
+) -> Dict[str, np.ndarray]:
+    """
+    Bins buildings into tiles at one zoom level.
+    Buildings without coordinates are skipped. Per tile: building count, count with a
+    penalty, total and max penalty, point centroid and the color bucket of the total.
+    """
+    lat = np.asarray(latitude, dtype=np.float64)
+    lon = np.asarray(longitude, dtype=np.float64)
+    penalty = np.asarray(penalty, dtype=np.float64)
+    located = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon, penalty = lat[located], lon[located], penalty[located]
+
+    x, y = tile_xy(lat, lon, zoom)
+    keys, inverse = np.unique(x * (2 ** zoom) + y, return_inverse=True)
+    count = np.bincount(inverse, minlength=len(keys))
+    total = np.bincount(inverse, weights=penalty, minlength=len(keys))
+    max_penalty = np.zeros(len(keys))
+    np.maximum.at(max_penalty, inverse, penalty)
+
+    return {
+        "x": keys // (2 ** zoom),
+        "y": keys % (2 ** zoom),
+        "count": count,
+        "penalized_count": np.bincount(inverse, weights=penalty > 0, minlength=len(keys)).astype(np.int64),
+        "total_penalty": total,
+        "max_penalty": max_penalty,
+        "latitude": np.bincount(inverse, weights=lat, minlength=len(keys)) / np.maximum(count, 1),
+        "longitude": np.bincount(inverse, weights=lon, minlength=len(keys)) / np.maximum(count, 1),
+        "bucket": penalty_buckets(total),
+    }
+
+def build_tile_pyramid(
+    latitude: np.ndarray, longitude: np.ndarray, penalty: np.ndarray, zooms: Iterable[int] = DEFAULT_ZOOMS
+) -> Dict[int, Dict[str, np.ndarray]]:
+    """aggregate_tiles() for every zoom level in `zooms`."""
+    return {zoom: aggregate_tiles(latitude, longitude, penalty, zoom) for zoom in zooms}
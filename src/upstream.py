@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import httpx
+from typing import Any, Dict, List, Optional
+
+from src.httpcache import async_transport
+from src.ingestor import NYC_DATA_URL
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+DEFAULT_MAX_CONCURRENCY = 8
+
+class UpstreamClient:
+    """
+    Async NYC Open Data client for per-property lookups.
+    - One pooled httpx.AsyncClient with timeouts, shared by all requests.
+    - Single-flight: concurrent lookups of the same property_id share one in-flight fetch.
+    - A semaphore caps concurrent requests to Socrata so bursts don't get us rate-limited.
+    """
+
+    def __init__(
+        self,
+        url: str = NYC_DATA_URL,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.transport = transport
+        # Clients, semaphores and futures belong to one event loop; rebuilt if the loop changes
+        self._loop = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.fetches = 0
+        self.coalesced = 0
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=limits,
+                # The on-disk response cache (src/httpcache.py) when enabled, per event loop
+                transport=self.transport or async_transport(limits=limits),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+
+    async def fetch_property(self, property_id: str) -> List[Dict[str, Any]]:
+        """
+        Returns the raw LL84 records for one property_id (empty list if not found).
+        Raises httpx.HTTPError on timeouts, transport errors and non-2xx responses.
+        """
+        self._bind_loop()
+        inflight = self._inflight.get(property_id)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        task = asyncio.ensure_future(self._fetch(property_id))
+        self._inflight[property_id] = task
+        task.add_done_callback(lambda done: self._forget(property_id, done))
+        # Shielded so one cancelled caller doesn't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def _forget(self, property_id: str, task: asyncio.Future):
+        if self._inflight.get(property_id) is task:
+            del self._inflight[property_id]
+
+    async def _fetch(self, property_id: str) -> List[Dict[str, Any]]:
+        async with self._semaphore:
+            self.fetches += 1
+            response = await self._client.get(self.url, params={"property_id": property_id, "$limit": 1})
+            response.raise_for_status()
+            return response.json()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
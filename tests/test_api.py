@@ -1,7 +1,10 @@
+import json
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
-from src.main import app
+import httpx
+from unittest.mock import patch, MagicMock, AsyncMock
+from src.main import app, get_building_analysis, RESULT_CACHE
 from src.models import Building
+from src.streaming import iter_json_rows
 
 client = TestClient(app)
 
@@ -20,7 +23,7 @@ def test_analyze_building():
         "property_type": "Office"
     }
     
-    response = client.post("/analyze", json=payload)
+    response = client.post("/analyze", json=payload, params={"explain": "true"})
     assert response.status_code == 200
     data = response.json()
     assert data["building_id"] == "test_1"
@@ -29,19 +32,18 @@ def test_analyze_building():
     assert "explainability" in data
     assert len(data["explainability"]) > 0
 
-@patch("src.main.requests.get")
-def test_get_building_analysis_found(mock_get):
+RAW_OFFICE_RECORD = {
+    "property_id": "12345",
+    "property_gfa_self_reported": "10000",
+    "natural_gas_use_therms": "5000",
+    "electricity_use_grid_purchase_kwh": "20000",
+    "primary_property_type_self_selected": "Office"
+}
+
+@patch("src.main.UPSTREAM.fetch_property", new_callable=AsyncMock)
+def test_get_building_analysis_found(mock_fetch):
     # Mock NYC Open Data response
-    mock_response = MagicMock()
-    mock_response.json.return_value = [{
-        "property_id": "12345",
-        "property_gfa_self_reported": "10000",
-        "natural_gas_use_therms": "5000",
-        "electricity_use_grid_purchase_kwh": "20000",
-        "primary_property_type_self_selected": "Office"
-    }]
-    mock_response.raise_for_status.return_value = None
-    mock_get.return_value = mock_response
+    mock_fetch.return_value = [RAW_OFFICE_RECORD]
 
     response = client.get("/building/12345")
     assert response.status_code == 200
@@ -49,12 +51,158 @@ def test_get_building_analysis_found(mock_get):
     assert data["building_id"] == "12345"
     assert data["roi_analysis"]["annual_savings"] != 0
 
+@patch("src.main.UPSTREAM.fetch_property", new_callable=AsyncMock)
+def test_get_building_analysis_not_found(mock_fetch):
+    mock_fetch.return_value = []
+
+    response = client.get("/building/99999")
+    assert response.status_code == 404
+
+@patch("src.main.UPSTREAM.fetch_property", new_callable=AsyncMock)
+def test_get_building_analysis_upstream_timeout(mock_fetch):
+    mock_fetch.side_effect = httpx.ReadTimeout("slow")
+
+    response = client.get("/building/77777")
+    assert response.status_code == 504
+
 @patch("src.main.requests.get")
-def test_get_building_analysis_not_found(mock_get):
+def test_get_building_analysis_sync_uses_timeout(mock_get):
+    RESULT_CACHE.invalidate()
     mock_response = MagicMock()
-    mock_response.json.return_value = []
+    mock_response.json.return_value = [dict(RAW_OFFICE_RECORD, property_id="12346")]
     mock_response.raise_for_status.return_value = None
     mock_get.return_value = mock_response
 
-    response = client.get("/building/99999")
-    assert response.status_code == 404
+    result = get_building_analysis("12346")
+    assert result.building_id == "12346"
+    assert mock_get.call_args.kwargs["timeout"] > 0
+
+def _office(building_id, **overrides):
+    payload = {
+        "building_id": building_id,
+        "gross_sq_ft": 50000.0,
+        "annual_gas_usage_therms": 50000.0,
+        "annual_elec_usage_kwh": 500000.0,
+        "property_type": "Office"
+    }
+    payload.update(overrides)
+    return payload
+
+def _ndjson(response):
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return lines[:-1], lines[-1]["summary"]
+
+def test_analyze_batch_json_array():
+    payload = [_office("a"), _office("b", property_type="Hotel")]
+    response = client.post("/analyze/batch", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines, summary = _ndjson(response)
+    assert [line["index"] for line in lines] == [0, 1]
+    assert [line["building_id"] for line in lines] == ["a", "b"]
+    lines[0].pop("index")
+    # Batch lines use the compact encoding (no null fields)
+    assert lines[0] == client.post("/analyze", json=payload[0], params={"compact": "true"}).json()
+    assert summary == {"rows": 2, "succeeded": 2, "failed": 0, "complete": True}
+
+def test_analyze_batch_empty_body():
+    response = client.post("/analyze/batch", content=b"")
+    assert response.status_code == 200
+    lines, summary = _ndjson(response)
+    assert lines == []
+    assert summary["rows"] == 0
+
+def test_analyze_batch_ndjson_reports_invalid_rows_inline():
+    body = "\n".join([
+        json.dumps(_office("ok_1")),
+        json.dumps(_office("bad_type", property_type="Castle")),
+        "{not json",
+        "",
+        json.dumps(_office("ok_2")),
+    ])
+    response = client.post("/analyze/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    lines, summary = _ndjson(response)
+    assert len(lines) == 4
+    assert lines[0]["index"] == 0 and lines[0]["building_id"] == "ok_1" and "error" not in lines[0]
+    assert lines[1]["index"] == 1 and lines[1]["building_id"] == "bad_type" and "property_type" in lines[1]["error"]
+    assert lines[2]["index"] == 2 and "Invalid JSON" in lines[2]["error"]
+    assert lines[3]["index"] == 3 and lines[3]["building_id"] == "ok_2"
+    assert summary == {"rows": 4, "succeeded": 2, "failed": 2, "complete": True}
+
+def test_analyze_batch_ndjson_oversized_row_mid_upload(monkeypatch):
+    monkeypatch.setattr("src.streaming.MAX_ROW_BYTES", 1_000)
+    rows = [json.dumps(_office(f"b{i}")) for i in range(500)]
+    rows[250] = json.dumps(_office("huge", notes="x" * 5_000))
+    rows[251] = "{broken"
+    response = client.post("/analyze/batch", content="\n".join(rows))
+    lines, summary = _ndjson(response)
+    assert len(lines) == 500
+    assert lines[250]["index"] == 250 and "maximum size" in lines[250]["error"]
+    assert lines[251]["index"] == 251 and "Invalid JSON" in lines[251]["error"]
+    assert [line["building_id"] for line in lines[252:]] == [f"b{i}" for i in range(252, 500)]
+    assert summary == {"rows": 500, "succeeded": 498, "failed": 2, "complete": True}
+
+def test_analyze_batch_array_stops_at_malformed_element():
+    # A JSON array has no resync point: rows after a malformed element are not read
+    body = "[" + json.dumps(_office("a")) + ", {bad}, " + json.dumps(_office("b")) + "]"
+    response = client.post("/analyze/batch", content=body)
+    lines, summary = _ndjson(response)
+    assert [line["index"] for line in lines] == [0, 1]
+    assert "Invalid JSON" in lines[1]["error"]
+    assert summary == {"rows": 2, "succeeded": 1, "failed": 1, "complete": False}
+
+def test_iter_json_rows_handles_chunk_boundaries():
+    body = json.dumps([_office("x"), 5, _office("y")]).encode()
+    chunks = (body[i:i + 7] for i in range(0, len(body), 7))
+    rows = list(iter_json_rows(chunks))
+    assert [i for i, _ in rows] == [0, 1, 2]
+    assert rows[0][1]["building_id"] == "x"
+    assert rows[1][1] == 5
+    assert rows[2][1]["building_id"] == "y"
+
+def test_penalty_trajectory():
+    payload = {"buildings": [_office("a"), _office("b", annual_gas_usage_therms=0.0)], "start_year": 2023, "end_year": 2050}
+    response = client.post("/penalties/trajectory", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["years"][0] == 2023 and data["years"][-1] == 2050
+    assert data["building_ids"] == ["a", "b"]
+    assert len(data["penalties"]) == 2 and len(data["penalties"][0]) == 28
+    assert data["penalties"][0][0] == 0.0                   # before 2024
+    assert data["penalties"][0][7] == client.post("/analyze", json=_office("a")).json()["penalties"]["2030"]
+    assert data["portfolio_totals"][7] == round(data["penalties"][0][7] + data["penalties"][1][7], 2)
+
+def test_penalty_trajectory_rejects_inverted_range():
+    response = client.post("/penalties/trajectory", json={"buildings": [], "start_year": 2040, "end_year": 2030})
+    assert response.status_code == 422
+
+def test_analyze_trace_is_opt_in():
+    payload = _office("explain_1")
+    plain = client.post("/analyze", json=payload).json()
+    assert plain["explainability"] is None and plain["trace"] is None
+
+    explained = client.post("/analyze", json=payload, params={"explain": "true"}).json()
+    codes = [step["code"] for step in explained["trace"]]
+    assert codes[:2] == ["building", "inputs"]
+    assert explained["trace"][1]["units"]["gross_sq_ft"] == "sqft"
+    assert len(explained["explainability"]) == len(explained["trace"])
+    assert explained["explainability"][0] == "Analyzed Building explain_1 (Office)."
+
+    steps_only = client.post("/analyze", json=payload, params={"explain": "true", "render": "false"}).json()
+    assert steps_only["explainability"] is None and steps_only["trace"] == explained["trace"]
+
+def test_analyze_compact_mode():
+    payload = _office("compact_1")
+    verbose = client.post("/analyze", json=payload)
+    compact = client.post("/analyze", json=payload, params={"compact": "true"})
+    assert compact.status_code == 200
+    assert len(compact.content) < len(verbose.content)
+    body = compact.json()
+    assert "explainability" not in body
+    assert body["penalties"] == verbose.json()["penalties"]
+
+def test_analyze_msgpack_requires_package(monkeypatch):
+    monkeypatch.setattr("src.main.msgpack", None)
+    response = client.post("/analyze", json=_office("mp"), headers={"Accept": "application/msgpack"})
+    assert response.status_code == 406
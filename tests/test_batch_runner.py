@@ -0,0 +1,86 @@
+import json
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from benchmarks.synthetic import generate_raw_records
+from src.batch_runner import MANIFEST_FILE, iter_shards, load_manifest, run_batch, save_manifest
+from src.engine.rules import get_rules
+from src.export import EXPORT_COLUMNS, analyze_frame
+from src.normalizer import normalize_building_frame
+
+RECORDS = generate_raw_records(3_500, seed=21)
+
+class _FakeSocrata:
+    """Stands in for iter_nyc_data, honouring paging, offset and max_records."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, page_size=1000, max_records=None, workers=4, chunked=False, start_offset=0, **kwargs):
+        self.calls.append({"start_offset": start_offset, "max_records": max_records})
+        end = len(RECORDS) if max_records is None else min(len(RECORDS), start_offset + max_records)
+        for offset in range(start_offset, end, page_size):
+            yield RECORDS[offset:min(offset + page_size, end)]
+
+@pytest.fixture
+def fake_socrata():
+    fake = _FakeSocrata()
+    with patch("src.batch_runner.iter_nyc_data", fake):
+        yield fake
+
+def _read_all(directory) -> pd.DataFrame:
+    files = sorted(directory.glob("shard-*.csv"))
+    return pd.concat([pd.read_csv(f, dtype={"building_id": str}) for f in files], ignore_index=True)
+
+def test_iter_shards_regroups_pages():
+    pages = [list(range(0, 300)), list(range(300, 700)), list(range(700, 750))]
+    shards = list(iter_shards(pages, 250, first_index=4))
+    assert [(i, len(r)) for i, r in shards] == [(4, 250), (5, 250), (6, 250)]
+    assert shards[-1][1][-1] == 749
+
+def test_run_writes_every_shard_and_matches_engine(tmp_path, fake_socrata):
+    report = run_batch(tmp_path, fmt="csv", shard_size=1000, processes=2, page_size=300)
+    assert report.complete and report.completed == [0, 1, 2, 3] and report.skipped == []
+    assert sum(s.rows for s in report.workers.values()) == report.rows
+    assert all(s.rows_per_sec > 0 for s in report.workers.values())
+
+    manifest = load_manifest(tmp_path)
+    assert manifest["complete"] and manifest["total_shards"] == 4
+    assert sum(s["input_records"] for s in manifest["shards"].values()) == len(RECORDS)
+
+    exported = _read_all(tmp_path)
+    buildings, _ = normalize_building_frame(RECORDS)
+    expected = analyze_frame(buildings, get_rules())
+    assert list(exported.columns) == EXPORT_COLUMNS
+    assert exported["building_id"].tolist() == expected["building_id"].tolist()
+    pd.testing.assert_series_equal(exported["npv"], expected["npv"], check_names=False)
+
+def test_resume_skips_finished_shards(tmp_path, fake_socrata):
+    run_batch(tmp_path, fmt="csv", shard_size=1000, processes=2)
+    # Simulate a run interrupted before shards 1 and 3 finished
+    manifest = load_manifest(tmp_path)
+    for index in ("1", "3"):
+        (tmp_path / manifest["shards"].pop(index)["file"]).unlink()
+    manifest["complete"] = False
+    save_manifest(tmp_path, manifest)
+
+    report = run_batch(tmp_path, fmt="csv", shard_size=1000, processes=2)
+    assert report.completed == [1, 3] and report.skipped == [0, 2]
+    # Fetching restarts at the first unfinished shard, not at the beginning
+    assert fake_socrata.calls[-1]["start_offset"] == 1000
+    assert len(_read_all(tmp_path)) == len(normalize_building_frame(RECORDS)[0])
+
+    again = run_batch(tmp_path, fmt="csv", shard_size=1000, processes=2)
+    assert again.completed == [] and again.skipped == [0, 1, 2, 3]
+    assert len(fake_socrata.calls) == 2
+
+def test_limit_and_settings_mismatch(tmp_path, fake_socrata):
+    report = run_batch(tmp_path, fmt="csv", shard_size=1000, processes=1, max_records=1_500)
+    assert report.completed == [0, 1]
+    assert json.loads((tmp_path / MANIFEST_FILE).read_text())["shards"]["1"]["input_records"] == 500
+
+    with pytest.raises(ValueError):
+        run_batch(tmp_path, fmt="csv", shard_size=500, processes=1, max_records=1_500)
+    report = run_batch(tmp_path, fmt="csv", shard_size=500, processes=1, max_records=1_500, restart=True)
+    assert report.completed == [0, 1, 2]
+    assert not (tmp_path / "shard-00003.csv").exists()
@@ -0,0 +1,28 @@
+from benchmarks.run import compare, parse_size, run_benchmarks
+from benchmarks.synthetic import generate_raw_records
+from src.normalizer import normalize_building_data, normalize_building_frame
+
+def test_generator_is_seeded_and_messy():
+    records = generate_raw_records(2000, seed=1)
+    assert records == generate_raw_records(2000, seed=1)
+    assert records != generate_raw_records(2000, seed=2)
+    values = [v for r in records for v in r.values()]
+    assert "Not Available" in values
+    assert any("natural_gas_use_kbtu" in r for r in records)
+    assert any("natural_gas_use_therms" in r for r in records)
+    # Both normalizers accept the data and agree on what survives
+    frame, rejected = normalize_building_frame(records)
+    assert len(frame) == len(normalize_building_data(records)) > 1900
+    assert set(rejected["reason"]) >= {"missing_gfa", "implausible_eui"}
+
+def test_smoke_run_and_regression_check():
+    results = run_benchmarks([200], ["normalize_frame", "penalty_batch"], memory=True)
+    assert set(results) == {"normalize_frame@200", "penalty_batch@200"}
+    assert all(r["rows_per_sec"] > 0 and "peak_mb" in r for r in results.values())
+
+    assert compare(results, results) == []
+    faster = {k: dict(v, rows_per_sec=v["rows_per_sec"] * 10) for k, v in results.items()}
+    assert len(compare(results, faster, threshold=0.3)) == 2
+
+def test_parse_size():
+    assert [parse_size(s) for s in ["1k", "100k", "1M", "2500"]] == [1_000, 100_000, 1_000_000, 2_500]
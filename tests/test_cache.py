@@ -0,0 +1,80 @@
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from src.cache import ResultCache, config_fingerprint
+from src.engine.rules import get_rules
+from src.main import app, RESULT_CACHE
+
+client = TestClient(app)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_lru_eviction_and_counters():
+    cache = ResultCache(maxsize=2, fingerprint=lambda: "v1")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1   # "a" is now most recently used
+    cache.set("c", 3)            # evicts "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (2, 1, 1, 2)
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = ResultCache(ttl_seconds=10, fingerprint=lambda: "v1", clock=clock)
+    cache.set("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_config_change_never_serves_stale_results():
+    version = {"value": "v1"}
+    cache = ResultCache(fingerprint=lambda: version["value"])
+    cache.set("a", "computed under v1")
+    version["value"] = "v2"
+    assert cache.get("a") is None
+
+def test_invalidate():
+    cache = ResultCache(fingerprint=lambda: "v1")
+    cache.set(("analyze", "1"), 1)
+    cache.set(("analyze", "2"), 2)
+    assert cache.invalidate(lambda key: key[1] == "1") == 1
+    assert cache.get(("analyze", "2")) == 2
+    assert cache.invalidate() == 1
+
+def test_config_fingerprint_is_rule_version():
+    assert config_fingerprint() == get_rules().version
+
+def test_explicit_version_overrides_fingerprint():
+    cache = ResultCache(fingerprint=lambda: "v2")
+    cache.set("a", 1, version="v1")
+    assert cache.get("a") is None
+    assert cache.get("a", version="v1") == 1
+
+@patch("src.main.UPSTREAM.fetch_property", new_callable=AsyncMock)
+def test_building_lookup_is_cached(mock_get):
+    RESULT_CACHE.invalidate()
+    mock_get.return_value = [{
+        "property_id": "55555",
+        "property_gfa_self_reported": "10000",
+        "natural_gas_use_therms": "5000",
+        "electricity_use_grid_purchase_kwh": "20000",
+        "primary_property_type_self_selected": "Office"
+    }]
+
+    first = client.get("/building/55555").json()
+    second = client.get("/building/55555").json()
+    assert first == second
+    assert mock_get.call_count == 1
+
+    assert client.delete("/cache", params={"building_id": "55555"}).json()["invalidated"] >= 1
+    client.get("/building/55555")
+    assert mock_get.call_count == 2
+    assert client.get("/cache/stats").json()["hits"] >= 1
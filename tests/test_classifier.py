@@ -0,0 +1,142 @@
+import logging
+import numpy as np
+import pytest
+from src.classifier import classify_property_type, compile_classifier
+from src.engine.batch import buildings_to_columns, calculate_penalties_batch, calculate_penalty_matrix, calculate_roi_batch
+from src.engine.penalty import calculate_penalty, limit_factor
+from src.engine.roi import calculate_roi
+from src.engine.rules import get_rules
+from src.export import analyze_frame
+from src.models import Building, PROPERTY_TYPES
+from src.normalizer import frame_to_buildings, normalize_building_data, normalize_building_frame
+from src.snapshot import SnapshotStore, write_snapshot
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Office", "Office"),
+    ("Financial Office", "Office"),
+    ("Medical Office", "Office"),
+    ("Multifamily Housing", "Multifamily"),
+    ("Residence Hall/Dormitory", "Multifamily"),
+    ("Supermarket/Grocery Store", "Store"),
+    ("Non-Refrigerated Warehouse", "Industrial"),
+    ("Hospital (General Medical & Surgical)", "Healthcare"),
+    ("K-12 School", "Education"),
+    ("College/University", "Education"),
+    ("Worship Facility", "Assembly"),
+    ("Self-Storage Facility", "Storage"),
+    ("Parking", "Storage"),
+    ("Senior Living Community", "Institutional"),
+    ("Data Center", "Office"),
+])
+def test_classifier_table(raw, expected):
+    assert classify_property_type(raw) == expected
+
+def test_unmapped_types_are_logged_once(caplog):
+    classify_property_type.cache_clear()
+    with caplog.at_level(logging.WARNING, logger="src.classifier"):
+        assert classify_property_type("Other - Specialty Hospital Annex Zone") == "Healthcare"
+        assert classify_property_type("Mixed Use Property") == "Office"
+        assert classify_property_type("Mixed Use Property") == "Office"
+    assert [r.getMessage() for r in caplog.records] == ["Unmapped property type 'Mixed Use Property'; using Office limits"]
+    assert classify_property_type.cache_info().hits == 1
+
+def test_classifier_rejects_unknown_types(tmp_path):
+    path = tmp_path / "property_types.yaml"
+    path.write_text("default: Office\ncategories:\n  - type: Laboratory\n    keywords: [lab]\n")
+    with pytest.raises(ValueError, match="Laboratory"):
+        compile_classifier(path)
+
+# --- Mixed use ---
+MIXED_RECORDS = [
+    # Apartments over retail, with parking; uses cover the whole building
+    {"property_id": "1", "property_gfa_self_reported": "100000", "primary_property_type_self_selected": "Multifamily Housing",
+     "natural_gas_use_therms": "60000", "electricity_use_grid_purchase_kwh": "900000",
+     "largest_property_use_type": "Multifamily Housing", "largest_property_use_type_gross_floor_area": "70000",
+     "2nd_largest_property_use_type": "Retail Store", "2nd_largest_property_use_type_gross_floor_area": "20000",
+     "3rd_largest_property_use_type": "Parking", "3rd_largest_property_use_type_gross_floor_area": "10000"},
+    # Truncated Socrata field names; two uses map to Office and are summed; 10% uncovered
+    {"property_id": "2", "property_gfa_self_reported": "50000", "primary_property_type_self_selected": "Office",
+     "natural_gas_use_therms": "30000", "electricity_use_grid_purchase_kwh": "700000",
+     "largest_property_use_type": "Office", "largest_property_use_type_1": "25000",
+     "_2nd_largest_property_use": "K-12 School", "_2nd_largest_property_use_1": "15000",
+     "_3rd_largest_property_use": "Bank Branch", "_3rd_largest_property_use_1": "5000"},
+    # Only uses of the building's own type: not mixed-use
+    {"property_id": "3", "property_gfa_self_reported": "40000", "primary_property_type_self_selected": "Hotel",
+     "largest_property_use_type": "Hotel", "largest_property_use_type_gross_floor_area": "40000"},
+    # Placeholders and zero areas are ignored
+    {"property_id": "4", "property_gfa_self_reported": "30000", "primary_property_type_self_selected": "Office",
+     "natural_gas_use_therms": "9000", "largest_property_use_type": "Office", "largest_property_use_type_gross_floor_area": "20000",
+     "2nd_largest_property_use_type": "Not Available", "2nd_largest_property_use_type_gross_floor_area": "5000",
+     "3rd_largest_property_use_type": "Worship Facility", "3rd_largest_property_use_type_gross_floor_area": "0"},
+]
+
+def test_use_mix_extraction():
+    buildings = normalize_building_data(MIXED_RECORDS)
+    assert buildings[0].use_mix == {"Multifamily": 70000.0, "Store": 20000.0, "Storage": 10000.0}
+    assert buildings[1].use_mix == {"Office": 30000.0, "Education": 15000.0}
+    assert buildings[2].use_mix is None and buildings[3].use_mix is None
+
+    frame, _ = normalize_building_frame(MIXED_RECORDS)
+    assert frame_to_buildings(frame) == buildings
+    assert frame.loc[1, "use_type_3"] is None and frame.loc[1, "use_gfa_1"] == 30000.0
+
+def test_area_weighted_limit():
+    rules = get_rules()
+    apartments, offices = normalize_building_data(MIXED_RECORDS)[:2]
+    expected = (70000 * 6.75 + 20000 * 11.81 + 10000 * 4.26) / 100000
+    assert limit_factor(apartments, 2024, rules) == pytest.approx(expected)
+    # The 5,000 sq ft no use covers is weighted at the building's own type
+    expected = (30000 * 8.46 + 15000 * 7.58 + 5000 * 8.46) / 50000
+    assert limit_factor(offices, 2024, rules) == pytest.approx(expected)
+    assert limit_factor(apartments, 2023, rules) is None
+
+def _random_mixed_buildings(n=1500, seed=11):
+    rng = np.random.default_rng(seed)
+    buildings = []
+    for i in range(n):
+        sqft = float(rng.uniform(5_000, 400_000))
+        uses = rng.choice(PROPERTY_TYPES, size=int(rng.integers(0, 4)), replace=False)
+        shares = rng.dirichlet(np.ones(len(uses))) * rng.uniform(0.7, 1.2) if len(uses) else []
+        buildings.append(Building(
+            building_id=str(i),
+            gross_sq_ft=sqft,
+            annual_gas_usage_therms=float(rng.uniform(0, 300_000)),
+            annual_elec_usage_kwh=float(rng.uniform(0, 8_000_000)),
+            property_type=str(rng.choice(PROPERTY_TYPES)),
+            use_mix={str(t): float(s * sqft) for t, s in zip(uses, shares)} or None,
+        ))
+    return buildings
+
+def test_mixed_use_batch_matches_scalar():
+    buildings = _random_mixed_buildings()
+    cols = buildings_to_columns(buildings)
+    assert cols["use_mix"] is not None and 0 < len(cols["use_mix"].rows) < len(buildings)
+    args = (cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"], cols["type_codes"])
+
+    years = [2024, 2030, 2035, 2040]
+    matrix = calculate_penalty_matrix(*args, years, mix=cols["use_mix"])
+    for j, year in enumerate(years):
+        scalar = [calculate_penalty(b, year) for b in buildings]
+        assert calculate_penalties_batch(*args, year, mix=cols["use_mix"]).tolist() == scalar
+        assert matrix[:, j].tolist() == scalar
+
+    batch = calculate_roi_batch(*args, mix=cols["use_mix"])
+    for i, b in enumerate(buildings[:300]):
+        assert {k: v[i] for k, v in batch.items()} == calculate_roi(b)
+
+def test_mixed_use_export_and_snapshot(tmp_path):
+    frame, _ = normalize_building_frame(MIXED_RECORDS)
+    buildings = frame_to_buildings(frame)
+    exported = analyze_frame(frame, get_rules())
+    assert exported["penalty_2030"].tolist() == [calculate_penalty(b, 2030) for b in buildings]
+
+    write_snapshot(buildings, tmp_path / "snap")
+    store = SnapshotStore.load(tmp_path / "snap")
+    assert [store.get(b.building_id) for b in buildings] == buildings
+    mix = store.use_mix()
+    assert mix.rows.tolist() == [0, 1]
+    penalties = calculate_penalties_batch(
+        store.columns["gross_sq_ft"], store.columns["annual_gas_usage_therms"],
+        store.columns["annual_elec_usage_kwh"], store.columns["type_codes"], 2030, mix=mix,
+    )
+    assert penalties.tolist() == exported["penalty_2030"].tolist()
@@ -1,7 +1,17 @@
 import pytest
-from src.models import Building
+import numpy as np
+from src.models import Building, PROPERTY_TYPES
 from src.engine.penalty import calculate_penalty, calculate_emissions
 from src.engine.roi import calculate_roi
+from src.engine.batch import (
+    buildings_to_columns,
+    calculate_penalties_batch,
+    calculate_penalty_matrix,
+    calculate_roi_batch,
+    encode_property_types,
+    round_half_even,
+    _near_half,
+)
 
 # Mock Building: High Emissions (Old Boiler)
 # 50,000 sqft Office
@@ -61,3 +71,69 @@ def test_calculate_roi(dirty_building):
     assert roi["simple_payback_years"] > 0
     # NPV might be negative if retrofit cost is huge, but check it returns a number
     assert isinstance(roi["npv"], float)
+
+# --- Batch Engine Tests ---
+def _random_buildings(n=2000, seed=7):
+    rng = np.random.default_rng(seed)
+    return [
+        Building(
+            building_id=str(i),
+            gross_sq_ft=float(rng.uniform(1_000, 500_000)),
+            annual_gas_usage_therms=float(rng.choice([0.0, rng.uniform(0, 400_000)])),
+            annual_elec_usage_kwh=float(rng.uniform(0, 10_000_000)),
+            property_type=str(rng.choice(PROPERTY_TYPES)),
+        )
+        for i in range(n)
+    ]
+
+def test_penalties_batch_matches_scalar(dirty_building, clean_building):
+    buildings = _random_buildings() + [dirty_building, clean_building]
+    cols = buildings_to_columns(buildings)
+    for year in (2023, 2024, 2029, 2030, 2040):
+        batch = calculate_penalties_batch(
+            cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"], cols["type_codes"], year
+        )
+        assert batch.tolist() == [calculate_penalty(b, year) for b in buildings]
+
+def test_roi_batch_matches_scalar():
+    buildings = _random_buildings()
+    cols = buildings_to_columns(buildings)
+    batch = calculate_roi_batch(
+        cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"], cols["type_codes"]
+    )
+    for i, b in enumerate(buildings):
+        assert {k: v[i] for k, v in batch.items()} == calculate_roi(b)
+
+def test_penalties_batch_unknown_type_is_zero():
+    penalties = calculate_penalties_batch(
+        np.array([50000.0]), np.array([50000.0]), np.array([500000.0]), encode_property_types(["Laboratory"]), 2030
+    )
+    assert penalties.tolist() == [0.0]
+
+def test_round_half_even_matches_builtin():
+    values = np.array([2.675, 0.125, 1.005, 12345.665, -2.675])
+    assert round_half_even(values, 2).tolist() == [round(v, 2) for v in values.tolist()]
+
+def test_round_half_even_large_magnitudes():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([rng.uniform(1e6, 1e7, 30_000), [1_234_567.125, 9_876_543.675]])
+    assert round_half_even(values, 2).tolist() == [round(v, 2) for v in values.tolist()]
+    # Only genuine decimal halves take the per-element fallback
+    assert _near_half(values[:30_000] * 100).sum() < 30
+
+# --- Penalty Trajectory Tests ---
+def test_penalty_uses_later_compliance_periods(dirty_building):
+    assert calculate_penalty(dirty_building, 2035) > calculate_penalty(dirty_building, 2030)
+    assert calculate_penalty(dirty_building, 2034) == calculate_penalty(dirty_building, 2030)
+    assert calculate_penalty(dirty_building, 2049) == calculate_penalty(dirty_building, 2040)
+
+def test_penalty_matrix_matches_scalar(dirty_building, clean_building):
+    buildings = _random_buildings(300) + [dirty_building, clean_building]
+    cols = buildings_to_columns(buildings)
+    years = list(range(2020, 2056))
+    matrix = calculate_penalty_matrix(
+        cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"], cols["type_codes"], years
+    )
+    assert matrix.shape == (len(buildings), len(years))
+    expected = [[calculate_penalty(b, y) for y in years] for b in buildings]
+    assert matrix.tolist() == expected
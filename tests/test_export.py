@@ -0,0 +1,63 @@
+import io
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from benchmarks.synthetic import generate_raw_records
+from src.engine.batch import calculate_roi_batch, encode_property_types
+from src.export import EXPORT_COLUMNS, iter_export_bytes, iter_result_frames
+from src.main import app
+from src.normalizer import normalize_building_frame
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def pages():
+    records = generate_raw_records(2500, seed=8)
+    return [records[i:i + 1000] for i in range(0, len(records), 1000)]
+
+def _read(data: bytes, fmt: str) -> pd.DataFrame:
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(data), dtype={"building_id": str})
+    if fmt == "arrow":
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+    return pq.read_table(io.BytesIO(data)).to_pandas()
+
+@pytest.mark.parametrize("fmt", ["csv", "arrow", "parquet"])
+def test_export_round_trip(pages, fmt):
+    chunks = list(iter_export_bytes(iter_result_frames(pages), fmt, "v-test"))
+    assert len(chunks) > 1
+    exported = _read(b"".join(chunks), fmt)
+
+    expected, _ = normalize_building_frame([r for page in pages for r in page])
+    assert list(exported.columns) == EXPORT_COLUMNS
+    assert exported["building_id"].tolist() == expected["building_id"].tolist()
+    roi = calculate_roi_batch(
+        expected["gross_sq_ft"].to_numpy(), expected["annual_gas_usage_therms"].to_numpy(),
+        expected["annual_elec_usage_kwh"].to_numpy(), encode_property_types(expected["property_type"]),
+    )
+    np.testing.assert_allclose(exported["npv"], roi["npv"])
+
+def test_parquet_has_one_row_group_per_page(pages):
+    data = b"".join(iter_export_bytes(iter_result_frames(pages), "parquet", "v-test"))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.num_row_groups == len(pages)
+    assert parquet.schema_arrow.metadata[b"rule_version"] == b"v-test"
+
+def test_empty_csv_export_has_header():
+    assert b"".join(iter_export_bytes(iter([]), "csv")).decode().strip() == ",".join(EXPORT_COLUMNS)
+
+def test_export_endpoint_streams_pages(pages):
+    with patch("src.ingestor.iter_nyc_data", return_value=iter(pages)) as mock_iter:
+        response = client.get("/export", params={"format": "arrow", "limit": 2500})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert mock_iter.call_args.kwargs["chunked"] is True
+    assert len(_read(response.content, "arrow")) > 2400
+
+def test_export_endpoint_without_pyarrow(monkeypatch):
+    monkeypatch.setattr("src.export.pa", None)
+    assert client.get("/export", params={"format": "parquet"}).status_code == 501
@@ -0,0 +1,122 @@
+import dataclasses
+import numpy as np
+import pytest
+from src.engine.batch import calculate_penalties_batch, calculate_roi_batch
+from src.engine.graph import CalculationGraph
+from src.engine.rules import get_rules
+
+@pytest.fixture
+def columns():
+    rng = np.random.default_rng(20)
+    n = 500
+    return {
+        "gross_sq_ft": rng.uniform(5_000, 300_000, n),
+        "annual_gas_usage_therms": rng.uniform(0, 200_000, n),
+        "annual_elec_usage_kwh": rng.uniform(50_000, 5_000_000, n),
+        "type_codes": rng.integers(-1, 5, n),
+    }
+
+def _batch(columns, rules=None):
+    args = (columns["gross_sq_ft"], columns["annual_gas_usage_therms"], columns["annual_elec_usage_kwh"], columns["type_codes"])
+    roi = calculate_roi_batch(*args, rules=rules)
+    roi["penalty_2024"] = calculate_penalties_batch(*args, 2024, rules)
+    roi["penalty_2030"] = calculate_penalties_batch(*args, 2030, rules)
+    return roi
+
+def _assert_matches_batch(graph, columns, rules=None):
+    results = graph.results()
+    for name, expected in _batch(columns, rules).items():
+        np.testing.assert_array_equal(results[name], expected, err_msg=name)
+
+def _rules_with(**constants):
+    rules = get_rules()
+    return dataclasses.replace(rules, constants={**rules.constants, **constants})
+
+def test_graph_matches_batch_engine(columns):
+    graph = CalculationGraph(columns)
+    _assert_matches_batch(graph, columns)
+    assert graph.last_report.causes == ["initial build"]
+    assert set(graph.last_report.recomputed.values()) == {500}
+
+def test_second_evaluation_reuses_everything(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate()
+    graph.evaluate()
+    assert graph.last_report.recomputed == {}
+    assert "npv" in graph.last_report.reused
+
+def test_electricity_price_change_skips_emissions_and_penalties(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate()
+    graph.set_parameter("ELEC_COST_PER_KWH", 0.30)
+    graph.evaluate()
+    report = graph.last_report
+    assert report.causes == ["ELEC_COST_PER_KWH changed"]
+    assert set(report.recomputed) == {"baseline_energy_cost", "baseline_opex", "new_opex", "annual_savings",
+                                      "simple_payback_years", "npv"}
+    for name in ("emissions", "penalty_2024", "new_penalty_2030", "investment_cost"):
+        assert name in report.reused
+    _assert_matches_batch(graph, columns, _rules_with(ELEC_COST_PER_KWH=0.30))
+
+def test_unchanged_parameter_invalidates_nothing(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate()
+    graph.set_parameter("DISCOUNT_RATE", get_rules().constants["DISCOUNT_RATE"])
+    graph.evaluate()
+    assert graph.last_report.recomputed == {}
+
+def test_one_building_change_recomputes_one_row(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate()
+    graph.update_rows([17], annual_gas_usage_therms=[123_456.0])
+    graph.evaluate()
+    report = graph.last_report
+    assert set(report.recomputed.values()) == {1}
+    assert "gas_emissions" in report.recomputed and "elec_emissions" in report.reused
+    assert "limit_factor_2024" in report.reused and "investment_cost" in report.reused
+
+    columns["annual_gas_usage_therms"][17] = 123_456.0
+    _assert_matches_batch(graph, columns)
+
+def test_property_type_change_only_touches_limits_downstream(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate()
+    row = int(np.flatnonzero(columns["type_codes"] != 2)[0])
+    graph.update_rows([row], type_codes=[2])
+    graph.evaluate()
+    assert "limit_factor_2030" in graph.last_report.recomputed
+    assert "emissions" in graph.last_report.reused
+
+    columns["type_codes"][row] = 2
+    _assert_matches_batch(graph, columns)
+
+def test_rule_table_swap_invalidates_only_changed_constants(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate()
+    rules = _rules_with(PENALTY_RATE_PER_TON=300)
+    graph.set_rules(rules)
+    graph.evaluate()
+    report = graph.last_report
+    assert report.causes == ["PENALTY_RATE_PER_TON changed"]
+    assert "emissions" in report.reused and "penalty_2024" in report.recomputed
+    _assert_matches_batch(graph, columns, rules)
+
+def test_large_row_updates_fall_back_to_full_pass(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate()
+    rows = np.arange(0, 500, 2)
+    graph.update_rows(rows, annual_elec_usage_kwh=columns["annual_elec_usage_kwh"][rows] * 1.1)
+    graph.evaluate(["elec_emissions"])
+    assert graph.last_report.recomputed == {"elec_emissions": 500}
+
+def test_report_renders_and_rejects_unknown_names(columns):
+    graph = CalculationGraph(columns)
+    graph.evaluate(["emissions"])
+    text = str(graph.last_report)
+    assert "recomputed emissions: 500 of 500 rows" in text
+    with pytest.raises(ValueError):
+        graph.set_parameter("NOT_A_CONSTANT", 1.0)
+    with pytest.raises(ValueError):
+        graph.update_rows([0], floors=[3])
+    with pytest.raises(ValueError):
+        graph.evaluate(["nope"])
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+import httpx
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from src.httpcache import CACHE_STATUS_HEADER, CachingAdapter, CachingTransport, HttpCache, cache_key, http_get
+
+class _Origin(BaseHTTPRequestHandler):
+    """Serves a JSON body with an ETag (or Last-Modified for /dated) and honours conditional GETs."""
+    version = "v1"
+    seen = []
+
+    def do_GET(self):
+        type(self).seen.append(dict(self.headers))
+        dated = self.path.startswith("/dated")
+        validator = ("Last-Modified", "Tue, 01 Oct 2024 00:00:00 GMT") if dated else ("ETag", f'"{self.version}"')
+        conditional = self.headers.get("If-Modified-Since" if dated else "If-None-Match")
+        if conditional == validator[1]:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path, "version": self.version}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header(*validator)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def origin():
+    _Origin.version = "v1"
+    _Origin.seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Origin)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+def _session(cache):
+    session = requests.Session()
+    session.mount("http://", CachingAdapter(cache))
+    return session
+
+def test_key_ignores_param_order():
+    assert cache_key("GET", "http://x/r.json?b=2&a=1") == cache_key("get", "http://X/r.json?a=1&b=2")
+    assert cache_key("GET", "http://x/r.json?a=1") != cache_key("GET", "http://x/r.json?a=2")
+
+def test_requests_adapter_revalidates_with_etag(tmp_path, origin):
+    session = _session(HttpCache(tmp_path))
+    first = session.get(f"{origin}/r.json", params={"$limit": 1, "property_id": "7"})
+    assert first.headers[CACHE_STATUS_HEADER] == "MISS"
+
+    second = session.get(f"{origin}/r.json", params={"property_id": "7", "$limit": 1})
+    assert second.headers[CACHE_STATUS_HEADER] == "REVALIDATED"
+    assert second.status_code == 200 and second.json() == first.json()
+    assert _Origin.seen[-1]["If-None-Match"] == '"v1"'
+
+    _Origin.version = "v2"
+    third = session.get(f"{origin}/r.json", params={"property_id": "7", "$limit": 1})
+    assert third.headers[CACHE_STATUS_HEADER] == "MISS" and third.json()["version"] == "v2"
+
+def test_requests_adapter_revalidates_with_last_modified(tmp_path, origin):
+    session = _session(HttpCache(tmp_path))
+    session.get(f"{origin}/dated.json")
+    again = session.get(f"{origin}/dated.json")
+    assert again.headers[CACHE_STATUS_HEADER] == "REVALIDATED"
+    assert _Origin.seen[-1]["If-Modified-Since"] == "Tue, 01 Oct 2024 00:00:00 GMT"
+
+def test_httpx_transport_shares_the_store(tmp_path, origin):
+    cache = HttpCache(tmp_path)
+    _session(cache).get(f"{origin}/r.json", params={"a": "1"})
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=CachingTransport(cache)) as client:
+            return await client.get(f"{origin}/r.json", params={"a": "1"})
+
+    response = asyncio.run(fetch())
+    assert response.headers[CACHE_STATUS_HEADER] == "REVALIDATED"
+    assert response.json()["version"] == "v1"
+
+def test_fresh_entries_skip_the_network(tmp_path, origin):
+    session = _session(HttpCache(tmp_path, max_age_seconds=60))
+    session.get(f"{origin}/r.json")
+    assert session.get(f"{origin}/r.json").headers[CACHE_STATUS_HEADER] == "HIT"
+    assert len(_Origin.seen) == 1
+
+def test_offline_replay_is_strict(tmp_path, origin):
+    _session(HttpCache(tmp_path)).get(f"{origin}/r.json", params={"a": "1"})
+    offline = HttpCache(tmp_path, mode="offline")
+    seen = len(_Origin.seen)
+
+    replayed = _session(offline).get(f"{origin}/r.json", params={"a": "1"})
+    assert replayed.json()["version"] == "v1" and len(_Origin.seen) == seen
+    with pytest.raises(requests.ConnectionError, match="no recorded response"):
+        _session(offline).get(f"{origin}/r.json", params={"a": "2"})
+
+    async def fetch_missing():
+        async with httpx.AsyncClient(transport=CachingTransport(offline)) as client:
+            await client.get(f"{origin}/missing.json")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(fetch_missing())
+
+def test_lru_eviction_keeps_the_store_bounded(tmp_path, origin):
+    clock = iter(range(1000)).__next__
+    cache = HttpCache(tmp_path, max_bytes=800, clock=clock)
+    session = _session(cache)
+    for name in ("a", "b", "c"):
+        session.get(f"{origin}/{name}.json")
+    session.get(f"{origin}/a.json")  # a is now more recent than b
+    session.get(f"{origin}/d.json")
+
+    assert cache.size_bytes() <= 800 and cache.evictions >= 1
+    assert cache.lookup("GET", f"{origin}/b.json") is None
+    assert cache.lookup("GET", f"{origin}/a.json") is not None
+    # A fresh instance rebuilds the same index from disk
+    assert HttpCache(tmp_path, max_bytes=800).size_bytes() == cache.size_bytes()
+
+def test_http_get_is_plain_requests_when_disabled():
+    with patch("src.httpcache.MODE", "off"), patch("src.httpcache.requests.get") as mock_get:
+        http_get("https://example.invalid/r.json", params={"a": 1}, timeout=5)
+    mock_get.assert_called_once_with("https://example.invalid/r.json", params={"a": 1}, timeout=5)
@@ -1,8 +1,12 @@
+import json
+import threading
 import pytest
 import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 from unittest.mock import patch, MagicMock
-from src.ingestor import fetch_nyc_data
-from src.normalizer import normalize_building_data
+from src.ingestor import Dataset, fetch_nyc_data, iter_dataset_changes, iter_nyc_data, load_datasets, make_session
+from src.normalizer import normalize_building_data, normalize_building_frame, frame_to_buildings
 from src.models import Building
 
 # --- Ingestor Tests ---
@@ -65,3 +69,124 @@ def test_normalize_mapping():
     buildings = normalize_building_data(raw_data)
     assert buildings[0].property_type == "Store"
     assert buildings[1].property_type == "Industrial"
+
+# --- Paginated Ingestor Tests (local stub Socrata server) ---
+class _StubSocrata(BaseHTTPRequestHandler):
+    records = [{"property_id": f"{i:05d}"} for i in range(2_345)]
+    fail_first = 0
+    requests_seen = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        type(self).requests_seen.append(query)
+        if type(self).fail_first > 0:
+            type(self).fail_first -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        offset = int(query.get("$offset", ["0"])[0])
+        limit = int(query.get("$limit", ["1000"])[0])
+        body = json.dumps(self.records[offset:offset + limit]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_socrata():
+    _StubSocrata.fail_first = 0
+    _StubSocrata.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSocrata)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/resource/test.json"
+    server.shutdown()
+    server.server_close()
+
+def test_iter_nyc_data_pages_through_dataset(stub_socrata):
+    records = list(iter_nyc_data(page_size=500, workers=3, url=stub_socrata))
+    assert [r["property_id"] for r in records] == [r["property_id"] for r in _StubSocrata.records]
+    offsets = sorted(int(q["$offset"][0]) for q in _StubSocrata.requests_seen)
+    assert offsets[:5] == [0, 500, 1000, 1500, 2000]
+    assert all(q["$order"] == ["property_id"] for q in _StubSocrata.requests_seen)
+
+def test_iter_nyc_data_chunked_and_max_records(stub_socrata):
+    pages = list(iter_nyc_data(page_size=400, max_records=1_000, chunked=True, url=stub_socrata))
+    assert [len(p) for p in pages] == [400, 400, 200]
+
+def test_iter_nyc_data_retries_transient_errors(stub_socrata):
+    _StubSocrata.fail_first = 2
+    session = make_session(pool_size=1, retries=3, backoff_factor=0)
+    records = list(iter_nyc_data(page_size=1_000, workers=1, session=session, url=stub_socrata))
+    assert len(records) == len(_StubSocrata.records)
+
+def test_iter_nyc_data_raises_after_retries(stub_socrata):
+    _StubSocrata.fail_first = 100
+    session = make_session(pool_size=1, retries=1, backoff_factor=0)
+    with pytest.raises(requests.RequestException):
+        list(iter_nyc_data(workers=1, session=session, url=stub_socrata))
+
+def test_iter_dataset_changes_queries_since_watermark(stub_socrata):
+    dataset = Dataset("test", 2023)
+    with patch("src.ingestor.SOCRATA_RESOURCE_URL", stub_socrata.rsplit("/", 1)[0]):
+        pages = list(iter_dataset_changes(dataset, since="2024-03-01T02:30:00.000", page_size=1_000, workers=1))
+    assert sum(len(p) for p in pages) == len(_StubSocrata.records)
+    query = _StubSocrata.requests_seen[0]
+    # Re-reads an hour before the watermark, in stable :id order, with the system field selected
+    assert query["$where"] == [":updated_at >= '2024-03-01T01:30:00.000'"]
+    assert query["$order"] == [":id"] and query["$select"] == ["*, :updated_at"]
+
+def test_load_datasets_sorts_by_reporting_year(tmp_path):
+    path = tmp_path / "datasets.yaml"
+    path.write_text("datasets:\n  - {id: b, reporting_year: 2023}\n  - {id: a, reporting_year: 2021}\n")
+    assert [d.id for d in load_datasets(path)] == ["a", "b"]
+    assert load_datasets()[0].url.endswith(".json")
+
+# --- Vectorized Normalizer Tests ---
+MESSY_RECORDS = [
+    {"property_id": "1", "property_gfa_self_reported": "50000", "natural_gas_use_kbtu": "250000",
+     "electricity_use_grid_purchase_kbtu": "3412140", "primary_property_type_self_selected": "Office",
+     "latitude": "40.75", "longitude": "-73.98", "site_eui_kbtu_ft": "85.2"},
+    {"property_id": "2", "property_gfa_self_reported": "Not Available", "gross_floor_area_ft": "12000",
+     "natural_gas_use_kbtu": "Not Available", "natural_gas_use_therms": "900",
+     "electricity_use_grid_purchase_kwh": "40000", "primary_property_type_self_selected": "Hotel"},
+    {"property_id": "3", "property_gfa_self_reported": "0", "primary_property_type_self_selected": "Office"},
+    {"property_id": "4", "property_gfa_self_reported": "1000", "site_eui_kbtu_ft": "9000",
+     "primary_property_type_self_selected": "Office"},
+    {"property_id": "5", "property_gfa_self_reported": "1000", "site_eui_kbtu_ft": "Not Available",
+     "primary_property_type_self_selected": "Self-Storage Facility", "latitude": "0"},
+    {"property_id": "6", "property_gfa_self_reported": "1000", "natural_gas_use_therms": "-5",
+     "primary_property_type_self_selected": "Office"},
+    {"property_id": "7", "property_gfa_self_reported": "1000", "primary_property_type_self_selected": None},
+    {"property_gfa_self_reported": "2000", "electricity_use_grid_purchase": "n/a",
+     "electricity_use_generated_from_onsite_renewable_systems_kwh": "1500"},
+    {"property_id": None, "property_gfa_self_reported": "2000"},
+    # Long decimals must parse exactly like float()
+    {"property_id": "10", "property_gfa_self_reported": "69157", "natural_gas_use_kbtu": "221691.66627303507",
+     "electricity_use_grid_purchase_kbtu": "939163.0397745617", "primary_property_type_self_selected": "Office"},
+]
+
+def test_normalize_frame_matches_dict_normalizer():
+    frame, rejected = normalize_building_frame(MESSY_RECORDS)
+    assert frame_to_buildings(frame) == normalize_building_data(MESSY_RECORDS)
+    assert frame.index.tolist() == [0, 1, 4, 7, 9]
+
+def test_normalize_frame_rejection_report():
+    _, rejected = normalize_building_frame(MESSY_RECORDS)
+    reasons = dict(zip(rejected["row"], rejected["reason"]))
+    assert reasons == {
+        2: "missing_gfa",
+        3: "implausible_eui",
+        5: "invalid_record",
+        6: "invalid_record",
+        8: "invalid_record",
+    }
+    assert rejected.loc[rejected["row"] == 3, "building_id"].item() == "4"
+
+def test_normalize_frame_empty():
+    frame, rejected = normalize_building_frame([])
+    assert frame.empty and rejected.empty
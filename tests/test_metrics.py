@@ -0,0 +1,41 @@
+import httpx
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from src import metrics
+from src.main import app
+
+client = TestClient(app)
+
+PAYLOAD = {"building_id": "m1", "gross_sq_ft": 50000.0, "annual_gas_usage_therms": 50000.0,
+           "annual_elec_usage_kwh": 500000.0, "property_type": "Office"}
+
+def test_server_timing_header_lists_stages():
+    response = client.post("/analyze", json=dict(PAYLOAD, building_id="m-timing"), params={"explain": "true"})
+    assert response.status_code == 200
+    stages = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    assert stages[:2] == ["roi", "penalty"] and "trace" in stages
+
+def test_metrics_endpoint_exposes_histograms_and_gauges():
+    client.post("/analyze", json=PAYLOAD)
+    client.post("/analyze", json=PAYLOAD)
+    text = client.get("/metrics").text
+    assert 'ecocalc_stage_seconds_bucket{stage="roi",le="+Inf"}' in text
+    assert 'ecocalc_stage_seconds_count{stage="penalty"}' in text
+    assert "ecocalc_result_cache_hit_rate" in text
+
+@patch("src.main.UPSTREAM.fetch_property", new_callable=AsyncMock)
+def test_upstream_errors_are_counted(mock_fetch):
+    mock_fetch.side_effect = httpx.ReadTimeout("slow")
+    before = metrics.REGISTRY.counters.get(("ecocalc_upstream_errors_total", (("kind", "timeout"),)), 0.0)
+    assert client.get("/building/metrics-timeout").status_code == 504
+    after = metrics.REGISTRY.counters[("ecocalc_upstream_errors_total", (("kind", "timeout"),))]
+    assert after == before + 1
+    assert 'ecocalc_upstream_errors_total{kind="timeout"}' in client.get("/metrics").text
+
+def test_disabled_metrics_are_no_ops(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert metrics.stage("roi") is metrics.stage("penalty")
+    count = metrics.REGISTRY.stages["roi"].count
+    response = client.post("/analyze", json=dict(PAYLOAD, building_id="m-disabled"))
+    assert "server-timing" not in response.headers
+    assert metrics.REGISTRY.stages["roi"].count == count
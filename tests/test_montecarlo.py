@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from src.engine.batch import calculate_roi_batch
+from src.engine.montecarlo import Distribution, simulate_roi
+from src.engine.rules import get_rules
+from src.main import app
+
+client = TestClient(app)
+
+@pytest.fixture
+def columns():
+    rng = np.random.default_rng(5)
+    n = 300
+    return (
+        rng.uniform(5_000, 300_000, n),
+        rng.uniform(0, 200_000, n),
+        rng.uniform(50_000, 5_000_000, n),
+        rng.integers(0, 5, n),
+    )
+
+def test_fixed_distributions_reproduce_deterministic_roi(columns):
+    constants = get_rules().constants
+    fixed = {name: Distribution("fixed", value=constants[name]) for name in ("GAS_COST_PER_THERM", "HEAT_PUMP_COP")}
+    sim = simulate_roi(*columns, distributions=fixed, n_draws=50)
+    roi = calculate_roi_batch(*columns)
+    np.testing.assert_allclose(sim.npv_quantiles[:, 1], roi["npv"], atol=0.01)
+    assert set(np.unique(sim.prob_positive_npv)) <= {0.0, 1.0}
+
+def test_seeded_and_independent_of_chunking(columns):
+    a = simulate_roi(*columns, n_draws=2_000, seed=42)
+    b = simulate_roi(*columns, n_draws=2_000, seed=42, max_cells=10_000)
+    c = simulate_roi(*columns, n_draws=2_000, seed=43)
+    np.testing.assert_array_equal(a.npv_quantiles, b.npv_quantiles)
+    np.testing.assert_array_equal(a.payback_quantiles, b.payback_quantiles)
+    assert not np.array_equal(a.npv_quantiles, c.npv_quantiles)
+    # Quantiles are ordered and probabilities are proper
+    assert (np.diff(a.npv_quantiles, axis=1) >= 0).all()
+    assert ((a.prob_positive_npv >= 0) & (a.prob_positive_npv <= 1)).all()
+
+def test_invalid_distributions_rejected(columns):
+    with pytest.raises(ValueError):
+        Distribution("triangular", low=1.0, mode=3.0, high=2.0)
+    with pytest.raises(ValueError):
+        simulate_roi(*columns, distributions={"PENALTY_RATE_PER_TON": Distribution("fixed", value=1.0)})
+
+def test_montecarlo_endpoint():
+    payload = {
+        "buildings": [{"building_id": "mc", "gross_sq_ft": 50000.0, "annual_gas_usage_therms": 50000.0,
+                       "annual_elec_usage_kwh": 500000.0, "property_type": "Office"}],
+        "distributions": {"GAS_COST_PER_THERM": {"kind": "normal", "mean": 1.5, "std": 0.3}},
+        "n_draws": 1000,
+        "seed": 7,
+    }
+    first = client.post("/roi/montecarlo", json=payload)
+    assert first.status_code == 200
+    body = first.json()
+    assert set(body["results"][0]["npv"]) == {"p10", "p50", "p90"}
+    assert client.post("/roi/montecarlo", json=payload).json() == body
+
+    payload["distributions"] = {"GAS_COST_PER_THERM": {"kind": "uniform", "low": 1.0}}
+    assert client.post("/roi/montecarlo", json=payload).status_code == 422
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from src.engine.batch import buildings_to_columns, limit_factors
+from src.engine.packages import Measure, evaluate_packages, load_measures, pareto_mask, score_packages
+from src.engine.roi import calculate_roi
+from src.engine.rules import get_rules
+from src.main import app
+from src.models import Building, PROPERTY_TYPES
+
+client = TestClient(app)
+
+def _buildings(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    return [
+        Building(
+            building_id=str(i),
+            gross_sq_ft=float(rng.uniform(10_000, 400_000)),
+            annual_gas_usage_therms=float(rng.choice([0.0, rng.uniform(0, 300_000)])),
+            annual_elec_usage_kwh=float(rng.uniform(50_000, 8_000_000)),
+            property_type=str(rng.choice(PROPERTY_TYPES)),
+        )
+        for i in range(n)
+    ]
+
+def _columns(buildings):
+    cols = buildings_to_columns(buildings)
+    return cols["gross_sq_ft"], cols["annual_gas_usage_therms"], cols["annual_elec_usage_kwh"], cols["type_codes"]
+
+def _score(buildings, packages, measures):
+    rules = get_rules()
+    sqft, gas, elec, codes = _columns(buildings)
+    limits = limit_factors(codes, 2024, rules), limit_factors(codes, 2030, rules)
+    return score_packages(sqft, gas, elec, *limits, np.asarray(packages, dtype=np.int64), measures, rules.constants)
+
+def test_default_library():
+    assert [m.name for m in load_measures()] == ["heat_pump", "envelope", "led", "solar", "controls"]
+
+def test_invalid_library(tmp_path):
+    path = tmp_path / "measures.yaml"
+    path.write_text("measures:\n  a:\n    cost_per_sqft: 1\n    excludes: [b]\n")
+    with pytest.raises(ValueError, match="unknown measures"):
+        load_measures(path)
+    path.write_text("measures:\n  a:\n    cost_per_sqft: 1\n    heating_reduction: 1.5\n")
+    with pytest.raises(ValueError, match="fractions"):
+        load_measures(path)
+
+def test_heat_pump_package_matches_calculate_roi():
+    buildings = _buildings(50)
+    measures = load_measures()
+    scores = _score(buildings, [[0, 1]] * len(buildings), measures)
+    for i, b in enumerate(buildings):
+        roi = calculate_roi(b)
+        assert scores["npv"][i, 0] == 0.0 and scores["annual_savings"][i, 0] == 0.0
+        assert round(scores["annual_savings"][i, 1], 2) == roi["annual_savings"]
+        assert round(scores["new_penalty_avg"][i, 1], 2) == roi["new_penalty_avg"]
+        assert scores["npv"][i, 1] == pytest.approx(roi["npv"], abs=0.02)
+
+def test_measures_interact():
+    building = [Building(building_id="1", gross_sq_ft=100_000, annual_gas_usage_therms=100_000,
+                         annual_elec_usage_kwh=50_000, property_type="Office")]
+    hp = Measure("hp", 10.0, electrify_heating=True)
+    envelope = Measure("envelope", 5.0, heating_reduction=0.3)
+    controls = Measure("controls", 1.0, heating_reduction=0.1)
+    solar = Measure("solar", 1.0, solar_kwh_per_sqft=5.0)
+    measures = [hp, envelope, controls, solar]
+    # none, envelope, envelope+controls, hp, hp+envelope, solar, hp+solar
+    s = _score(building, [[0b0000, 0b0010, 0b0110, 0b0001, 0b0011, 0b1000, 0b1001]], measures)
+    savings = s["annual_savings"][0]
+
+    # Reductions on the same load compound: 1 - 0.7 * 0.9 = 37%, not 40%
+    assert s["emissions_tco2e"][0, 2] == pytest.approx(s["emissions_tco2e"][0, 0] - 0.37 * 100_000 * 0.005311)
+    # Envelope saves less once heating is already electric
+    assert savings[1] - savings[0] > savings[4] - savings[3] > 0
+    # Solar offsets at most what the building uses
+    assert s["emissions_tco2e"][0, 5] == pytest.approx(100_000 * 0.005311)
+    assert s["emissions_tco2e"][0, 6] < s["emissions_tco2e"][0, 3]
+
+def test_pareto_mask():
+    cost = np.array([[0.0, 10.0, 10.0, 20.0, 5.0]])
+    emissions = np.array([[100.0, 50.0, 60.0, 40.0, 100.0]])
+    npv = np.array([[0.0, 5.0, 5.0, -1.0, -2.0]])
+    valid = np.array([[True, True, True, True, True]])
+    assert pareto_mask(cost, emissions, npv, valid).tolist() == [[True, True, False, True, False]]
+    # A dominating package that is not valid does not prune anything
+    valid[0, 1] = False
+    assert pareto_mask(cost, emissions, npv, valid).tolist() == [[True, False, True, True, False]]
+
+def test_frontier_is_efficient_and_complete():
+    buildings = _buildings()
+    measures = load_measures()
+    frontier = evaluate_packages(*_columns(buildings), measures)
+    assert frontier.method == "exhaustive" and frontier.evaluated == len(buildings) * 2 ** len(measures)
+
+    every = np.tile(np.arange(2 ** len(measures)), (len(buildings), 1))
+    scores = _score(buildings, every, measures)
+    for i in range(len(buildings)):
+        rows = frontier.valid[i]
+        assert frontier.packages[i, 0] == 0                         # doing nothing is the cheapest option
+        assert np.all(np.diff(frontier.cost[i, rows]) >= 0)
+        # Every package is matched or dominated by a frontier package
+        c, e, v = (frontier.cost[i, rows], frontier.emissions_tco2e[i, rows], frontier.npv[i, rows])
+        covered = ((c[None, :] <= scores["cost"][i, :, None]) & (e[None, :] <= scores["emissions_tco2e"][i, :, None])
+                   & (v[None, :] >= scores["npv"][i, :, None])).any(axis=1)
+        assert covered.all()
+
+def test_staged_search_prunes_larger_libraries():
+    buildings = _buildings(200)
+    measures = load_measures() + [
+        Measure("ashp_hybrid", 18.0, heating_reduction=0.5, excludes=("heat_pump",)),
+        Measure("windows", 9.0, heating_reduction=0.12),
+        Measure("vfd_pumps", 0.8, elec_reduction=0.03),
+    ]
+    frontier = evaluate_packages(*_columns(buildings), measures)
+    assert frontier.method == "staged"
+    assert frontier.evaluated < len(buildings) * 2 ** len(measures) // 4
+
+    hp, hybrid = 1 << 0, 1 << 5
+    assert not np.any(frontier.valid & ((frontier.packages & hp) != 0) & ((frontier.packages & hybrid) != 0))
+    # The staged frontier holds no dominated packages
+    keep = pareto_mask(frontier.cost, frontier.emissions_tco2e, frontier.npv, frontier.valid)
+    assert np.array_equal(keep, frontier.valid)
+
+def test_packages_endpoint():
+    buildings = [b.model_dump() for b in _buildings(3)]
+    response = client.post("/packages/frontier", json={"buildings": buildings, "measures": ["heat_pump", "led"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["method"] == "exhaustive" and body["evaluated"] == 12
+    first = body["results"][0]["frontier"]
+    assert first[0]["measures"] == [] and first[0]["cost"] == 0.0
+    assert {tuple(p["measures"]) for p in first} <= {(), ("heat_pump",), ("led",), ("heat_pump", "led")}
+
+    unknown = client.post("/packages/frontier", json={"buildings": buildings, "measures": ["fusion"]})
+    assert unknown.status_code == 422
@@ -0,0 +1,73 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from src.engine.rules import get_rules
+from src.main import app
+from src.models import Building, PROPERTY_TYPES
+from src.peers import build_peer_index, emissions_intensity, percentile_rank, refresh_peer_index, reset_peer_index
+from src.snapshot import SnapshotStore, write_snapshot
+
+client = TestClient(app)
+
+def _buildings(n, seed, prefix="b"):
+    rng = np.random.default_rng(seed)
+    return [
+        Building(building_id=f"{prefix}{i}", gross_sq_ft=float(rng.uniform(25_000, 300_000)),
+                 annual_gas_usage_therms=float(rng.choice([0.0, rng.uniform(0, 200_000)])),
+                 annual_elec_usage_kwh=float(rng.uniform(50_000, 5_000_000)),
+                 property_type=PROPERTY_TYPES[int(rng.integers(0, len(PROPERTY_TYPES)))])
+        for i in range(n)
+    ]
+
+def test_percentile_rank_counts_ties_as_half():
+    values = np.array([1.0, 2.0, 2.0, 3.0])
+    assert percentile_rank(values, 0.5) == 0.0
+    assert percentile_rank(values, 2.0) == 50.0
+    assert percentile_rank(values, 9.0) == 100.0
+
+def test_cohorts_are_sorted_by_type(tmp_path):
+    buildings = _buildings(500, 1)
+    write_snapshot(buildings, tmp_path / "snap")
+    index = build_peer_index(SnapshotStore.load(tmp_path / "snap"))
+    rules = get_rules()
+    offices = [b for b in buildings if b.property_type == "Office"]
+    expected = np.sort(emissions_intensity(
+        [b.gross_sq_ft for b in offices], [b.annual_gas_usage_therms for b in offices],
+        [b.annual_elec_usage_kwh for b in offices], rules
+    ))
+    np.testing.assert_array_equal(index.cohorts[0]["emissions_intensity"], expected)
+    assert index.cohort_size("Office") == len(offices)
+
+def test_incremental_refresh_matches_full_build(tmp_path):
+    buildings = _buildings(2000, 2)
+    write_snapshot(buildings, tmp_path / "snap")
+    old = build_peer_index(SnapshotStore.load(tmp_path / "snap"))
+
+    # Drop some, change some (including a type change), add some
+    updated = buildings[20:]
+    updated[0] = updated[0].model_copy(update={"annual_gas_usage_therms": 123_456.0})
+    updated[1] = updated[1].model_copy(update={"property_type": "Hotel" if updated[1].property_type != "Hotel" else "Office"})
+    updated += _buildings(30, 3, prefix="new")
+    write_snapshot(updated, tmp_path / "snap")
+    snapshot = SnapshotStore.load(tmp_path / "snap")
+
+    patched = refresh_peer_index(old, snapshot)
+    full = build_peer_index(snapshot)
+    assert patched.snapshot_version == snapshot.version
+    for code in full.cohorts:
+        for metric in ("emissions_intensity", "penalty"):
+            np.testing.assert_array_equal(patched.cohorts[code][metric], full.cohorts[code][metric])
+
+def test_analysis_includes_peer_percentiles(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.snapshot.SNAPSHOT_DIR", tmp_path / "snap")
+    reset_peer_index()
+    payload = {"building_id": "p", "gross_sq_ft": 50000.0, "annual_gas_usage_therms": 50000.0,
+               "annual_elec_usage_kwh": 500000.0, "property_type": "Office"}
+    assert client.post("/analyze", json=payload).json()["peer_percentiles"] is None
+
+    write_snapshot(_buildings(400, 4), tmp_path / "snap")
+    data = client.post("/analyze", json=payload, params={"explain": "true"}).json()
+    peers = data["peer_percentiles"]
+    assert peers["property_type"] == "Office" and peers["cohort_size"] > 0
+    assert 0 <= peers["emissions_intensity"] <= 100
+    assert any("percentile" in line for line in data["explainability"])
+    reset_peer_index()
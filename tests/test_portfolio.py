@@ -0,0 +1,67 @@
+import itertools
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from src.engine.portfolio import optimize_portfolio, project_values
+from src.main import app
+
+client = TestClient(app)
+
+def _brute_force(costs, values, budget):
+    best = 0.0
+    for r in range(len(costs) + 1):
+        for combo in itertools.combinations(range(len(costs)), r):
+            if costs[list(combo)].sum() <= budget:
+                best = max(best, values[list(combo)].clip(min=0).sum())
+    return best
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 3])
+def test_small_pools_are_solved_exactly(seed):
+    rng = np.random.default_rng(seed)
+    costs = rng.uniform(1, 100, 12)
+    values = rng.uniform(-20, 150, 12)
+    budget = costs.sum() * 0.4
+    result = optimize_portfolio(costs, values, budget)
+    assert result.method == "branch_and_bound"
+    assert result.total_cost <= budget
+    assert result.total_value == pytest.approx(_brute_force(costs, values, budget))
+    assert result.total_value <= result.upper_bound + 1e-9
+
+def test_greedy_beats_ratio_trap_with_best_single_item():
+    # Classic greedy failure: a tiny high-ratio item blocks the large valuable one
+    costs = np.array([1.0, 100.0])
+    values = np.array([2.0, 150.0])
+    result = optimize_portfolio(costs, values, 100.0, exact_max_items=0)
+    assert result.method == "greedy"
+    assert result.selected.tolist() == [False, True]
+
+def test_citywide_scale_and_marginal_value():
+    rng = np.random.default_rng(9)
+    n = 30_000
+    projects = project_values(
+        rng.uniform(25_000, 500_000, n), rng.uniform(0, 200_000, n),
+        rng.uniform(50_000, 5_000_000, n), rng.integers(0, 5, n), objective="avoided_penalty",
+    )
+    budget = projects["cost"].sum() * 0.1
+    start = time.perf_counter()
+    result = optimize_portfolio(projects["cost"], projects["value"], budget)
+    assert time.perf_counter() - start < 2.0
+    assert result.total_cost <= budget
+    assert result.total_value >= 0.99 * result.upper_bound
+    # A larger budget buys value at a lower rate
+    bigger = optimize_portfolio(projects["cost"], projects["value"], budget * 2)
+    assert bigger.marginal_value_per_dollar <= result.marginal_value_per_dollar
+
+def test_portfolio_endpoint():
+    buildings = [
+        {"building_id": f"b{i}", "gross_sq_ft": 50000.0 + 10000 * i, "annual_gas_usage_therms": 60000.0,
+         "annual_elec_usage_kwh": 400000.0, "property_type": "Office"}
+        for i in range(4)
+    ]
+    response = client.post("/portfolio/optimize", json={"buildings": buildings, "budget": 2_000_000, "objective": "avoided_penalty"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_cost"] <= 2_000_000
+    assert body["total_value"] <= body["upper_bound"] + 0.01
+    assert client.post("/portfolio/optimize", json={"buildings": buildings, "budget": 1, "objective": "irr"}).status_code == 422
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from src.engine.rules import RuleSource, compile_rules, get_rules
+from src.engine.penalty import calculate_penalty
+from src.models import Building
+
+LIMITS = "2024:\n  Office: 8.46\n  Hotel: 9.87\n2030:\n  Office: 4.53\n"
+CONSTANTS = "PENALTY_RATE_PER_TON: 268\nEMISSION_FACTOR_GAS_TCO2E_PER_THERM: 0.005311\nEMISSION_FACTOR_ELEC_TCO2E_PER_KWH: 0.000288962\n"
+
+@pytest.fixture
+def config_files(tmp_path):
+    limits = tmp_path / "ll97_limits.yaml"
+    constants = tmp_path / "constants.yaml"
+    limits.write_text(LIMITS)
+    constants.write_text(CONSTANTS)
+    return limits, constants
+
+def test_compile_rules_dense_table(config_files):
+    rules = compile_rules(*config_files)
+    assert rules.periods == (2024, 2030)
+    assert rules.limit_factor("Office", 2024) == 8.46
+    assert rules.limit_factor("Office", 2029) == 8.46
+    assert rules.limit_factor("Office", 2031) == 4.53
+    assert rules.limit_factor("Office", 2023) is None
+    assert rules.limit_factor("Hotel", 2030) is None       # not defined for 2030 in this file
+    assert np.isnan(rules.limits[rules.type_rows([-1]), 0]).all()
+    with pytest.raises(ValueError):
+        rules.limits[0, 0] = 1.0                             # frozen
+
+def test_version_is_content_hash(config_files):
+    limits, constants = config_files
+    first = compile_rules(limits, constants)
+    assert compile_rules(limits, constants).version == first.version
+    limits.write_text(LIMITS.replace("8.46", "8.50"))
+    assert compile_rules(limits, constants).version != first.version
+
+def test_rule_source_hot_reload(config_files):
+    limits, constants = config_files
+    source = RuleSource(list(config_files), check_seconds=0)
+    before = source.current()
+    limits.write_text(LIMITS.replace("4.53", "1.00"))
+    after = source.current()
+    assert after.version != before.version
+    assert after.limit_factor("Office", 2030) == 1.00
+    assert before.limit_factor("Office", 2030) == 4.53   # old table is untouched
+
+def test_rule_source_keeps_previous_table_on_bad_config(config_files):
+    limits, _ = config_files
+    source = RuleSource(list(config_files), check_seconds=0)
+    before = source.current()
+    limits.write_text("2024: [unclosed")
+    assert source.current() is before
+
+def test_penalty_uses_explicit_rule_table(config_files):
+    building = Building(building_id="1", gross_sq_ft=50000.0, annual_gas_usage_therms=50000.0,
+                        annual_elec_usage_kwh=500000.0, property_type="Office")
+    rules = compile_rules(*config_files)
+    assert calculate_penalty(building, 2030, rules) == calculate_penalty(building, 2030)
+    assert calculate_penalty(building, 2030, rules) > 0
+
+def test_analysis_is_stamped_with_rule_version():
+    from fastapi.testclient import TestClient
+    from src.main import app
+    payload = {"building_id": "v", "gross_sq_ft": 1000.0, "annual_gas_usage_therms": 10.0,
+               "annual_elec_usage_kwh": 100.0, "property_type": "Office"}
+    assert TestClient(app).post("/analyze", json=payload).json()["rule_version"] == get_rules().version
@@ -0,0 +1,135 @@
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from src.main import app
+from src.models import Building
+from src.snapshot import SnapshotStore, get_snapshot, write_snapshot
+
+client = TestClient(app)
+
+@pytest.fixture
+def buildings():
+    return [
+        Building(building_id="1001", gross_sq_ft=50000.0, annual_gas_usage_therms=50000.0,
+                 annual_elec_usage_kwh=500000.0, property_type="Office", latitude=40.75, longitude=-73.98),
+        Building(building_id="1002", gross_sq_ft=20000.0, annual_gas_usage_therms=0.0,
+                 annual_elec_usage_kwh=100000.0, property_type="Hotel"),
+    ]
+
+def test_snapshot_round_trip(tmp_path, buildings):
+    meta = write_snapshot(buildings, tmp_path / "snap")
+    store = SnapshotStore.load(tmp_path / "snap")
+    assert meta["rows"] == len(store) == 2
+    assert "1002" in store and "9999" not in store
+    assert store.get("1001") == buildings[0]
+    assert store.get("1002") == buildings[1]
+    assert store.get("9999") is None
+
+def test_get_snapshot_reloads_after_refresh(tmp_path, buildings):
+    directory = tmp_path / "snap"
+    assert get_snapshot(directory) is None
+    write_snapshot(buildings[:1], directory)
+    first = get_snapshot(directory)
+    assert get_snapshot(directory) is first
+    write_snapshot(buildings, directory)
+    refreshed = get_snapshot(directory)
+    assert len(refreshed) == 2 and refreshed.version != first.version
+
+@patch("src.main.UPSTREAM.fetch_property", new_callable=AsyncMock)
+def test_building_endpoint_serves_from_snapshot(mock_get, tmp_path, buildings, monkeypatch):
+    monkeypatch.setattr("src.snapshot.SNAPSHOT_DIR", tmp_path / "snap")
+    write_snapshot(buildings, tmp_path / "snap")
+    response = client.get("/building/1001")
+    assert response.status_code == 200
+    assert response.json()["building_id"] == "1001"
+    mock_get.assert_not_called()
+
+# --- Delta sync ---
+from src.ingestor import Dataset
+from src.peers import build_peer_index, refresh_peer_index
+from src.snapshot import sync_snapshot
+
+def _record(property_id, updated_at, gfa="50000", gas_kbtu="2000000", property_type="Office"):
+    return {"property_id": property_id, "property_gfa_self_reported": gfa, "natural_gas_use_kbtu": gas_kbtu,
+            "electricity_use_grid_purchase_kbtu": "1500000", "primary_property_type_self_selected": property_type,
+            "site_eui_kbtu_ft": "70", ":updated_at": updated_at}
+
+class _FakeSocrata:
+    """Serves each dataset's records modified at or after the watermark."""
+
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self.calls = []
+
+    def __call__(self, dataset, since=None, page_size=1000, workers=4, **kwargs):
+        self.calls.append((dataset.id, since))
+        rows = [r for r in self.datasets[dataset.id] if since is None or r[":updated_at"] >= since]
+        return iter([rows[i:i + page_size] for i in range(0, len(rows), page_size)])
+
+@pytest.fixture
+def socrata():
+    fake = _FakeSocrata({
+        "old": [_record("A", "2024-01-01T00:00:00.000"), _record("B", "2024-01-01T00:00:00.000", property_type="Hotel")],
+        "new": [_record(str(i), "2024-02-01T00:00:00.000") for i in range(100)],
+    })
+    with patch("src.ingestor.iter_dataset_changes", fake):
+        yield fake
+
+DATASETS = [Dataset("new", 2023), Dataset("old", 2022)]
+
+def test_sync_pulls_everything_first_then_only_changes(tmp_path, socrata):
+    directory = tmp_path / "snap"
+    first = sync_snapshot(directory, datasets=DATASETS)
+    assert first["rows"] == 102 and first["changed"] == 102
+    assert socrata.calls == [("old", None), ("new", None)]  # oldest reporting year first
+
+    socrata.datasets["new"][7] = _record("7", "2024-03-01T00:00:00.000", gas_kbtu="999")
+    second = sync_snapshot(directory, datasets=DATASETS)
+    assert socrata.calls[-1] == ("new", "2024-02-01T00:00:00.000")
+    assert second["changed"] == 1 and second["version"] != first["version"]
+    assert second["datasets"]["new"]["updated"] == 1 and second["datasets"]["new"]["watermark"] == "2024-03-01T00:00:00.000"
+
+    store = get_snapshot(directory)
+    assert store.version == second["version"]
+    assert store.get("7").annual_gas_usage_therms == pytest.approx(9.99)
+    assert store.get("8").annual_gas_usage_therms == pytest.approx(20_000)
+
+    # Nothing new: the version (and every cache keyed on it) is kept
+    third = sync_snapshot(directory, datasets=DATASETS)
+    assert third["changed"] == 0 and third["version"] == second["version"]
+
+def test_sync_later_reporting_year_wins_and_invalid_rows_are_dropped(tmp_path, socrata):
+    directory = tmp_path / "snap"
+    socrata.datasets["new"].append(_record("A", "2024-02-01T00:00:00.000", gas_kbtu="100"))
+    sync_snapshot(directory, datasets=DATASETS)
+    # An edit to the older dataset does not override the 2023 record
+    socrata.datasets["old"][0] = _record("A", "2024-05-01T00:00:00.000", gas_kbtu="5000000")
+    # A record whose GFA was cleared no longer normalizes and is removed
+    socrata.datasets["new"][3] = _record("3", "2024-05-01T00:00:00.000", gfa="Not Available")
+    result = sync_snapshot(directory, datasets=DATASETS)
+    store = SnapshotStore.load(directory)
+    assert store.get("A").annual_gas_usage_therms == pytest.approx(1.0)
+    assert "3" not in store and result["datasets"]["new"]["removed"] == 1
+
+def test_sync_lets_the_peer_index_patch_only_changed_cohorts(tmp_path, socrata):
+    directory = tmp_path / "snap"
+    sync_snapshot(directory, datasets=DATASETS)
+    index = build_peer_index(SnapshotStore.load(directory))
+    socrata.datasets["old"][1] = _record("B", "2024-06-01T00:00:00.000", property_type="Hotel", gas_kbtu="10")
+    sync_snapshot(directory, datasets=DATASETS)
+    refreshed = refresh_peer_index(index, SnapshotStore.load(directory))
+    assert refreshed.rebuilt_types == (refreshed.property_types.index("Hotel"),)
+
+def test_sync_keeps_mixed_use_floor_areas(tmp_path, socrata):
+    directory = tmp_path / "snap"
+    mixed = _record("M", "2024-02-01T00:00:00.000", gfa="80000", property_type="Multifamily Housing")
+    mixed.update({"largest_property_use_type": "Multifamily Housing", "largest_property_use_type_gross_floor_area": "60000",
+                  "2nd_largest_property_use_type": "Retail Store", "2nd_largest_property_use_type_gross_floor_area": "20000"})
+    socrata.datasets["new"].append(mixed)
+    first = sync_snapshot(directory, datasets=DATASETS)
+    assert get_snapshot(directory).get("M").use_mix == {"Multifamily": 60000.0, "Store": 20000.0}
+
+    # Re-delivering the same record is not a change
+    mixed[":updated_at"] = "2024-03-01T00:00:00.000"
+    again = sync_snapshot(directory, datasets=DATASETS)
+    assert again["changed"] == 0 and again["version"] == first["version"]
@@ -0,0 +1,65 @@
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from src.main import app
+from src.models import Building
+from src.snapshot import write_snapshot
+from src.spatial import SpatialIndex, haversine_m
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(21)
+    lat = rng.uniform(40.55, 40.90, 30_000)
+    lon = rng.uniform(-74.10, -73.75, 30_000)
+    lat[:50] = np.nan
+    return lat, lon
+
+def test_radius_query_matches_brute_force(points):
+    lat, lon = points
+    index = SpatialIndex(lat, lon)
+    assert len(index) == 29_950
+    for qlat, qlon, meters in [(40.75, -73.98, 500), (40.60, -74.05, 1200), (40.90, -73.75, 300)]:
+        rows, distances = index.within(qlat, qlon, meters)
+        expected = np.flatnonzero(haversine_m(qlat, qlon, lat, lon) <= meters)
+        assert sorted(rows.tolist()) == expected.tolist()
+        assert (np.diff(distances) >= 0).all()
+
+def test_nearest_matches_brute_force(points):
+    lat, lon = points
+    index = SpatialIndex(lat, lon)
+    for qlat, qlon in [(40.75, -73.98), (41.5, -72.0)]:
+        rows, distances = index.nearest(qlat, qlon, 15)
+        brute = haversine_m(qlat, qlon, lat, lon)
+        brute = np.where(np.isnan(brute), np.inf, brute)
+        np.testing.assert_allclose(distances, np.sort(brute)[:15])
+
+def test_queries_are_fast(points):
+    index = SpatialIndex(*points)
+    start = time.perf_counter()
+    for _ in range(200):
+        index.within(40.75, -73.98, 500)
+    assert (time.perf_counter() - start) / 200 < 0.002
+
+def test_nearby_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.snapshot.SNAPSHOT_DIR", tmp_path / "snap")
+    write_snapshot([
+        Building(building_id="a", gross_sq_ft=200000.0, annual_gas_usage_therms=300000.0,
+                 annual_elec_usage_kwh=3000000.0, property_type="Office", latitude=40.7500, longitude=-73.9800),
+        Building(building_id="b", gross_sq_ft=20000.0, annual_gas_usage_therms=1000.0,
+                 annual_elec_usage_kwh=100000.0, property_type="Hotel", latitude=40.7520, longitude=-73.9800),
+        Building(building_id="c", gross_sq_ft=20000.0, annual_gas_usage_therms=1000.0,
+                 annual_elec_usage_kwh=100000.0, property_type="Hotel", latitude=40.8000, longitude=-73.9000),
+    ], tmp_path / "snap")
+
+    body = client.get("/nearby/radius", params={"building_id": "a", "radius_m": 500}).json()
+    assert [b["building_id"] for b in body["buildings"]] == ["a", "b"]
+    assert body["summary"]["count"] == 2
+    assert body["summary"]["total_penalty_2024"] == pytest.approx(sum(b["penalty_2024"] for b in body["buildings"]))
+
+    body = client.get("/nearby/nearest", params={"latitude": 40.8, "longitude": -73.9, "k": 2}).json()
+    assert [b["building_id"] for b in body["buildings"]] == ["c", "b"]
+    assert client.get("/nearby/radius", params={"building_id": "zzz"}).status_code == 404
+    assert client.get("/nearby/radius").status_code == 422
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from src.engine.batch import calculate_roi_batch
+from src.engine.rules import get_rules
+from src.engine.sweep import run_sweep, tornado
+from src.main import app
+
+client = TestClient(app)
+
+@pytest.fixture
+def columns():
+    rng = np.random.default_rng(11)
+    n = 400
+    return (
+        rng.uniform(5_000, 300_000, n),
+        rng.uniform(0, 200_000, n),
+        rng.uniform(50_000, 5_000_000, n),
+        rng.integers(0, 5, n),
+    )
+
+def test_single_point_grid_matches_roi_batch(columns):
+    constants = get_rules().constants
+    result = run_sweep(*columns, grid={"HEAT_PUMP_COP": [constants["HEAT_PUMP_COP"]]})
+    roi = calculate_roi_batch(*columns)
+    assert result.npv.shape == (400, 1)
+    np.testing.assert_allclose(result.npv[:, 0], roi["npv"], atol=0.01)
+    np.testing.assert_allclose(result.new_penalty_avg[:, 0], roi["new_penalty_avg"], atol=0.01)
+
+def test_grid_shapes_and_monotonicity(columns):
+    grid = {"GAS_COST_PER_THERM": [1.0, 1.5, 2.0], "DISCOUNT_RATE": [0.03, 0.07]}
+    result = run_sweep(*columns, grid=grid)
+    assert result.npv.shape == (400, 3, 2)
+    # Dearer gas makes leaving it more valuable
+    assert (np.diff(result.npv, axis=1) >= 0).all()
+
+def test_chunked_and_parallel_sweeps_match_broadcast(columns):
+    grid = {"HEAT_PUMP_COP": [2.5, 3.0, 3.5], "ELEC_COST_PER_KWH": [0.18, 0.22]}
+    full = run_sweep(*columns, grid=grid)
+    chunked = run_sweep(*columns, grid=grid, max_cells=500)
+    parallel = run_sweep(*columns, grid=grid, max_cells=500, processes=2)
+    np.testing.assert_array_equal(full.npv, chunked.npv)
+    np.testing.assert_array_equal(full.simple_payback_years, parallel.simple_payback_years)
+
+def test_unknown_parameter_rejected(columns):
+    with pytest.raises(ValueError):
+        run_sweep(*columns, grid={"PENALTY_RATE_PER_TON": [100]})
+
+def test_tornado_orders_by_swing(columns):
+    summary = tornado(*columns)
+    assert summary["swing"].shape == (400, 5)
+    ordered = np.take_along_axis(summary["swing"], summary["order"], axis=1)
+    assert (np.diff(ordered, axis=1) <= 0).all()
+
+def test_tornado_endpoint():
+    payload = {"buildings": [{"building_id": "t", "gross_sq_ft": 50000.0, "annual_gas_usage_therms": 50000.0,
+                              "annual_elec_usage_kwh": 500000.0, "property_type": "Office"}]}
+    response = client.post("/sweep/tornado", json=payload)
+    assert response.status_code == 200
+    bars = response.json()["results"][0]["bars"]
+    assert len(bars) == 5
+    assert bars[0]["swing"] >= bars[-1]["swing"]
@@ -0,0 +1,52 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from src.main import app
+from src.models import Building
+from src.snapshot import write_snapshot
+from src.tiles import BUCKET_COLORS, aggregate_tiles, penalty_colors, tile_bounds, tile_xy
+
+client = TestClient(app)
+
+def test_penalty_colors_match_brackets():
+    colors = penalty_colors([0, 9_999.99, 10_000, 250_000, 5_000_000, 50_000_000])
+    assert [BUCKET_COLORS.tolist().index(c) for c in colors.tolist()] == [0, 0, 1, 2, 3, 4]
+
+def test_tiles_contain_their_points():
+    rng = np.random.default_rng(3)
+    lat = rng.uniform(40.5, 40.9, 1000)
+    lon = rng.uniform(-74.2, -73.7, 1000)
+    x, y = tile_xy(lat, lon, 14)
+    bounds = tile_bounds(x, y, 14)
+    assert ((bounds["south"] <= lat) & (lat < bounds["north"])).all()
+    assert ((bounds["west"] <= lon) & (lon < bounds["east"])).all()
+
+def test_aggregate_tiles_totals():
+    rng = np.random.default_rng(4)
+    lat = rng.uniform(40.5, 40.9, 5000)
+    lon = rng.uniform(-74.2, -73.7, 5000)
+    penalty = rng.choice([0.0, 5e3, 2e5], 5000)
+    lat[:10] = np.nan
+    tiles = aggregate_tiles(lat, lon, penalty, 12)
+    assert tiles["count"].sum() == 4990
+    assert np.isclose(tiles["total_penalty"].sum(), penalty[10:].sum())
+    assert tiles["max_penalty"].max() == 2e5
+    assert (tiles["penalized_count"] <= tiles["count"]).all()
+
+def test_map_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.snapshot.SNAPSHOT_DIR", tmp_path / "snap")
+    assert client.get("/map/tiles").status_code == 503
+    write_snapshot([
+        Building(building_id="a", gross_sq_ft=200000.0, annual_gas_usage_therms=300000.0,
+                 annual_elec_usage_kwh=3000000.0, property_type="Office", latitude=40.75, longitude=-73.98),
+        Building(building_id="b", gross_sq_ft=20000.0, annual_gas_usage_therms=0.0,
+                 annual_elec_usage_kwh=100000.0, property_type="Hotel", latitude=40.7501, longitude=-73.9801),
+        Building(building_id="c", gross_sq_ft=20000.0, annual_gas_usage_therms=0.0,
+                 annual_elec_usage_kwh=100000.0, property_type="Hotel"),
+    ], tmp_path / "snap")
+
+    tiles = client.get("/map/tiles", params={"zoom": 10}).json()["tiles"]
+    assert len(tiles) == 1 and tiles[0]["count"] == 2 and tiles[0]["penalized_count"] == 1
+
+    points = client.get("/map/points", params={"south": 40.7, "west": -74.0, "north": 40.8, "east": -73.9}).json()
+    assert [p["building_id"] for p in points["points"]] == ["a"]
+    assert client.get("/map/tiles", params={"zoom": 20}).status_code == 422
@@ -0,0 +1,55 @@
+import asyncio
+import httpx
+import pytest
+from src.upstream import UpstreamClient
+
+def _slow_transport(state, delay=0.05):
+    async def handler(request):
+        state["calls"] += 1
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(delay)
+        state["active"] -= 1
+        return httpx.Response(200, json=[{"property_id": request.url.params["property_id"]}])
+    return httpx.MockTransport(handler)
+
+def _state():
+    return {"calls": 0, "active": 0, "peak": 0}
+
+def test_concurrent_requests_for_same_property_share_one_fetch():
+    state = _state()
+    upstream = UpstreamClient(url="http://socrata.test/resource.json", transport=_slow_transport(state))
+
+    async def run():
+        results = await asyncio.gather(*[upstream.fetch_property("2658221") for _ in range(20)])
+        await upstream.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert state["calls"] == 1
+    assert upstream.coalesced == 19
+    assert all(r == [{"property_id": "2658221"}] for r in results)
+
+def test_concurrency_limit_toward_upstream():
+    state = _state()
+    upstream = UpstreamClient(url="http://socrata.test/resource.json", max_concurrency=3,
+                              transport=_slow_transport(state))
+
+    async def run():
+        await asyncio.gather(*[upstream.fetch_property(str(i)) for i in range(12)])
+        await upstream.aclose()
+
+    asyncio.run(run())
+    assert state["calls"] == 12
+    assert state["peak"] <= 3
+
+def test_upstream_errors_propagate_to_all_waiters():
+    def handler(request):
+        return httpx.Response(503)
+    upstream = UpstreamClient(url="http://socrata.test/resource.json", transport=httpx.MockTransport(handler))
+
+    async def run():
+        return await asyncio.gather(*[upstream.fetch_property("1") for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)